@@ -0,0 +1,161 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from render_pool import RENDER_POOL_SIZE
+from turtle_worker import count_segments, output_size, symmetry_copies
+
+# Modèle de coût, en millisecondes de worker estimées (mesurées sur un rendu
+# 500x500 par défaut) : coût fixe, surface, segments du motif et de ses copies
+# symétriques (géométrie partagée, moins chères), glow (proportionnel aux tracés)
+COST_BASE_MS = 30
+COST_MS_PER_MEGAPIXEL = 90
+COST_MS_PER_SEGMENT = 1.5e-3
+COST_MS_PER_SYMMETRY_SEGMENT = 0.5e-3
+COST_MS_PER_GLOW_SEGMENT = 15e-3
+
+# Au-delà de ce coût estimé (ms), un rendu passe dans la voie des rendus coûteux
+ADMISSION_EXPENSIVE_COST = float(os.environ.get("ADMISSION_EXPENSIVE_COST", 250))
+# Slots de génération ouverts aux rendus coûteux : les autres restent aux rendus légers
+ADMISSION_EXPENSIVE_SLOTS = int(os.environ.get("ADMISSION_EXPENSIVE_SLOTS", max(1, RENDER_POOL_SIZE - 1)))
+# Budget de chaque client en ms de rendu estimées : débit (par seconde, 0 = illimité) et réserve
+ADMISSION_CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", 2000))
+ADMISSION_CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", 20000))
+# Nombre de clients suivis (les moins récents sont oubliés, leur budget repart plein)
+ADMISSION_TRACKED_CLIENTS = 10000
+
+def pixel_cost(params):
+    """Coût estimé (ms) de la surface de sortie seule"""
+    width, height = output_size(params)
+    return COST_MS_PER_MEGAPIXEL * width * height / 1_000_000
+
+def estimate_cost(params, raster=True):
+    """Coût estimé (ms de worker) d'un rendu, sans rien tracer
+
+    `raster=False` : export vectoriel, sans surface ni glow.
+    """
+    segments = count_segments(params)
+    unique = segments // symmetry_copies(params.get("symmetry"))
+    cost = COST_BASE_MS + COST_MS_PER_SEGMENT * unique + COST_MS_PER_SYMMETRY_SEGMENT * (segments - unique)
+    if raster:
+        cost += pixel_cost(params)
+        if params.get("glow"):
+            cost += COST_MS_PER_GLOW_SEGMENT * segments
+    return round(cost, 1)
+
+def estimate_draw_on_cost(params, frames):
+    """Coût estimé d'une animation tracée trait par trait : un rendu, puis la surface de chaque image"""
+    return round(estimate_cost(params) + (frames - 1) * pixel_cost(params), 1)
+
+class RateLimited(Exception):
+    """Budget de rendu du client épuisé : réponse 429 avec Retry-After"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RenderSlots:
+    """Slots de génération répartis en deux voies selon le coût estimé
+
+    Un rendu léger prend n'importe quel slot libre ; un rendu coûteux (coût
+    au-delà de `expensive_cost`) n'en occupe au plus que `expensive_slots`,
+    et attend tant que des rendus légers attendent : les motifs simples ne
+    restent jamais bloqués derrière les plus lourds.
+    """
+
+    def __init__(self, size, expensive_slots=None, expensive_cost=None):
+        self.size = size
+        self.expensive_slots = min(size, expensive_slots or ADMISSION_EXPENSIVE_SLOTS)
+        self.expensive_cost = expensive_cost if expensive_cost is not None else ADMISSION_EXPENSIVE_COST
+        self._lock = threading.Condition()
+        self._active = {"cheap": 0, "expensive": 0}
+        self._waiting = {"cheap": 0, "expensive": 0}
+
+    def lane(self, cost):
+        return "expensive" if cost > self.expensive_cost else "cheap"
+
+    def _available(self, lane):
+        if sum(self._active.values()) >= self.size:
+            return False
+        if lane == "cheap":
+            return True
+        return self._active["expensive"] < self.expensive_slots and not self._waiting["cheap"]
+
+    def acquire(self, cost):
+        """Attend un slot de la voie correspondant à `cost` ; renvoie la voie, à passer à release()"""
+        lane = self.lane(cost)
+        with self._lock:
+            self._waiting[lane] += 1
+            try:
+                while not self._available(lane):
+                    self._lock.wait()
+            finally:
+                self._waiting[lane] -= 1
+            self._active[lane] += 1
+        return lane
+
+    def release(self, lane):
+        with self._lock:
+            self._active[lane] -= 1
+            self._lock.notify_all()
+
+    @contextmanager
+    def slot(self, cost):
+        """Occupe un slot de la voie correspondant à `cost` pour la durée du bloc"""
+        lane = self.acquire(cost)
+        try:
+            yield lane
+        finally:
+            self.release(lane)
+
+    def stats(self):
+        with self._lock:
+            return {"size": self.size, "expensive_slots": self.expensive_slots,
+                    "expensive_cost": self.expensive_cost,
+                    "active": dict(self._active), "waiting": dict(self._waiting)}
+
+class ClientBudgets:
+    """Seau à jetons par client, exprimé en ms de rendu estimées
+
+    Le seau se remplit de `rate` par seconde jusqu'à `burst`. Un rendu est
+    admis tant que le seau n'est pas vide, quitte à l'endetter : un rendu plus
+    coûteux que la réserve reste possible, mais les suivants attendent que la
+    dette soit remboursée.
+    """
+
+    def __init__(self, rate=None, burst=None, max_clients=ADMISSION_TRACKED_CLIENTS):
+        self.rate = rate if rate is not None else ADMISSION_CLIENT_RATE
+        self.burst = burst if burst is not None else ADMISSION_CLIENT_BURST
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # client -> (jetons, instant du dernier calcul)
+        self._rejected = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def charge(self, client, cost):
+        """Débite `cost` du budget de `client`, ou lève RateLimited si le seau est vide"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens <= 0:
+                self._rejected += 1
+                self._buckets[client] = (tokens, now)
+                retry_after = math.ceil((-tokens + 1) / self.rate)
+                raise RateLimited(f"Budget de rendu épuisé, réessayez dans {retry_after} s", retry_after)
+            self._buckets[client] = (tokens - cost, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets),
+                    "rejected": self._rejected}
@@ -0,0 +1,231 @@
+import io
+import logging
+import struct
+import tempfile
+import threading
+import zlib
+
+from PIL import ImageChops
+
+# Formats d'animation : type MIME par format
+ANIMATION_FORMATS = {"gif": "image/gif", "apng": "image/apng", "webp": "image/webp"}
+
+# Les écrivains multi-images de Pillow gardent toutes les images en mémoire
+# avant d'écrire : ici chaque image est encodée seule par Pillow, puis son flux
+# compressé est reporté dans le conteneur. Seule l'image précédente est gardée
+# (pour ne réencoder que la zone qui a changé), la mémoire ne dépend donc pas
+# du nombre d'images.
+
+def _changed_box(previous, frame, even=False):
+    """Zone (x0, y0, x1, y1) où `frame` diffère de `previous` ; au moins un pixel"""
+    box = ImageChops.difference(previous, frame).getbbox() or (0, 0, 1, 1)
+    if even:
+        # Décalages pairs imposés par WebP
+        box = (box[0] & ~1, box[1] & ~1, box[2], box[3])
+    return box
+
+def _frame_boxes(frames, even=False):
+    """(image RGB, zone à encoder) : l'image entière d'abord, puis la zone modifiée seule"""
+    previous = None
+    for frame in frames:
+        frame = frame.convert('RGB')
+        box = (0, 0) + frame.size if previous is None else _changed_box(previous, frame, even)
+        previous = frame
+        yield frame, box
+
+# GIF : écran logique sans palette globale, palette locale par image
+
+def _gif_image_block(img, left, top):
+    """Descripteur d'image (palette locale) et données LZW d'une image encodée seule par Pillow"""
+    buffer = io.BytesIO()
+    img.quantize(256).save(buffer, format='GIF')
+    data = buffer.getvalue()
+    flags = data[10]
+    offset = 13
+    color_table = b""
+    if flags & 0x80:
+        color_table = data[offset:offset + 3 * (2 << (flags & 0x07))]
+        offset += len(color_table)
+    while data[offset] == 0x21:
+        # Extensions éventuelles : ignorées, le contrôle graphique est écrit par l'appelant
+        offset += 2
+        while data[offset]:
+            offset += data[offset] + 1
+        offset += 1
+    width, height, image_flags = struct.unpack_from("<HHB", data, offset + 5)
+    # Image ne contenant que des sous-blocs jusqu'au terminateur, puis le trailer
+    body = data[offset + 10:-1]
+    if image_flags & 0x80:
+        # Palette déjà locale : elle fait partie du corps
+        color_table = b""
+    elif color_table:
+        image_flags = (image_flags & ~0x07) | 0x80 | (flags & 0x07)
+    return struct.pack("<BHHHHB", 0x2C, left, top, width, height, image_flags) + color_table + body
+
+def _encode_gif(frames, count, duration, loop):
+    delay = max(2, round(duration / 10))
+    for index, (frame, box) in enumerate(_frame_boxes(frames)):
+        if index == 0:
+            yield (b"GIF89a" + struct.pack("<HHBBB", frame.width, frame.height, 0, 0, 0)
+                   + b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+        # Contrôle graphique : délai, image conservée sous la suivante (disposal 1)
+        yield (b"\x21\xf9\x04" + struct.pack("<BHB", 0x04, delay, 0) + b"\x00"
+               + _gif_image_block(frame.crop(box), box[0], box[1]))
+    yield b"\x3b"
+
+# APNG : IDAT de la première image, fdAT numérotés pour les suivantes
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def _png_chunks(data):
+    """(type, données) des blocs d'un PNG"""
+    offset = 8
+    while offset < len(data):
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        yield kind, data[offset + 8:offset + 8 + length]
+        offset += length + 12
+
+def _encode_apng(frames, count, duration, loop):
+    sequence = 0
+    for index, (frame, box) in enumerate(_frame_boxes(frames)):
+        buffer = io.BytesIO()
+        frame.crop(box).save(buffer, format='PNG', compress_level=6)
+        chunks = list(_png_chunks(buffer.getvalue()))
+        if index == 0:
+            yield (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", chunks[0][1])
+                   + _png_chunk(b"acTL", struct.pack(">II", count, loop)))
+        control = struct.pack(">IIIIIHHBB", sequence, box[2] - box[0], box[3] - box[1], box[0], box[1],
+                              round(duration), 1000, 0, 0)
+        sequence += 1
+        parts = [_png_chunk(b"fcTL", control)]
+        for kind, data in chunks:
+            if kind != b"IDAT":
+                continue
+            if index == 0:
+                parts.append(_png_chunk(b"IDAT", data))
+            else:
+                parts.append(_png_chunk(b"fdAT", struct.pack(">I", sequence) + data))
+                sequence += 1
+        yield b"".join(parts)
+    yield _png_chunk(b"IEND", b"")
+
+# WebP : la taille totale figure dans l'en-tête RIFF, les images compressées
+# sont donc gardées jusqu'à la fin (quelques Ko chacune, jamais les pixels)
+
+def _riff_chunk(kind, data):
+    return kind + struct.pack("<I", len(data)) + data + b"\x00" * (len(data) & 1)
+
+def _webp_bitstream(img):
+    """Blocs VP8L (ou VP8 et ALPH) d'une image encodée seule par Pillow, sans perte"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='WEBP', lossless=True, method=0)
+    data = buffer.getvalue()
+    parts = []
+    offset = 12
+    while offset < len(data):
+        kind, length = struct.unpack_from("<4sI", data, offset)
+        if kind in (b"VP8L", b"VP8 ", b"ALPH"):
+            parts.append(data[offset:offset + 8 + length + (length & 1)])
+        offset += 8 + length + (length & 1)
+    return b"".join(parts)
+
+def _uint24(value):
+    return struct.pack("<I", value)[:3]
+
+def _encode_webp(frames, count, duration, loop):
+    parts = []
+    size = None
+    for frame, box in _frame_boxes(frames, even=True):
+        size = size or frame.size
+        header = (_uint24(box[0] // 2) + _uint24(box[1] // 2) + _uint24(box[2] - box[0] - 1)
+                  + _uint24(box[3] - box[1] - 1) + _uint24(round(duration)) + b"\x00")
+        parts.append(_riff_chunk(b"ANMF", header + _webp_bitstream(frame.crop(box))))
+    body = (b"WEBP" + _riff_chunk(b"VP8X", b"\x02\x00\x00\x00" + _uint24(size[0] - 1) + _uint24(size[1] - 1))
+            + _riff_chunk(b"ANIM", b"\x00\x00\x00\x00" + struct.pack("<H", loop)) + b"".join(parts))
+    yield b"RIFF" + struct.pack("<I", len(body)) + body
+
+_ENCODERS = {"gif": _encode_gif, "apng": _encode_apng, "webp": _encode_webp}
+
+def encode_animation(frames, fmt, count, duration, loop=0):
+    """Encode les images (itérable d'images de même taille) en animation, morceau par morceau
+
+    `count` est le nombre d'images annoncé (APNG), `duration` la durée de
+    chaque image en ms et `loop` le nombre de boucles (0 = infini). Les
+    images sont consommées au fur et à mesure ; les octets du fichier sont
+    produits dès que possible (à la fin seulement pour WebP).
+    """
+    if fmt not in _ENCODERS:
+        raise ValueError(f"Format d'animation non supporté: {fmt}")
+    return _ENCODERS[fmt](frames, count, duration, loop)
+
+# Octets d'une animation gardés en mémoire avant de passer sur disque
+SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+
+class SpooledStream:
+    """Flux produit dans un thread au rythme du rendu, relu au rythme du client
+
+    `produce()` renvoie l'itérable des morceaux ; il est consommé sans
+    attendre le client et écrit dans un fichier temporaire (en mémoire
+    jusqu'à SPOOL_MEMORY_BYTES), relu par read() au fur et à mesure. Les
+    ressources du rendu (slot, worker) sont donc rendues dès la fin de la
+    production, quelle que soit la vitesse du client ; `on_done()` est appelé
+    à ce moment-là. close() arrête la production (client parti) et libère
+    le fichier.
+    """
+
+    def __init__(self, produce, on_done=None):
+        self._produce = produce
+        self._on_done = on_done
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        self._size = 0
+        self._done = False
+        self._closed = False
+        self._lock = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="spooled-stream").start()
+
+    def _run(self):
+        chunks = self._produce()
+        try:
+            for chunk in chunks:
+                with self._lock:
+                    if self._closed:
+                        break
+                    self._file.seek(self._size)
+                    self._file.write(chunk)
+                    self._size += len(chunk)
+                    self._lock.notify_all()
+        except Exception as e:
+            # En-têtes déjà envoyés : le fichier reste tronqué
+            logging.error(f"Erreur de production du flux: {str(e)}")
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                self._done = True
+                self._lock.notify_all()
+            if self._on_done is not None:
+                self._on_done()
+
+    def read(self):
+        """Morceaux déjà produits, dans l'ordre, jusqu'à la fin de la production"""
+        position = 0
+        while True:
+            with self._lock:
+                while position == self._size and not self._done and not self._closed:
+                    self._lock.wait()
+                if self._closed or (position == self._size and self._done):
+                    return
+                self._file.seek(position)
+                data = self._file.read(self._size - position)
+            position += len(data)
+            yield data
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._file.close()
+            self._lock.notify_all()
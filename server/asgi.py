@@ -0,0 +1,200 @@
+"""Point d'entrée de production : uvicorn asgi:app --host 0.0.0.0 --port 8080
+
+Les requêtes sont reçues par la boucle asyncio et exécutées par l'application
+Flask dans un pool de threads borné ; la boucle ne bloque donc jamais sur un
+rendu, qui est lui-même confié au pool de processus. Quand tous les threads
+sont occupés, la requête est refusée (503 + Retry-After) au lieu d'attendre.
+À l'arrêt, les rendus et travaux en cours sont terminés avant de fermer le pool.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+from backlog import RENDER_BACKLOG_MAX, RENDER_RETRY_AFTER
+from render_pool import get_render_pool
+
+# Threads de traitement : le backlog de rendu plus une marge pour les requêtes légères
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", RENDER_BACKLOG_MAX + 8))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 30))
+# Taille maximale d'un corps de requête (octets) : au-delà, 413 sans le lire en entier
+ASGI_MAX_BODY_BYTES = int(os.environ.get("ASGI_MAX_BODY_BYTES", 1024 * 1024))
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi")
+_active = 0
+_draining = False
+
+def build_environ(scope, body):
+    """Environnement WSGI (PEP 3333) d'une requête HTTP ASGI"""
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": scope["client"][0] if scope.get("client") else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def run_wsgi(environ, send_message):
+    """Exécute l'application Flask (dans un thread) et transmet la réponse morceau par morceau"""
+    start = {}
+
+    def start_response(status, headers, exc_info=None):
+        start["status"] = int(status.split(" ", 1)[0])
+        start["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    def send_start():
+        send_message({"type": "http.response.start", "status": start["status"], "headers": start["headers"]})
+
+    result = server.app(environ, start_response)
+    try:
+        started = False
+        for chunk in result:
+            if not chunk:
+                continue
+            if not started:
+                send_start()
+                started = True
+            # Réponses en flux (NDJSON des lots) transmises dès qu'elles sont produites
+            send_message({"type": "http.response.body", "body": chunk, "more_body": True})
+        if not started:
+            send_start()
+        send_message({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+async def error_response(send, status, message, headers=()):
+    """Réponse d'erreur JSON envoyée directement par la boucle, sans occuper de thread"""
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), *headers]})
+    await send({"type": "http.response.body", "body": json.dumps({"error": message}).encode("utf-8")})
+
+async def overloaded(send, message):
+    """Réponse 503 + Retry-After"""
+    await error_response(send, 503, message, [(b"retry-after", str(RENDER_RETRY_AFTER).encode("ascii"))])
+
+async def too_large(send):
+    """Réponse 413 : corps de requête au-delà de ASGI_MAX_BODY_BYTES"""
+    await error_response(send, 413, f"Corps de requête trop volumineux (max {ASGI_MAX_BODY_BYTES} octets)")
+
+def declared_length(scope):
+    """Content-Length annoncé par le client, None s'il est absent ou invalide"""
+    for name, value in scope["headers"]:
+        if name.lower() == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+async def check_overload(send):
+    """Envoie un 503 et renvoie True si le serveur s'arrête ou n'a plus de thread libre"""
+    if _draining:
+        await overloaded(send, "Serveur en cours d'arrêt")
+        return True
+    if _active >= ASGI_THREADS:
+        await overloaded(send, "Serveur saturé, réessayez plus tard")
+        return True
+    return False
+
+async def handle_http(scope, receive, send):
+    global _active
+    # Refus (503, 413) avant de lire le corps : rien n'est mis en mémoire pour une requête rejetée
+    if await check_overload(send):
+        return
+    length = declared_length(scope)
+    if length is not None and length > ASGI_MAX_BODY_BYTES:
+        await too_large(send)
+        return
+
+    # Corps sans longueur annoncée (ou mensongère) : limite vérifiée au fil de la lecture
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+        body += message.get("body", b"")
+        if len(body) > ASGI_MAX_BODY_BYTES:
+            await too_large(send)
+            return
+        if not message.get("more_body"):
+            break
+
+    # Les threads ont pu être pris pendant la lecture du corps
+    if await check_overload(send):
+        return
+
+    loop = asyncio.get_running_loop()
+
+    def send_message(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    _active += 1
+    try:
+        await loop.run_in_executor(executor, run_wsgi, build_environ(scope, bytes(body)), send_message)
+    finally:
+        _active -= 1
+
+async def handle_lifespan(receive, send):
+    global _draining
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Workers de rendu lancés avant la première requête, puis préréglages
+            # manquants rendus en arrière-plan
+            await loop.run_in_executor(None, get_render_pool)
+            server.warm_presets()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Plus de nouvelles requêtes, puis attente des requêtes et travaux en cours
+            _draining = True
+            deadline = loop.time() + SHUTDOWN_DRAIN_TIMEOUT
+            while _active and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            await loop.run_in_executor(None, server.shutdown, max(0.0, deadline - loop.time()))
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """Application ASGI : mêmes routes et mêmes contrats que l'application Flask"""
+    if scope["type"] == "lifespan":
+        await handle_lifespan(receive, send)
+    elif scope["type"] == "http":
+        await handle_http(scope, receive, send)
+
+def main():
+    """Lance le serveur ASGI (uvicorn) selon HOST et PORT"""
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(app, host=os.environ.get("HOST", "127.0.0.1"), port=int(os.environ.get("PORT", 8080)),
+                timeout_graceful_shutdown=SHUTDOWN_DRAIN_TIMEOUT)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from render_pool import RENDER_POOL_SIZE
+
+# Rendus admis simultanément (en cours + en attente d'un worker) avant de refuser
+RENDER_BACKLOG_MAX = int(os.environ.get("RENDER_BACKLOG_MAX", RENDER_POOL_SIZE * 4))
+# Délai conseillé au client refusé (en-tête Retry-After, secondes)
+RENDER_RETRY_AFTER = int(os.environ.get("RENDER_RETRY_AFTER", 2))
+
+class BacklogFull(Exception):
+    """Trop de rendus en attente (ou arrêt en cours) : réponse 503 avec Retry-After"""
+
+class RenderBacklog:
+    """File d'attente bornée devant le pool de rendu
+
+    Plutôt que de laisser s'accumuler sans limite les requêtes bloquées sur le
+    sémaphore, chaque rendu prend une place ; au-delà de `max_size` places,
+    ou après close(), la demande est refusée immédiatement. drain() attend la
+    fin des rendus admis (arrêt propre).
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or RENDER_BACKLOG_MAX
+        self._lock = threading.Condition()
+        self._active = 0
+        self._closed = False
+        self._rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """Réserve une place pour la durée d'un rendu, ou lève BacklogFull"""
+        with self._lock:
+            if self._closed:
+                self._rejected += 1
+                raise BacklogFull("Serveur en cours d'arrêt")
+            if self._active >= self.max_size:
+                self._rejected += 1
+                raise BacklogFull(f"Trop de rendus en attente ({self._active}), réessayez plus tard")
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._lock.notify_all()
+
+    def close(self):
+        """Refuse toute nouvelle demande"""
+        with self._lock:
+            self._closed = True
+
+    def drain(self, timeout=None):
+        """Attend la fin des rendus admis ; renvoie True si tout est terminé à temps"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._active:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {"active": self._active, "max_size": self.max_size,
+                    "rejected": self._rejected, "closed": self._closed}
@@ -0,0 +1,105 @@
+"""Benchmark : traitement de transparence pixel par pixel vs opérations NumPy
+
+Usage : python benchmarks/bench_compositing.py [tailles...]
+
+Compare l'ancien traitement (boucles Python sur getdata/putdata) avec le
+module compositing, vérifie que les sorties sont identiques et affiche les
+temps moyens pour chaque taille d'image.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compositing import (to_rgba_array, key_white_to_transparent, ramp_white_alpha,
+                         restore_black, fill_background)
+
+def legacy_key_white(img):
+    """Ancien traitement de server.generate_pattern_with_params"""
+    new_data = []
+    for item in img.getdata():
+        if item[0] >= 250 and item[1] >= 250 and item[2] >= 250:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+    out = img.copy()
+    out.putdata(new_data)
+    return out
+
+def legacy_ramp_white(img):
+    """Ancien traitement de turtle_worker.main (fond non blanc)"""
+    new_data = []
+    for item in img.getdata():
+        if item[0] >= 250 and item[1] >= 250 and item[2] >= 250:
+            distance_from_white = max(255 - item[0], 255 - item[1], 255 - item[2])
+            alpha = 0 if distance_from_white < 5 else min(255, distance_from_white * 50)
+            new_data.append((item[0], item[1], item[2], alpha))
+        else:
+            new_data.append(item)
+    out = img.copy()
+    out.putdata(new_data)
+    return out
+
+def legacy_restore_black(img):
+    """Ancien traitement de turtle_worker.main (couleur #000000)"""
+    new_data = []
+    for item in img.getdata():
+        white = item[0] >= 250 and item[1] >= 250 and item[2] >= 250
+        if item[0] <= 5 and item[1] <= 5 and item[2] <= 5 and not white:
+            new_data.append((0, 0, 0, 255))
+        elif white:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+    out = img.copy()
+    out.putdata(new_data)
+    return out
+
+def legacy_fill(img, bg_rgb):
+    final_img = Image.new('RGB', img.size, bg_rgb)
+    final_img.paste(img, (0, 0), img)
+    return final_img
+
+def sample_image(size):
+    """Motif de test : traits anticrénelés sur fond blanc, avec du quasi-noir"""
+    img = Image.new('RGB', (size * 2, size * 2), 'white')
+    draw = ImageDraw.Draw(img)
+    for i in range(0, size * 2, 7):
+        draw.line((0, i, size * 2, size * 2 - i), fill=(0, 112, 243), width=2)
+        draw.line((i, 0, size * 2 - i, size * 2), fill=(1, 1, 1), width=2)
+    return img.reduce(2).convert('RGBA')
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+def run(sizes):
+    bg_rgb = (18, 52, 86)
+    cases = [
+        ("key_white", legacy_key_white, key_white_to_transparent),
+        ("ramp_white", legacy_ramp_white, ramp_white_alpha),
+        ("restore_black", legacy_restore_black, restore_black),
+    ]
+    print(f"{'étape':<16}{'taille':>8}{'boucles (ms)':>15}{'numpy (ms)':>13}{'gain':>8}  identique")
+    for size in sizes:
+        img = sample_image(size)
+        repeat = 3 if size <= 1000 else 1
+        for name, legacy, vectorized in cases:
+            def run_legacy():
+                return legacy_fill(legacy(img), bg_rgb)
+            def run_vectorized():
+                return fill_background(vectorized(to_rgba_array(img)), bg_rgb)
+            legacy_time, legacy_out = timed(run_legacy, repeat)
+            fast_time, fast_out = timed(run_vectorized, repeat)
+            same = np.array_equal(np.asarray(legacy_out), np.asarray(fast_out))
+            print(f"{name:<16}{size:>8}{legacy_time * 1000:>15.1f}{fast_time * 1000:>13.1f}"
+                  f"{legacy_time / fast_time:>7.0f}x  {'oui' if same else 'NON'}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2000])
@@ -0,0 +1,64 @@
+"""Benchmark : ancien glow (3 flous gaussiens pleine résolution) vs pyramide
+
+Usage : python benchmarks/bench_glow.py [tailles...]
+
+Compare l'ancien apply_glow_effect avec compositing.apply_glow sur un motif
+à fond transparent (cas où le glow est visible) et sur un rendu opaque, et
+affiche les temps ainsi que l'écart moyen et maximal entre les sorties.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compositing import apply_glow
+
+def legacy_glow(img, intensity=0.5):
+    """Ancien server.apply_glow_effect"""
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    glow_layers = []
+    for radius, base, gain in ((2, 1.2, 0.3), (5, 1.1, 0.4), (10, 1.0, 0.5)):
+        layer = img.filter(ImageFilter.GaussianBlur(radius=radius))
+        glow_layers.append(ImageEnhance.Brightness(layer).enhance(base + intensity * gain))
+    result = img.copy()
+    for glow_layer in reversed(glow_layers):
+        result = Image.alpha_composite(result, glow_layer)
+    return Image.alpha_composite(result, img)
+
+def sample_image(size, transparent):
+    """Motif néon : traits colorés sur fond transparent (ou noir opaque)"""
+    background = (0, 0, 0, 0) if transparent else (0, 0, 0, 255)
+    img = Image.new('RGBA', (size, size), background)
+    draw = ImageDraw.Draw(img)
+    width = max(1, size // 170)
+    for i in range(0, size, max(4, size // 25)):
+        draw.line((0, i, size, size - i), fill=(0, 112, 243, 255), width=width)
+        draw.ellipse((i // 2, i // 2, size - i // 2, size - i // 2), outline=(255, 107, 107, 255), width=width)
+    return img
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+def run(sizes, intensity=0.7):
+    print(f"{'fond':<14}{'taille':>8}{'ancien (ms)':>14}{'pyramide (ms)':>16}{'gain':>8}{'écart moy.':>12}{'écart max':>11}")
+    for transparent in (True, False):
+        for size in sizes:
+            img = sample_image(size, transparent)
+            repeat = 3 if size <= 1000 else 1
+            legacy_time, legacy_out = timed(lambda: legacy_glow(img, intensity), repeat)
+            fast_time, fast_out = timed(lambda: apply_glow(img, intensity), repeat)
+            diff = np.abs(np.asarray(legacy_out, dtype=np.int16) - np.asarray(fast_out, dtype=np.int16))
+            label = "transparent" if transparent else "opaque"
+            print(f"{label:<14}{size:>8}{legacy_time * 1000:>14.1f}{fast_time * 1000:>16.1f}"
+                  f"{legacy_time / fast_time:>7.1f}x{diff.mean():>12.2f}{diff.max():>11}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2000, 4000])
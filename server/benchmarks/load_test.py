@@ -0,0 +1,139 @@
+"""Test de charge HTTP de /api/generate et /api/combine
+
+Usage : python benchmarks/load_test.py [--url http://127.0.0.1:8080] [--concurrency 1,4,16]
+                                       [--requests 50] [--endpoint generate|combine|all]
+                                       [--unique] [--output fichier.json]
+
+Pour chaque niveau de concurrence, envoie `--requests` requêtes par point
+d'accès avec autant de clients simultanés, et mesure les latences (p50,
+p95, p99), le débit et les erreurs. --unique fait varier les paramètres
+d'une requête à l'autre pour contourner le cache de rendu. Le serveur doit
+déjà tourner (python server.py ou uvicorn asgi:app).
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+GENERATE_BODY = {"mode": "fractal", "fractal_type": "tree", "iterations": 7, "size": 150, "angle": 30,
+                 "reduction": 0.7, "color": "#0070f3", "background_color": "#101020",
+                 "gradient": True, "gradient_start": "#0070f3", "gradient_end": "#ff6b6b",
+                 "symmetry": {"rotation": 4}}
+COMBINE_LAYER = {"mode": "spiral", "turns": 12, "size": 10, "increment": 5, "angle": 10, "color": "#ff6b6b"}
+
+def percentile(values, fraction):
+    """Percentile par interpolation linéaire sur des valeurs triées"""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def make_body(endpoint, index, unique):
+    generate = dict(GENERATE_BODY)
+    if unique:
+        # Angle différent à chaque requête : jamais deux fois le même rendu
+        generate["angle"] = 10 + (index * 0.37) % 80
+    if endpoint == "generate":
+        return generate
+    return {"layers": [{"params": generate}, {"params": COMBINE_LAYER, "blendMode": "screen", "opacity": 0.8}]}
+
+def send(url, body, timeout):
+    """Une requête POST JSON ; renvoie (latence en s, code HTTP ou None, octets reçus)"""
+    request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read()
+            return time.perf_counter() - start, response.status, len(data)
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - start, e.code, 0
+    except (urllib.error.URLError, TimeoutError, ConnectionError):
+        return time.perf_counter() - start, None, 0
+
+def run_level(base_url, endpoint, concurrency, total, unique, timeout, counter):
+    url = f"{base_url}/api/{endpoint}"
+    bodies = [make_body(endpoint, next(counter), unique) for _ in range(total)]
+    results = []
+    lock = threading.Lock()
+
+    def worker(body):
+        result = send(url, body, timeout)
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, bodies))
+    elapsed = time.perf_counter() - start
+
+    ok = sorted(latency for latency, status, _ in results if status == 200)
+    statuses = {}
+    for _, status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(ok),
+        "errors": total - len(ok),
+        "status_codes": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(value * 1000, 1) if value is not None else None
+            for name, value in (("p50", percentile(ok, 0.50)), ("p95", percentile(ok, 0.95)),
+                                ("p99", percentile(ok, 0.99)),
+                                ("mean", statistics.fmean(ok) if ok else None),
+                                ("max", ok[-1] if ok else None))
+        },
+        "bytes": sum(size for _, _, size in results),
+    }
+    latency = summary["latency_ms"]
+    print(f"{endpoint:<10}{concurrency:>6}{total:>7}{summary['errors']:>8}{summary['throughput_rps']:>10.2f}"
+          + "".join(f"{latency[name] if latency[name] is not None else '-':>10}" for name in ("p50", "p95", "p99")))
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge HTTP du générateur de motifs")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", default="1,4,16", help="niveaux de concurrence, séparés par des virgules")
+    parser.add_argument("--requests", type=int, default=50, help="requêtes par niveau et par point d'accès")
+    parser.add_argument("--endpoint", choices=("generate", "combine", "all"), default="all")
+    parser.add_argument("--unique", action="store_true", help="paramètres différents à chaque requête (pas de cache)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", default=None, help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    endpoints = ("generate", "combine") if args.endpoint == "all" else (args.endpoint,)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    counter = itertools.count()
+
+    print(f"{'endpoint':<10}{'conc.':>6}{'req.':>7}{'erreurs':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    results = [run_level(args.url.rstrip('/'), endpoint, level, args.requests, args.unique, args.timeout, counter)
+               for endpoint in endpoints for level in levels]
+
+    output = args.output or f"load-test-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump({
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "url": args.url,
+            "unique": args.unique,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "levels": results,
+        }, f, indent=2)
+    print(f"\nRésultats écrits dans {output}")
+    return 0 if all(level["errors"] == 0 for level in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Benchmark du pipeline de génération, étape par étape
+
+Usage : python benchmarks/run_benchmarks.py [--quick] [--repeat N] [--output fichier.json]
+                                             [--compare ancien.json] [--filter texte]
+
+Rend chaque mode et chaque type de fractale aux valeurs extrêmes (depth=50,
+iterations=8, turns=20/angle=1), sans symétrie puis avec chaque option de
+symétrie, dans le processus courant (sans pool) pour isoler les étapes :
+géométrie, rastérisation, détourage du fond, glow, encodage PNG et
+base64/JSON. Les résultats sont écrits en JSON (médiane par étape en ms) ;
+--compare affiche l'écart avec un fichier de résultats précédent.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compositing import to_rgba_array, fill_background, key_white_to_transparent, apply_glow
+from rasterizer import rasterize, zoom_for_size
+from turtle_worker import apply_background, build_segments, count_segments, hex_to_rgb, output_size
+
+STAGES = ("geometry", "raster", "keying", "glow", "png_encode", "base64_json")
+
+COMMON = {"color": "#0070f3", "background_color": "#101020", "gradient": True,
+          "gradient_start": "#0070f3", "gradient_end": "#ff6b6b", "glow": True, "glow_intensity": 0.7}
+
+# Modes aux valeurs extrêmes acceptées par normalize_params
+BASE_CASES = {
+    "geometric": {"mode": "geometric", "sides": 12, "depth": 50, "size": 300, "angle": 20},
+    "tree": {"mode": "fractal", "fractal_type": "tree", "iterations": 8, "size": 150, "angle": 30, "reduction": 0.7},
+    "koch": {"mode": "fractal", "fractal_type": "koch", "iterations": 8, "size": 150},
+    "sierpinski": {"mode": "fractal", "fractal_type": "sierpinski", "iterations": 8, "size": 200},
+    "dragon": {"mode": "fractal", "fractal_type": "dragon", "iterations": 8, "size": 150},
+    "spiral": {"mode": "spiral", "turns": 20, "size": 5, "increment": 20, "angle": 1},
+}
+
+SYMMETRIES = {
+    "none": None,
+    "mirror": {"mirror": True},
+    "rotation4": {"rotation": 4},
+    "rotation8_mirror": {"rotation": 8, "mirror": True},
+    "kaleidoscope": {"kaleidoscope": True},
+    "kaleidoscope_mirror": {"kaleidoscope": True, "mirror": True},
+}
+
+def build_cases(quick):
+    cases = []
+    for mode_name, base in BASE_CASES.items():
+        symmetries = ("none", "kaleidoscope_mirror") if quick else SYMMETRIES
+        for symmetry_name in symmetries:
+            params = {**COMMON, **base}
+            if SYMMETRIES[symmetry_name]:
+                params["symmetry"] = SYMMETRIES[symmetry_name]
+            cases.append((f"{mode_name}/{symmetry_name}", params))
+    return cases
+
+def run_stages(params):
+    """Un rendu complet, mêmes étapes que render_image puis generate_pattern_with_params ; temps en ms"""
+    timings = {}
+    clock = time.perf_counter
+
+    start = clock()
+    segments = build_segments(params)
+    timings["geometry"] = clock() - start
+
+    size = output_size(params)
+    start = clock()
+    img = rasterize(segments, size=size, background="white")
+    timings["raster"] = clock() - start
+
+    # Détourage côté worker (alpha progressif, flou de bord, fond) puis côté serveur
+    start = clock()
+    img = apply_background(img.convert('RGBA'), params, 0.5 * zoom_for_size(size))
+    img = fill_background(key_white_to_transparent(to_rgba_array(img)), hex_to_rgb(params["background_color"]))
+    timings["keying"] = clock() - start
+
+    start = clock()
+    if params.get("glow"):
+        img = apply_glow(img, params["glow_intensity"], zoom_for_size(size))
+    timings["glow"] = clock() - start
+
+    start = clock()
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    png_bytes = buffer.getvalue()
+    timings["png_encode"] = clock() - start
+
+    start = clock()
+    json.dumps({"image": "data:image/png;base64," + base64.b64encode(png_bytes).decode('utf-8'), "params": params})
+    timings["base64_json"] = clock() - start
+
+    return {stage: seconds * 1000 for stage, seconds in timings.items()}, len(png_bytes)
+
+def run(cases, repeat):
+    results = []
+    print(f"{'cas':<32}{'segments':>10}" + "".join(f"{stage:>13}" for stage in STAGES) + f"{'total':>10}")
+    for name, params in cases:
+        runs = []
+        for _ in range(repeat):
+            timings, png_size = run_stages(params)
+            runs.append(timings)
+        stages = {stage: round(statistics.median(run[stage] for run in runs), 2) for stage in STAGES}
+        total = round(sum(stages.values()), 2)
+        results.append({"name": name, "params": params, "segments": count_segments(params),
+                        "png_bytes": png_size, "stages_ms": stages, "total_ms": total})
+        print(f"{name:<32}{count_segments(params):>10}" + "".join(f"{stages[stage]:>13.1f}" for stage in STAGES)
+              + f"{total:>10.1f}")
+    return results
+
+def compare(results, previous_path):
+    """Affiche l'écart de temps total avec un fichier de résultats précédent"""
+    with open(previous_path) as f:
+        previous = {case["name"]: case for case in json.load(f)["cases"]}
+    print(f"\n{'cas':<32}{'avant (ms)':>12}{'après (ms)':>12}{'écart':>9}")
+    for case in results:
+        before = previous.get(case["name"])
+        if before is None:
+            continue
+        change = (case["total_ms"] - before["total_ms"]) / before["total_ms"] * 100 if before["total_ms"] else 0.0
+        print(f"{case['name']:<32}{before['total_ms']:>12.1f}{case['total_ms']:>12.1f}{change:>+8.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du pipeline de génération")
+    parser.add_argument("--quick", action="store_true", help="sans symétrie et kaléidoscope + miroir seulement")
+    parser.add_argument("--repeat", type=int, default=3, help="rendus par cas (médiane)")
+    parser.add_argument("--filter", default="", help="ne garder que les cas contenant ce texte")
+    parser.add_argument("--output", default=None, help="fichier JSON de résultats")
+    parser.add_argument("--compare", default=None, help="fichier JSON d'un run précédent")
+    args = parser.parse_args()
+
+    cases = [(name, params) for name, params in build_cases(args.quick) if args.filter in name]
+    results = run(cases, max(1, args.repeat))
+
+    output = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump({
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "cases": results,
+        }, f, indent=2)
+    print(f"\nRésultats écrits dans {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
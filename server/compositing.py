@@ -0,0 +1,211 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Seuils de détection du fond blanc et du noir de substitution (#010101)
+WHITE_THRESHOLD = 250
+BLACK_THRESHOLD = 5
+
+def to_rgba_array(img):
+    """Convertit une image PIL en tableau RGBA uint8 (hauteur, largeur, 4)"""
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    return np.asarray(img).copy()
+
+def _all_channels(rgba, predicate):
+    # Canal par canal : plus rapide qu'une réduction sur le dernier axe
+    return predicate(rgba[..., 0]) & predicate(rgba[..., 1]) & predicate(rgba[..., 2])
+
+def _white_mask(rgba, threshold=WHITE_THRESHOLD):
+    return _all_channels(rgba, lambda channel: channel >= threshold)
+
+def key_white_to_transparent(rgba, threshold=WHITE_THRESHOLD):
+    """Rend transparents (255, 255, 255, 0) les pixels proches du blanc"""
+    out = rgba.copy()
+    out[_white_mask(rgba, threshold)] = (255, 255, 255, 0)
+    return out
+
+def ramp_white_alpha(rgba, threshold=WHITE_THRESHOLD):
+    """Alpha progressif pour les pixels proches du blanc (anti-aliasing des bords)
+
+    La couleur est conservée ; l'alpha vaut 0 si la distance au blanc pur est
+    inférieure à 5, sinon distance * 50 (plafonné à 255).
+    """
+    out = rgba.copy()
+    white = _white_mask(rgba, threshold)
+    lowest = np.minimum(np.minimum(rgba[..., 0], rgba[..., 1]), rgba[..., 2])
+    distance = 255 - lowest[white].astype(np.uint16)
+    out[..., 3][white] = np.where(distance < 5, 0, np.minimum(255, distance * 50))
+    return out
+
+def restore_black(rgba, threshold=BLACK_THRESHOLD, white_threshold=WHITE_THRESHOLD):
+    """Remplace le noir de substitution par du vrai noir et rend le fond blanc transparent"""
+    out = rgba.copy()
+    white = _white_mask(rgba, white_threshold)
+    black = _all_channels(rgba, lambda channel: channel <= threshold) & ~white
+    out[black] = (0, 0, 0, 255)
+    out[white] = (255, 255, 255, 0)
+    return out
+
+def fill_background(rgba, bg_rgb):
+    """Compose l'image RGBA sur un fond uni et renvoie une image RGB
+
+    Reproduit exactement l'arrondi de `Image.paste(img, (0, 0), img)` de
+    Pillow, pour un résultat identique à l'ancien traitement.
+    """
+    # uint16 suffit : 255 * 255 + 128 + 254 < 65536
+    alpha = rgba[..., 3].astype(np.uint16)
+    inverse = 255 - alpha
+    out = np.empty(rgba.shape[:2] + (3,), dtype=np.uint8)
+    for channel in range(3):
+        tmp = rgba[..., channel] * alpha
+        tmp += inverse * np.uint16(bg_rgb[channel])
+        tmp += 128
+        tmp += tmp >> 8
+        out[..., channel] = tmp >> 8
+    return Image.fromarray(out, 'RGB')
+
+# Couches du glow, de la plus floue à la plus nette :
+# (rayon du flou gaussien, luminosité de base, luminosité par unité d'intensité)
+GLOW_LAYERS = ((10, 1.0, 0.5), (5, 1.1, 0.4), (2, 1.2, 0.3))
+
+def _blur_pyramid_level(radius):
+    """Niveau de réduction (facteur 2**niveau) pour flouter au rayon donné
+
+    On réduit tant que le rayon restant au niveau inférieur vaut au moins un
+    pixel : en dessous, l'approximation devient visible.
+    """
+    level = 0
+    while radius / 2 ** (level + 1) >= 1:
+        level += 1
+    return level
+
+def _brighten(img, factor):
+    """Luminosité comme ImageEnhance.Brightness (tous les canaux, alpha compris), via une table"""
+    table = [min(255, int(value * factor)) for value in range(256)]
+    return img.point(table * len(img.getbands()))
+
+def _raw_bands(img):
+    """Vue RGBA sans prémultiplication (mode CMYK) : réduction, flou et
+    agrandissement traitent alors l'alpha comme un canal ordinaire, comme le
+    faisait GaussianBlur sur l'image RGBA d'origine"""
+    return Image.frombytes('CMYK', img.size, img.tobytes())
+
+def _rgba(img):
+    return Image.frombytes('RGBA', img.size, img.tobytes())
+
+def apply_glow(img, intensity=0.5, scale=1.0):
+    """Effet glow/néon : couches floues et éclaircies composées sous l'image
+
+    Même recette que l'ancien apply_glow_effect (flous de rayon 10, 5 et 2,
+    luminosité croissante avec `intensity`, image d'origine par-dessus), mais
+    chaque flou est calculé sur une pyramide d'images réduites. Les couches
+    sont composées de la plus floue à la plus nette en remontant la pyramide,
+    si bien qu'une seule couche cumulée est agrandie à pleine résolution.
+    `scale` multiplie les rayons (rendus haute résolution) : seuls des niveaux
+    de pyramide supplémentaires sont calculés, sans flou à grand rayon.
+    """
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+
+    # Image entièrement opaque : l'original recouvre toutes les couches
+    if img.getextrema()[3][0] == 255:
+        return img
+
+    # Pyramide : chaque niveau est la réduction 2x du précédent
+    layers = [(radius * scale, base, gain) for radius, base, gain in GLOW_LAYERS]
+    deepest = max(_blur_pyramid_level(radius) for radius, _, _ in layers)
+    pyramid = [_raw_bands(img)]
+    for _ in range(deepest):
+        if min(pyramid[-1].size) < 16:
+            break
+        pyramid.append(pyramid[-1].reduce(2))
+
+    glow = None
+    for radius, base, gain in layers:
+        level = min(_blur_pyramid_level(radius), len(pyramid) - 1)
+        layer = pyramid[level].filter(ImageFilter.GaussianBlur(radius=radius / 2 ** level))
+        layer = _rgba(_brighten(layer, base + intensity * gain))
+        if glow is not None:
+            # Couche cumulée agrandie au niveau de la couche suivante, plus nette
+            upscaled = _raw_bands(glow).resize(layer.size, Image.Resampling.BILINEAR)
+            layer = Image.alpha_composite(_rgba(upscaled), layer)
+        glow = layer
+    if glow.size != img.size:
+        glow = _rgba(_raw_bands(glow).resize(img.size, Image.Resampling.BILINEAR))
+
+    # L'original sous les couches de glow, puis par-dessus
+    return Image.alpha_composite(Image.alpha_composite(img, glow), img)
+
+def _blend_multiply(backdrop, source):
+    return backdrop * source
+
+def _blend_screen(backdrop, source):
+    return backdrop + source - backdrop * source
+
+def _blend_overlay(backdrop, source):
+    return np.where(backdrop <= 0.5,
+                    2.0 * backdrop * source,
+                    1.0 - 2.0 * (1.0 - backdrop) * (1.0 - source))
+
+def _blend_add(backdrop, source):
+    return np.minimum(backdrop + source, 1.0)
+
+def _blend_difference(backdrop, source):
+    return np.abs(backdrop - source)
+
+# Modes de fusion séparables (couleurs normalisées 0..1, non prémultipliées)
+BLEND_MODES = {
+    "normal": None,
+    "multiply": _blend_multiply,
+    "screen": _blend_screen,
+    "overlay": _blend_overlay,
+    "add": _blend_add,
+    "difference": _blend_difference,
+}
+
+def combine_layers(layers):
+    """Superpose des calques [(image, mode, opacité), ...] en une seule passe par calque
+
+    Le premier calque sert de fond et fixe la taille du résultat ; les
+    calques de même taille ne sont pas redimensionnés. Chaque calque est
+    fusionné avec son mode (formules séparables du W3C Compositing) puis
+    composé « over » avec son opacité, en couleurs prémultipliées float32.
+    Renvoie une image RGBA.
+    """
+    size = layers[0][0].size
+
+    def normalized(img):
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS)
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        return np.asarray(img, dtype=np.float32) * np.float32(1 / 255)
+
+    base_img, _, base_opacity = layers[0]
+    base = normalized(base_img)
+    alpha = base[..., 3:4] * np.float32(base_opacity)
+    color = base[..., :3] * alpha
+
+    for img, mode, opacity in layers[1:]:
+        if mode not in BLEND_MODES:
+            raise ValueError(f"Mode de fusion non supporté: {mode}")
+        layer = normalized(img)
+        source = layer[..., :3]
+        source_alpha = layer[..., 3:4] * np.float32(opacity)
+
+        blend = BLEND_MODES[mode]
+        if blend is not None:
+            # Cs' = (1 - ab) * Cs + ab * B(Cb, Cs), avec Cb la couleur du fond
+            backdrop = color / np.maximum(alpha, np.float32(1e-6))
+            source = source + alpha * (blend(backdrop, source) - source)
+
+        inverse = 1.0 - source_alpha
+        color *= inverse
+        color += source * source_alpha
+        alpha *= inverse
+        alpha += source_alpha
+
+    out = np.empty(color.shape[:2] + (4,), dtype=np.uint8)
+    out[..., :3] = np.clip(color / np.maximum(alpha, np.float32(1e-6)) * 255.0 + 0.5, 0, 255)
+    out[..., 3:4] = np.clip(alpha * 255.0 + 0.5, 0, 255)
+    return Image.fromarray(out, 'RGBA')
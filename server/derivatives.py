@@ -0,0 +1,126 @@
+import hashlib
+import io
+import os
+import threading
+
+from PIL import Image
+
+from render_cache import RenderCache
+
+# Déclinaisons d'une image : côté maximal en pixels (None = taille d'origine)
+DERIVATIVE_SIZES = {"thumb": 128, "medium": 512, "full": None}
+DERIVATIVE_FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+# Stockage des déclinaisons (mémoire LRU, disque optionnel)
+DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get("DERIVATIVE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DERIVATIVE_CACHE_DIR = os.environ.get("DERIVATIVE_CACHE_DIR", "")  # vide = pas de stockage disque
+DERIVATIVE_CACHE_DISK_MAX_BYTES = int(os.environ.get("DERIVATIVE_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+def image_hash(png_bytes):
+    """Hash de contenu (SHA-256) des octets PNG d'une image"""
+    return hashlib.sha256(png_bytes).hexdigest()
+
+def derivative_urls(content_hash):
+    """URL de chaque déclinaison (taille et format) d'une image"""
+    return {size: {fmt: f"/api/images/{content_hash}/{size}.{fmt}" for fmt in DERIVATIVE_FORMATS}
+            for size in DERIVATIVE_SIZES}
+
+def _encode(img, fmt, lossless):
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        # Vignette et aperçu en WebP avec perte : une fraction du PNG, à l'œil identique
+        img.save(buffer, format='WEBP', lossless=lossless, quality=80)
+    else:
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class DerivativeStore:
+    """Déclinaisons (vignette, aperçu, pleine taille ; PNG et WebP) des images rendues
+
+    Chaque image est enregistrée par add() sous le hash de ses octets PNG ;
+    ses déclinaisons réduites sont produites à la première demande, en une
+    passe (un seul décodage, l'aperçu réduit depuis l'original et la
+    vignette depuis l'aperçu, chacun dans les deux formats). Le WebP pleine
+    taille, plus coûteux, n'est encodé que s'il est demandé. Le contenu
+    d'une adresse ne change jamais. `source(hash)`, facultatif, fournit les
+    octets PNG d'une image absente du stockage (catalogue persistant).
+    """
+
+    def __init__(self, storage=None, source=None):
+        self.storage = storage or RenderCache(max_entries=4096, max_bytes=DERIVATIVE_CACHE_MAX_BYTES,
+                                              disk_dir=DERIVATIVE_CACHE_DIR,
+                                              disk_max_bytes=DERIVATIVE_CACHE_DISK_MAX_BYTES, suffix="")
+        self.source = source
+        self._lock = threading.Lock()
+        self._pending = {}  # (hash, pleine taille) -> événement levé quand la passe est terminée
+
+    @staticmethod
+    def _key(content_hash, size, fmt):
+        return f"{content_hash}.{size}.{fmt}"
+
+    def add(self, png_bytes):
+        """Enregistre l'image (octets PNG) et renvoie son hash de contenu"""
+        content_hash = image_hash(png_bytes)
+        key = self._key(content_hash, "full", "png")
+        if not self.storage.contains(key):
+            self.storage.put(key, png_bytes)
+        return content_hash
+
+    def _original(self, content_hash):
+        """Octets PNG d'origine, repris de `source` (et réenregistrés) s'ils ont quitté le stockage"""
+        key = self._key(content_hash, "full", "png")
+        data = self.storage.get(key)
+        if data is None and self.source is not None:
+            data = self.source(content_hash)
+            if data is not None:
+                self.storage.put(key, data)
+        return data
+
+    def get(self, content_hash, size, fmt):
+        """Octets d'une déclinaison, produite si besoin ; None si l'image est inconnue"""
+        if size == "full" and fmt == "png":
+            return self._original(content_hash)
+        key = self._key(content_hash, size, fmt)
+        data = self.storage.get(key)
+        if data is not None:
+            return data
+
+        task = (content_hash, size == "full")
+        with self._lock:
+            pending = self._pending.get(task)
+            owner = pending is None
+            if owner:
+                pending = self._pending[task] = threading.Event()
+        if owner:
+            try:
+                self._derive(content_hash, size == "full")
+            finally:
+                with self._lock:
+                    del self._pending[task]
+                pending.set()
+        else:
+            # Une autre requête produit déjà les déclinaisons de cette image
+            pending.wait()
+        return self.storage.get(key)
+
+    def _derive(self, content_hash, full):
+        """Déclinaisons réduites d'une image en une passe (ou son WebP pleine taille si `full`)"""
+        original = self._original(content_hash)
+        if original is None:
+            return
+        img = Image.open(io.BytesIO(original))
+        img.load()
+        if full:
+            self.storage.put(self._key(content_hash, "full", "webp"), _encode(img, "webp", lossless=True))
+            return
+        for size in ("medium", "thumb"):
+            side = DERIVATIVE_SIZES[size]
+            if max(img.size) > side:
+                # Chaque taille réduite depuis la précédente : coût dominé par la première réduction
+                img = img.copy()
+                img.thumbnail((side, side), Image.LANCZOS)
+            for fmt in DERIVATIVE_FORMATS:
+                self.storage.put(self._key(content_hash, size, fmt), _encode(img, fmt, lossless=False))
+
+    def stats(self):
+        return self.storage.stats()
@@ -0,0 +1,141 @@
+import math
+from array import array
+
+import numpy as np
+
+from segment_buffer import SegmentBuffer
+
+class GeometryTurtle:
+    """Tortue sans affichage : enregistre les segments tracés au lieu de les dessiner
+
+    Reprend le sous-ensemble de l'API turtle utilisé par les fonctions draw_*
+    (forward, right, color, goto...) avec les mêmes conventions : origine au
+    centre, axe Y vers le haut, cap 0 vers l'est, angles en degrés.
+    Les traits sont enregistrés dans des tableaux compacts (coordonnées,
+    indice de couleur, épaisseur) et lus sous forme de SegmentBuffer via
+    `segments`.
+    """
+
+    def __init__(self):
+        self._coords = array('f')
+        self._colors = array('H')
+        self._widths = array('B')
+        self._palette = []
+        self._palette_index = {}
+        self._x = 0.0
+        self._y = 0.0
+        self._heading = 0.0
+        self._pen_down = True
+        self._color = "black"
+        self._color_index = None
+        self._width = 1
+
+    # Déplacements
+    def forward(self, distance):
+        rad = math.radians(self._heading)
+        self._move_to(self._x + distance * math.cos(rad), self._y + distance * math.sin(rad))
+
+    def backward(self, distance):
+        self.forward(-distance)
+
+    def right(self, angle):
+        self._heading = (self._heading - angle) % 360
+
+    def left(self, angle):
+        self._heading = (self._heading + angle) % 360
+
+    def goto(self, x, y=None):
+        if y is None:
+            x, y = x
+        self._move_to(float(x), float(y))
+
+    def setheading(self, angle):
+        self._heading = angle % 360
+
+    def heading(self):
+        return self._heading
+
+    def position(self):
+        return (self._x, self._y)
+
+    # Stylo
+    def penup(self):
+        self._pen_down = False
+
+    def pendown(self):
+        self._pen_down = True
+
+    def color(self, color):
+        self._color = color
+        self._color_index = None
+
+    def pensize(self, width):
+        self._width = width
+
+    def spawn(self):
+        """Nouvelle tortue sans segments, au même état (position, cap, stylo)"""
+        other = GeometryTurtle()
+        other._x, other._y, other._heading = self._x, self._y, self._heading
+        other._pen_down, other._color, other._width = self._pen_down, self._color, self._width
+        return other
+
+    @property
+    def segments(self):
+        """Copie des segments tracés jusqu'ici (SegmentBuffer)"""
+        return SegmentBuffer(np.array(self._coords, dtype=np.float32).reshape(-1, 4),
+                             np.array(self._colors, dtype=np.uint16),
+                             np.array(self._widths, dtype=np.uint8), self._palette)
+
+    def extend_rotated(self, segments, center, angles):
+        """Ajoute des copies de `segments` (SegmentBuffer) tournées autour de `center`
+
+        Une copie par angle (degrés, sens trigonométrique comme setheading),
+        calculées en une seule opération matricielle par copie au lieu de
+        retracer le motif.
+        """
+        if not len(segments):
+            return
+        cx, cy = center
+        coords = segments.coords.astype(np.float64)
+        dx = coords[:, 0::2] - cx
+        dy = coords[:, 1::2] - cy
+        # Indices de couleur de `segments` ramenés à la palette de cette tortue
+        remap = np.array([self._index_of(color) for color in segments.palette], dtype=np.uint16)
+        colors = remap[segments.colors].tobytes()
+        widths = segments.widths.tobytes()
+        for angle in angles:
+            if angle % 360 == 0:
+                rotated = segments.coords
+            else:
+                rad = math.radians(angle)
+                cos, sin = math.cos(rad), math.sin(rad)
+                rotated = np.empty(coords.shape, dtype=np.float32)
+                rotated[:, 0::2] = cx + dx * cos - dy * sin
+                rotated[:, 1::2] = cy + dx * sin + dy * cos
+            self._coords.frombytes(np.ascontiguousarray(rotated, dtype=np.float32).tobytes())
+            self._colors.frombytes(colors)
+            self._widths.frombytes(widths)
+
+    # Sans effet : conservés pour rester compatible avec l'API turtle
+    def hideturtle(self):
+        pass
+
+    def speed(self, speed):
+        pass
+
+    def _index_of(self, color):
+        index = self._palette_index.get(color)
+        if index is None:
+            index = self._palette_index[color] = len(self._palette)
+            self._palette.append(color)
+        return index
+
+    def _move_to(self, x, y):
+        if self._pen_down:
+            if self._color_index is None:
+                self._color_index = self._index_of(self._color)
+            self._coords.extend((self._x, self._y, x, y))
+            self._colors.append(self._color_index)
+            self._widths.append(self._width)
+        self._x = x
+        self._y = y
@@ -0,0 +1,241 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from render_pool import RenderCancelled, RENDER_POOL_SIZE
+
+# Configuration de la file (surchargeable par variables d'environnement)
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", 100))
+JOB_MAX_PER_CLIENT = int(os.environ.get("JOB_MAX_PER_CLIENT", 10))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", RENDER_POOL_SIZE))
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 600))
+
+# Priorités, de la plus urgente à la moins urgente
+JOB_PRIORITIES = ("high", "normal", "low")
+
+class JobQueueFull(Exception):
+    """File pleine (globalement ou pour ce client) : la demande doit être refaite plus tard"""
+
+class Job:
+    """Rendu asynchrone : état, avancement et résultat"""
+
+    def __init__(self, params, total, priority, client):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.priority = priority
+        self.client = client
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.segments_total = total
+        self.fraction = 0.0
+        self.result = None
+        self.cache_status = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self):
+        """État public du travail (sans le résultat binaire)"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "progress": {
+                "segments_drawn": round(self.segments_total * self.fraction),
+                "segments_total": self.segments_total,
+                "percent": round(self.fraction * 100, 1),
+            },
+            "params": self.params,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """File de rendus asynchrones en mémoire, sans service externe
+
+    Une file par priorité ; dans une même priorité les clients sont servis à
+    tour de rôle (un travail par client et par tour), pour qu'un client qui
+    soumet beaucoup de travaux ne bloque pas les autres. `runner(params,
+    progress, cancel)` exécute un rendu et renvoie (octets PNG, statut cache).
+    Les travaux terminés sont conservés `result_ttl` secondes.
+    """
+
+    def __init__(self, runner, workers=None, max_depth=None, max_per_client=None, result_ttl=None):
+        self.runner = runner
+        self.workers = max(1, workers or JOB_WORKERS)
+        self.max_depth = max_depth if max_depth is not None else JOB_QUEUE_MAX_DEPTH
+        self.max_per_client = max_per_client if max_per_client is not None else JOB_MAX_PER_CLIENT
+        self.result_ttl = result_ttl if result_ttl is not None else JOB_RESULT_TTL
+
+        self._lock = threading.Condition()
+        self._jobs = {}
+        # priorité -> client -> travaux en attente (ordre des clients = tour de rôle)
+        self._pending = {priority: OrderedDict() for priority in JOB_PRIORITIES}
+        self._depth = 0
+        self._threads = []
+        self._closed = False
+
+    def _start(self):
+        # Threads de répartition lancés au premier travail
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._dispatch_loop, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, params, total, priority="normal", client=None):
+        """Met un rendu en file et renvoie le Job créé"""
+        if priority not in JOB_PRIORITIES:
+            raise ValueError(f"Priorité non supportée: {priority}")
+        job = Job(params, total, priority, client)
+        with self._lock:
+            self._purge()
+            if self._closed:
+                raise JobQueueFull("Serveur en cours d'arrêt")
+            if self._depth >= self.max_depth:
+                raise JobQueueFull(f"File de rendu pleine ({self.max_depth} travaux en attente)")
+            active = sum(1 for other in self._jobs.values() if other.client == client and not other.finished)
+            if active >= self.max_per_client:
+                raise JobQueueFull(f"Trop de travaux en cours pour ce client (max {self.max_per_client})")
+
+            self._jobs[job.id] = job
+            self._pending[priority].setdefault(client, deque()).append(job)
+            self._depth += 1
+            self._start()
+            self._lock.notify_all()
+        return job
+
+    def get(self, job_id):
+        """Travail désigné par son identifiant, ou None"""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Nombre de travaux servis avant celui-ci, file inchangée (None s'il n'est plus en attente)"""
+        with self._lock:
+            if job.status != "queued":
+                return None
+            ahead = 0
+            for priority in JOB_PRIORITIES:
+                clients = self._pending[priority]
+                if priority != job.priority:
+                    ahead += sum(len(queued) for queued in clients.values())
+                    continue
+                # Tour de rôle : chaque autre client passe au plus `rank` travaux avant,
+                # un de plus s'il le précède dans le tour
+                rank = clients[job.client].index(job)
+                turn = list(clients).index(job.client)
+                return ahead + rank + sum(min(len(queued), rank + (index < turn))
+                                          for index, (client, queued) in enumerate(clients.items())
+                                          if client != job.client)
+            return None
+
+    def cancel(self, job_id):
+        """Annule un travail (retiré de la file, ou worker arrêté s'il tourne) ; renvoie le Job ou None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            if job.status == "queued":
+                queued = self._pending[job.priority].get(job.client)
+                queued.remove(job)
+                if not queued:
+                    del self._pending[job.priority][job.client]
+                self._depth -= 1
+                self._finish(job, "cancelled")
+            else:
+                job.cancel_event.set()
+            return job
+
+    def drain(self, timeout=None):
+        """Arrêt propre : refuse les nouveaux travaux, annule ceux en attente et
+        attend la fin de ceux en cours ; renvoie True si tout est terminé à temps"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+            for clients in self._pending.values():
+                for queued in clients.values():
+                    for job in queued:
+                        self._finish(job, "cancelled")
+                clients.clear()
+            self._depth = 0
+            while any(job.status == "running" for job in self._jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    def stats(self):
+        """Occupation de la file par priorité"""
+        with self._lock:
+            return {
+                "queued": self._depth,
+                "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+                "max_depth": self.max_depth,
+                "by_priority": {
+                    priority: sum(len(queued) for queued in clients.values())
+                    for priority, clients in self._pending.items()
+                },
+            }
+
+    def _next_job(self):
+        # Priorité la plus haute, puis premier client du tour de rôle
+        for priority in JOB_PRIORITIES:
+            clients = self._pending[priority]
+            if clients:
+                client, queued = next(iter(clients.items()))
+                job = queued.popleft()
+                del clients[client]
+                if queued:
+                    clients[client] = queued  # le client repasse en fin de tour
+                self._depth -= 1
+                return job
+        return None
+
+    def _dispatch_loop(self):
+        while True:
+            with self._lock:
+                job = self._next_job()
+                while job is None:
+                    self._lock.wait()
+                    job = self._next_job()
+                job.status = "running"
+
+            def progress(fraction, job=job):
+                job.fraction = max(job.fraction, min(1.0, fraction))
+
+            try:
+                job.result, job.cache_status = self.runner(job.params, progress, job.cancel_event)
+                job.fraction = 1.0
+                status = "done"
+            except RenderCancelled:
+                status = "cancelled"
+            except Exception as e:
+                logging.error(f"Erreur travail {job.id}: {str(e)}")
+                job.error = str(e)
+                status = "failed"
+            with self._lock:
+                self._finish(job, status)
+                self._lock.notify_all()
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+
+    def _purge(self):
+        # Oubli des travaux terminés depuis plus de result_ttl secondes
+        limit = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < limit]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,172 @@
+import contextlib
+import os
+import threading
+import time
+
+# Instrumentation activée par défaut ; METRICS_ENABLED=0 la réduit à des appels vides
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# Bornes des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_null_stage = contextlib.nullcontext()
+
+class Counter:
+    """Compteur Prometheus à étiquettes"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+class Histogram:
+    """Histogramme Prometheus à étiquettes (buckets cumulés, somme et nombre)"""
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._values = {}  # étiquettes -> [comptes par bucket, somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Métriques du serveur
+stage_seconds = Histogram("render_stage_seconds", "Durée de chaque étape du rendu, par mode et type de fractale")
+request_seconds = Histogram("http_request_seconds", "Durée des requêtes HTTP par point d'accès")
+requests_total = Counter("http_requests_total", "Requêtes HTTP par point d'accès et code de statut")
+errors_total = Counter("http_errors_total", "Réponses en erreur (4xx/5xx) par point d'accès")
+
+# Valeurs admises par étiquette : toute autre valeur est comptée sous "other",
+# pour qu'une requête ne puisse pas créer de nouvelles séries
+_label_values = {}
+
+def allow_label_values(name, values):
+    """Déclare les valeurs connues de l'étiquette `name`"""
+    _label_values[name] = frozenset(values)
+
+def _fold_label(name, value):
+    allowed = _label_values.get(name)
+    return value if allowed is None or value in allowed else "other"
+
+# Suivi d'une requête (par thread)
+
+def start_request():
+    """Ouvre le relevé des étapes de la requête courante"""
+    if METRICS_ENABLED:
+        _local.timings = {}
+        _local.labels = ()
+        _local.started = time.perf_counter()
+
+def set_labels(**labels):
+    """Étiquettes (mode, fractal_type...) des histogrammes d'étapes de la requête courante"""
+    if METRICS_ENABLED and getattr(_local, "timings", None) is not None:
+        _local.labels = tuple(sorted((name, _fold_label(name, value)) for name, value in labels.items()))
+
+def record(name, seconds):
+    """Ajoute une durée à l'étape `name` de la requête courante (ignoré hors requête)"""
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+def merge(timings):
+    """Ajoute à la requête courante les étapes mesurées ailleurs (worker de rendu)"""
+    if timings:
+        for name, seconds in timings.items():
+            record(name, seconds)
+
+@contextlib.contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def stage(name):
+    """Contexte chronométrant une étape : `with metrics.stage("raster"): ...`"""
+    if not METRICS_ENABLED:
+        return _null_stage
+    return _timed(name)
+
+def current_timings():
+    """Étapes relevées pour la requête courante (dictionnaire nom -> secondes), ou None"""
+    return getattr(_local, "timings", None)
+
+def finish_request(endpoint, status):
+    """Clôt la requête courante : alimente les métriques et renvoie l'en-tête Server-Timing (ou None)"""
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        return None
+    _local.timings = None
+    elapsed = time.perf_counter() - _local.started
+    labels = _local.labels
+
+    request_seconds.observe(elapsed, (("endpoint", endpoint),))
+    requests_total.inc((("endpoint", endpoint), ("status", str(status))))
+    if status >= 400:
+        errors_total.inc((("endpoint", endpoint),))
+    for name, seconds in timings.items():
+        stage_seconds.observe(seconds, labels + (("stage", name),))
+
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={elapsed * 1000:.1f}")
+    return ", ".join(entries)
+
+def render_prometheus(gauges=(), counters=()):
+    """Exposition au format texte Prometheus
+
+    `gauges` et `counters` : [(nom, aide, valeur), ...] lus au moment de la
+    requête ; les compteurs (totaux depuis le démarrage) portent le suffixe _total.
+    """
+    lines = []
+    for metric in (request_seconds, requests_total, errors_total, stage_seconds):
+        lines.extend(metric.render())
+    for kind, values in (("gauge", gauges), ("counter", counters)):
+        for name, help_text, value in values:
+            lines.extend((f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,210 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Dossier du catalogue : base SQLite et images adressées par leur contenu (vide = désactivé, par défaut)
+PATTERN_STORE_DIR = os.environ.get("PATTERN_STORE_DIR", "")
+# Motifs conservés au plus : au-delà, les plus anciens sont retirés avec leurs images
+PATTERN_STORE_MAX_ROWS = int(os.environ.get("PATTERN_STORE_MAX_ROWS", 10000))
+# Taille des pages de /api/patterns (par défaut et maximale)
+PATTERN_PAGE_SIZE = 50
+PATTERN_PAGE_MAX = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patterns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    render_key TEXT NOT NULL UNIQUE,
+    image_hash TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    fractal_type TEXT,
+    color TEXT NOT NULL,
+    background_color TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS patterns_mode ON patterns (mode, id);
+CREATE INDEX IF NOT EXISTS patterns_fractal_type ON patterns (fractal_type, id);
+CREATE INDEX IF NOT EXISTS patterns_color ON patterns (color, id);
+CREATE INDEX IF NOT EXISTS patterns_created_at ON patterns (created_at);
+CREATE INDEX IF NOT EXISTS patterns_image_hash ON patterns (image_hash);
+"""
+
+# Filtres de recherche : paramètre d'URL -> condition SQL
+_FILTERS = {
+    "mode": "mode = ?",
+    "fractal_type": "fractal_type = ?",
+    "color": "color = ?",
+    "background_color": "background_color = ?",
+    "since": "created_at >= ?",
+    "until": "created_at < ?",
+}
+
+def parse_date(value):
+    """Date d'un filtre : secondes depuis l'epoch ou date ISO 8601 (2024-05-01, 2024-05-01T12:00)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Date invalide: {value}")
+
+class PatternStore:
+    """Catalogue persistant des motifs générés : métadonnées en SQLite, images sur disque
+
+    Une ligne par jeu de paramètres normalisés (clé de rendu unique), avec les
+    colonnes de recherche indexées ; l'image PNG est écrite une seule fois
+    sous son hash de contenu (images/<2 premiers caractères>/<hash>.png),
+    partagée par les motifs qui donnent la même image. Au-delà de `max_rows`
+    motifs, les plus anciens sont retirés à chaque ajout.
+    """
+
+    def __init__(self, directory=None, max_rows=None):
+        self.directory = directory if directory is not None else PATTERN_STORE_DIR
+        self.max_rows = max_rows or PATTERN_STORE_MAX_ROWS
+        self._lock = threading.Lock()
+        self._db = None
+        if self.directory:
+            os.makedirs(os.path.join(self.directory, "images"), exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, "patterns.db"), check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            # WAL : lectures concurrentes des écritures, sans fsync à chaque ajout
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def _image_path(self, content_hash):
+        return os.path.join(self.directory, "images", content_hash[:2], f"{content_hash}.png")
+
+    def record(self, render_key, params, png_bytes, content_hash, size):
+        """Ajoute un motif s'il n'est pas déjà catalogué (même clé de rendu) ; renvoie son id
+
+        `content_hash` : hash des octets PNG (derivatives.image_hash), adresse du fichier image.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT id FROM patterns WHERE render_key = ?", (render_key,)).fetchone()
+        if row is not None:
+            return row["id"]
+
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO patterns (render_key, image_hash, mode, fractal_type, color, "
+                "background_color, width, height, bytes, params, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (render_key, content_hash, params["mode"], params.get("fractal_type"), params["color"].lower(),
+                 params["background_color"].lower(), size[0], size[1], len(png_bytes),
+                 json.dumps(params, separators=(',', ':')), time.time()))
+            if not cursor.rowcount:
+                return self._db.execute("SELECT id FROM patterns WHERE render_key = ?", (render_key,)).fetchone()["id"]
+            pattern_id = cursor.lastrowid
+            # Plafond : les motifs les plus anciens (plus petits id) au-delà de max_rows
+            oldest = [row["id"] for row in self._db.execute(
+                "SELECT id FROM patterns ORDER BY id DESC LIMIT -1 OFFSET ?", (self.max_rows,))]
+            self._remove_images(self._delete_rows(oldest))
+
+        # Image écrite après la ligne : une éviction concurrente (sous le verrou) voit ce motif
+        # et n'efface plus le fichier, ou l'a effacé avant et il est réécrit ici
+        path = self._image_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(png_bytes)
+            os.replace(tmp_path, path)
+        return pattern_id
+
+    def search(self, filters=None, before=None, limit=PATTERN_PAGE_SIZE):
+        """Page de motifs du plus récent au plus ancien, filtrés par les colonnes indexées
+
+        `before` : id de la dernière ligne de la page précédente (pagination par
+        clé, sans OFFSET). Renvoie (lignes, id à passer pour la page suivante ou None).
+        """
+        conditions, values = [], []
+        for name, value in (filters or {}).items():
+            if name not in _FILTERS:
+                raise ValueError(f"Filtre inconnu: {name}")
+            if name in ("since", "until"):
+                value = parse_date(value)
+            elif name in ("color", "background_color"):
+                value = value.lower()
+            conditions.append(_FILTERS[name])
+            values.append(value)
+        if before is not None:
+            conditions.append("id < ?")
+            values.append(int(before))
+        limit = max(1, min(PATTERN_PAGE_MAX, int(limit)))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(f"SELECT * FROM patterns {where} ORDER BY id DESC LIMIT ?",
+                                    values + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = [self._to_dict(row) for row in rows[:limit]]
+        return rows, (rows[-1]["id"] if more else None)
+
+    def get(self, pattern_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM patterns WHERE id = ?", (pattern_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def _delete_rows(self, ids):
+        """Retire les lignes `ids` (verrou et transaction tenus) ; renvoie les hash d'images devenues orphelines"""
+        hashes = set()
+        for pattern_id in ids:
+            row = self._db.execute("SELECT image_hash FROM patterns WHERE id = ?", (pattern_id,)).fetchone()
+            if row is not None:
+                self._db.execute("DELETE FROM patterns WHERE id = ?", (pattern_id,))
+                hashes.add(row["image_hash"])
+        return [content_hash for content_hash in hashes
+                if self._db.execute("SELECT 1 FROM patterns WHERE image_hash = ? LIMIT 1",
+                                    (content_hash,)).fetchone() is None]
+
+    def _remove_images(self, hashes):
+        for content_hash in hashes:
+            try:
+                os.remove(self._image_path(content_hash))
+            except OSError:
+                pass
+
+    def delete(self, pattern_id):
+        """Retire un motif ; son image est effacée si aucun autre motif ne la partage. Renvoie True si trouvé"""
+        with self._lock, self._db:
+            if self._db.execute("SELECT 1 FROM patterns WHERE id = ?", (pattern_id,)).fetchone() is None:
+                return False
+            self._remove_images(self._delete_rows([pattern_id]))
+        return True
+
+    def image(self, content_hash):
+        """Octets PNG d'une image cataloguée, None si inconnue"""
+        if not self.enabled or len(content_hash) != 64 or not content_hash.isalnum():
+            return None
+        try:
+            with open(self._image_path(content_hash), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM patterns").fetchone()
+        return {"enabled": True, "patterns": count, "bytes": total}
+
+    def _to_dict(self, row):
+        pattern = dict(row)
+        pattern["params"] = json.loads(pattern["params"])
+        content_hash = pattern["image_hash"]
+        pattern["thumbnail"] = f"/api/images/{content_hash}/thumb.webp"
+        pattern["image"] = f"/api/images/{content_hash}/full.png"
+        return pattern
@@ -0,0 +1,184 @@
+import io
+import logging
+import os
+import threading
+
+from PIL import Image
+
+from render_cache import params_key
+
+# Dossier des rendus de préréglages (vide = pas de persistance), préchauffage au démarrage
+PRESETS_DIR = os.environ.get("PRESETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "presets"))
+PRESETS_WARM = os.environ.get("PRESETS_WARM", "1") == "1"
+# Côté maximal des vignettes (pixels)
+PRESET_THUMBNAIL_SIZE = int(os.environ.get("PRESET_THUMBNAIL_SIZE", 128))
+
+# Formulaire par défaut du frontend (GenMotifGeo/app/page.tsx), envoyé tel quel à
+# /api/generate quel que soit le mode : les préréglages en partent pour que leurs
+# clés de rendu soient celles des requêtes réelles
+FRONTEND_DEFAULTS = {
+    "mode": "geometric", "fractal_type": "tree", "sides": 5, "depth": 10, "size": 100, "angle": 20,
+    "color": "#0070f3", "iterations": 4, "reduction": 0.7, "turns": 10, "increment": 5,
+    "gradient": False, "gradient_start": "#0070f3", "gradient_end": "#ff6b6b",
+    "glow": False, "glow_intensity": 0.5, "background_color": "#ffffff",
+}
+
+PRESET_MODES = (
+    ("geometric", "Motif géométrique", {"mode": "geometric"}),
+    ("tree", "Arbre fractal", {"mode": "fractal", "fractal_type": "tree"}),
+    ("koch", "Flocon de Koch", {"mode": "fractal", "fractal_type": "koch"}),
+    ("sierpinski", "Triangle de Sierpinski", {"mode": "fractal", "fractal_type": "sierpinski"}),
+    ("dragon", "Courbe du dragon", {"mode": "fractal", "fractal_type": "dragon"}),
+    ("spiral", "Spirale", {"mode": "spiral"}),
+)
+
+# Options de symétrie telles que le frontend les envoie (panneau ouvert, une option activée)
+PRESET_SYMMETRIES = (
+    ("none", "", None),
+    ("mirror", "miroir", {"mirror": True, "rotation": 1, "kaleidoscope": False}),
+    ("rotation4", "4 rotations", {"mirror": False, "rotation": 4, "kaleidoscope": False}),
+    ("kaleidoscope", "kaléidoscope", {"mirror": False, "rotation": 1, "kaleidoscope": True}),
+)
+
+def preset_definitions():
+    """(identifiant, nom, corps de requête) de chaque préréglage : chaque mode avec chaque symétrie"""
+    for mode_id, mode_name, mode_fields in PRESET_MODES:
+        for symmetry_id, symmetry_name, symmetry in PRESET_SYMMETRIES:
+            data = {**FRONTEND_DEFAULTS, **mode_fields}
+            if symmetry is not None:
+                data["symmetry"] = symmetry
+            name = f"{mode_name} ({symmetry_name})" if symmetry_name else mode_name
+            yield f"{mode_id}-{symmetry_id}", name, data
+
+def make_thumbnail(png_bytes, size=None):
+    """Vignette PNG (côté maximal `size`) d'une image PNG"""
+    size = size or PRESET_THUMBNAIL_SIZE
+    img = Image.open(io.BytesIO(png_bytes))
+    img.thumbnail((size, size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+class Preset:
+    """Préréglage : paramètres normalisés, clé de rendu, image et vignette une fois rendues"""
+
+    def __init__(self, preset_id, name, params):
+        self.id = preset_id
+        self.name = name
+        self.params = params
+        self.key = params_key(params)
+        self.image = None
+        self.thumbnail = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "params": self.params,
+            "render_key": self.key,
+            "ready": self.image is not None,
+            "image": f"/api/presets/{self.key}/image.png",
+            "thumbnail": f"/api/presets/{self.key}/thumbnail.png",
+        }
+
+class PresetLibrary:
+    """Bibliothèque des préréglages, rendus une fois puis servis sans passer par le pool
+
+    Les rendus sont relus depuis `directory` à la création ; warm() rend en
+    parallèle ceux qui manquent et les y écrit. `normalize(data)` valide un
+    corps de requête comme /api/generate, `render(params)` renvoie les octets
+    PNG d'un rendu.
+    """
+
+    def __init__(self, normalize, render, directory=None):
+        self.render = render
+        self.directory = directory if directory is not None else PRESETS_DIR
+        self._lock = threading.Lock()
+        self._presets = [Preset(preset_id, name, normalize(data))
+                         for preset_id, name, data in preset_definitions()]
+        self._by_key = {preset.key: preset for preset in self._presets}
+        self._warming = None
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            for preset in self._presets:
+                self._load(preset)
+
+    def _path(self, preset, kind):
+        return os.path.join(self.directory, f"{preset.key}.{kind}.png")
+
+    def _load(self, preset):
+        try:
+            with open(self._path(preset, "image"), 'rb') as f:
+                image = f.read()
+            with open(self._path(preset, "thumbnail"), 'rb') as f:
+                thumbnail = f.read()
+        except OSError:
+            return
+        preset.image, preset.thumbnail = image, thumbnail
+
+    def _store(self, preset, image):
+        thumbnail = make_thumbnail(image)
+        if self.directory:
+            try:
+                for kind, data in (("image", image), ("thumbnail", thumbnail)):
+                    # Écriture atomique : jamais de fichier à moitié écrit relu au démarrage suivant
+                    path = self._path(preset, kind)
+                    with open(path + ".tmp", 'wb') as f:
+                        f.write(data)
+                    os.replace(path + ".tmp", path)
+            except OSError as e:
+                logging.warning(f"Préréglage {preset.id} non persisté: {e}")
+        preset.image, preset.thumbnail = image, thumbnail
+
+    def _drop_stale(self):
+        """Efface les fichiers d'autres clés de rendu : préréglages d'une version antérieure du rendu"""
+        if not self.directory:
+            return
+        for name in os.listdir(self.directory):
+            if name.split(".", 1)[0] not in self._by_key:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError as e:
+                    logging.warning(f"Préréglage obsolète non effacé ({name}): {e}")
+
+    def warm(self, executor):
+        """Rend sur `executor` les préréglages absents du disque ; renvoie le nombre de rendus
+
+        Les fichiers d'une version antérieure du rendu sont d'abord effacés.
+        """
+        self._drop_stale()
+        missing = [preset for preset in self._presets if preset.image is None]
+        def render(preset):
+            try:
+                self._store(preset, self.render(preset.params))
+            except Exception as e:
+                logging.error(f"Préréglage {preset.id} non rendu: {e}")
+        list(executor.map(render, missing))
+        if missing:
+            logging.info(f"{len(missing)} préréglages rendus")
+        return len(missing)
+
+    def warm_async(self, executor):
+        """Lance warm() dans un thread, une seule fois"""
+        with self._lock:
+            if self._warming is None:
+                self._warming = threading.Thread(target=self.warm, args=(executor,), daemon=True,
+                                                 name="presets-warm")
+                self._warming.start()
+
+    def image(self, key):
+        """Octets PNG du préréglage de clé de rendu `key`, None s'il n'existe pas ou n'est pas prêt"""
+        preset = self._by_key.get(key)
+        return preset.image if preset is not None else None
+
+    def thumbnail(self, key):
+        preset = self._by_key.get(key)
+        return preset.thumbnail if preset is not None else None
+
+    def list(self):
+        return [preset.to_dict() for preset in self._presets]
+
+    def stats(self):
+        return {"presets": len(self._presets),
+                "ready": sum(preset.image is not None for preset in self._presets)}
@@ -0,0 +1,208 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Facteur de suréchantillonnage pour l'anticrénelage des traits
+SUPERSAMPLE = 4
+
+# Taille (pixels de sortie) des tuiles : borne la mémoire du tampon suréchantillonné
+TILE_SIZE = 512
+
+# Nombre de segments tracés entre deux rapports d'avancement
+PROGRESS_STEP = 20000
+
+# Taille de référence du cadrage turtle (l'ancien écran 500x500)
+BASE_SIZE = 500
+
+def _polylines(segments, x0, y0, x1, y1, fills):
+    """Polylignes (points aplatis [x, y, x, y...], (remplissage, épaisseur)) à partir de coordonnées transformées
+
+    Un seul passage en Python par polyligne : les ruptures (style différent
+    ou segment non jointif) sont trouvées sur les tableaux.
+    """
+    starts = segments.polyline_starts()
+    first_x = x0[starts].tolist()
+    first_y = y0[starts].tolist()
+    points = np.column_stack((x1, y1)).ravel().tolist()
+    colors = segments.colors[starts].tolist()
+    widths = segments.widths[starts].tolist()
+    bounds = starts.tolist() + [len(segments)]
+    for index, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        yield [first_x[index], first_y[index]] + points[2 * start:2 * end], (fills[colors[index]], widths[index])
+
+def iter_polylines(segments):
+    """Regroupe les segments consécutifs et jointifs de même style en polylignes
+
+    Renvoie (points aplatis [x0, y0, x1, y1...] en coordonnées turtle, (couleur, épaisseur)).
+    """
+    coords = segments.coords.astype(np.float64)
+    return _polylines(segments, coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], segments.palette)
+
+def zoom_for_size(size):
+    """Facteur d'échelle du cadrage 500x500 vers une sortie de taille `size`"""
+    return min(size) / BASE_SIZE
+
+def _draw_supersampled(segments, origin, tile_size, center, zoom, background, supersample,
+                       progress=None, total=0, mode='RGB', fills=None):
+    """Dessine une tuile (coin supérieur gauche `origin`, en pixels de sortie) à la résolution suréchantillonnée
+
+    `fills[i]` est le remplissage de l'indice de couleur i (la palette des segments par défaut).
+    """
+    img = Image.new(mode, (tile_size[0] * supersample, tile_size[1] * supersample), background)
+    _draw_segments(ImageDraw.Draw(img), segments, origin, center, zoom, supersample, progress, total, fills)
+    return img
+
+def _draw_segments(draw, segments, origin, center, zoom, supersample, progress=None, total=0, fills=None):
+    """Trace les segments sur un dessin suréchantillonné déjà créé (voir _draw_supersampled)"""
+    ox, oy = origin
+    cx, cy = center
+    drawn = 0
+    next_report = PROGRESS_STEP
+
+    # Origine turtle au centre, axe Y vers le haut. Points ramenés à la grille
+    # suréchantillonnée de l'image entière avant le décalage de la tuile : PIL tronque
+    # les coordonnées flottantes vers zéro, un trait sortant de la tuile (coordonnées
+    # négatives) serait sinon tracé différemment selon la tuile ou la bande qui le contient
+    coords = segments.coords.astype(np.float64)
+    xs = np.floor((coords[:, 0::2] * zoom + cx) * supersample) - ox * supersample
+    ys = np.floor((cy - coords[:, 1::2] * zoom) * supersample) - oy * supersample
+    polylines = _polylines(segments, xs[:, 0], ys[:, 0], xs[:, 1], ys[:, 1],
+                           segments.palette if fills is None else fills)
+
+    for pixels, (color, pen_width) in polylines:
+        line_width = max(1, round(pen_width * zoom * supersample))
+        draw.line(pixels, fill=color, width=line_width, joint="curve")
+
+        # Extrémités arrondies comme le capstyle de Tk
+        if line_width > 2:
+            r = line_width / 2
+            for px, py in ((pixels[0], pixels[1]), (pixels[-2], pixels[-1])):
+                draw.ellipse((px - r, py - r, px + r, py + r), fill=color)
+
+        if progress is not None:
+            drawn += len(pixels) // 2 - 1
+            if drawn >= next_report:
+                progress(drawn, total)
+                next_report = drawn + PROGRESS_STEP
+
+def _draw_tile(segments, origin, tile_size, center, zoom, background, supersample, progress=None, total=0):
+    """Dessine une tuile (coin supérieur gauche `origin`, en pixels de sortie)"""
+    img = _draw_supersampled(segments, origin, tile_size, center, zoom, background, supersample, progress, total)
+    if supersample > 1:
+        img = img.reduce(supersample)
+    return img
+
+def rasterize(segments, size=(500, 500), background="white", supersample=SUPERSAMPLE,
+              region=None, tile_size=TILE_SIZE, progress=None):
+    """Dessine les segments (SegmentBuffer, coordonnées turtle) sur une image RGB
+
+    Le cadrage 500x500 d'origine est mis à l'échelle de `size` (géométrie et
+    épaisseur des traits), sans agrandir un raster. Seule la zone `region`
+    (x0, y0, x1, y1 en pixels de sortie, toute l'image par défaut) est
+    produite, tuile par tuile : chaque tuile ne trace que les segments qui la
+    touchent et la mémoire reste bornée par la taille d'une tuile.
+    `progress(fait, total)` est appelé au fil du tracé (segments dessinés).
+    """
+    width, height = size
+    x0, y0, x1, y1 = region or (0, 0, width, height)
+    zoom = zoom_for_size(size)
+    center = (width / 2, height / 2)
+
+    # Zone tenant en une tuile : tracé direct, sans découpage
+    if x1 - x0 <= tile_size and y1 - y0 <= tile_size:
+        img = _draw_tile(segments, (x0, y0), (x1 - x0, y1 - y0),
+                         center, zoom, background, supersample, progress, len(segments))
+        if progress is not None:
+            progress(len(segments), len(segments))
+        return img
+
+    # Boîtes englobantes des segments en pixels de sortie, marge = demi-trait
+    coords = segments.coords.astype(np.float64)
+    xs = coords[:, 0::2] * zoom + center[0]
+    ys = center[1] - coords[:, 1::2] * zoom
+    margin = segments.widths * zoom / 2 + 1
+    left, right = xs.min(axis=1) - margin, xs.max(axis=1) + margin
+    top, bottom = ys.min(axis=1) - margin, ys.max(axis=1) + margin
+
+    img = Image.new('RGB', (x1 - x0, y1 - y0), background)
+    tiles = [(tx, ty) for ty in range(y0, y1, tile_size) for tx in range(x0, x1, tile_size)]
+    for done, (tx, ty) in enumerate(tiles, start=1):
+        tw = min(tile_size, x1 - tx)
+        th = min(tile_size, y1 - ty)
+        inside = np.flatnonzero((right >= tx) & (left <= tx + tw) & (bottom >= ty) & (top <= ty + th))
+        # Les segments retenus gardent leur ordre : les polylignes se reforment dans la tuile
+        tile = _draw_tile(segments.take(inside), (tx, ty), (tw, th), center, zoom, background, supersample)
+        img.paste(tile, (tx - x0, ty - y0))
+        if progress is not None:
+            # Avancement au prorata des tuiles terminées
+            progress(len(segments) * done // len(tiles), len(segments))
+    return img
+
+def rasterize_progressive(segments, cuts, size=(500, 500), background="white", supersample=SUPERSAMPLE):
+    """Images successives du tracé : la k-ième contient les segments [0, cuts[k])
+
+    Le tampon suréchantillonné est conservé d'une image à l'autre : chaque
+    image ne trace que les segments ajoutés depuis la précédente, et seule la
+    zone qu'ils touchent est réduite à nouveau. Produit (image, zone) où
+    zone (x0, y0, x1, y1, pixels de sortie) couvre les pixels modifiés depuis
+    l'image précédente, None si aucun ; chaque image est une copie.
+    """
+    width, height = size
+    canvas = Image.new('RGB', (width * supersample, height * supersample), background)
+    draw = ImageDraw.Draw(canvas)
+    img = Image.new('RGB', size, background)
+    center = (width / 2, height / 2)
+    zoom = zoom_for_size(size)
+    done = 0
+    for cut in cuts:
+        box = None
+        if cut > done:
+            added = segments.take(slice(done, cut))
+            _draw_segments(draw, added, (0, 0), center, zoom, supersample)
+            done = cut
+
+            # Pixels de sortie touchés : boîte des segments, marge = demi-trait
+            coords = added.coords.astype(np.float64)
+            margin = int(added.widths.max()) * zoom / 2 + 1
+            box = (max(0, int(coords[:, 0::2].min() * zoom + center[0] - margin)),
+                   max(0, int(center[1] - coords[:, 1::2].max() * zoom - margin)),
+                   min(width, int(coords[:, 0::2].max() * zoom + center[0] + margin) + 1),
+                   min(height, int(center[1] - coords[:, 1::2].min() * zoom + margin) + 1))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                box = None
+            else:
+                img.paste(canvas.reduce(supersample, tuple(edge * supersample for edge in box)), box[:2])
+        yield img.copy(), box
+
+def rasterize_levels(segments, size=(500, 500), supersample=SUPERSAMPLE, progress=None):
+    """Carte des niveaux tracés, à la résolution suréchantillonnée
+
+    Les entrées de la palette des segments sont ici des clés de niveau
+    quelconques (par exemple des facteurs de dégradé) : l'entrée i est tracée
+    avec la valeur i + 1, 0 restant le fond. Les traits couvrent les mêmes
+    pixels qu'avec rasterize ; colorize_levels donne donc l'image pour
+    n'importe quelle palette sans retracer. Réservé aux images tenant en une
+    tuile ; renvoie (tableau uint8 ou uint16, clés des niveaux 1, 2...).
+    """
+    width, height = size
+    if width > TILE_SIZE or height > TILE_SIZE:
+        raise ValueError(f"Carte des niveaux limitée à {TILE_SIZE}x{TILE_SIZE} pixels")
+    keys = segments.palette
+    img = _draw_supersampled(segments, (0, 0), size, (width / 2, height / 2), zoom_for_size(size),
+                             0, supersample, progress, len(segments),
+                             mode='L' if len(keys) <= 255 else 'I', fills=range(1, len(keys) + 1))
+    if progress is not None:
+        progress(len(segments), len(segments))
+    return np.asarray(img).astype(np.uint8 if len(keys) <= 255 else np.uint16), keys
+
+def colorize_levels(levels, palette, supersample=SUPERSAMPLE):
+    """Image RGB d'une carte de niveaux : `palette[niveau]` = (r, g, b), niveau 0 = fond"""
+    if levels.dtype == np.uint8:
+        # Image en palette : conversion et réduction entièrement en C
+        img = Image.fromarray(levels, 'P')
+        img.putpalette(np.asarray(palette, dtype=np.uint8).tobytes())
+        img = img.convert('RGB')
+    else:
+        img = Image.fromarray(np.asarray(palette, dtype=np.uint8)[levels], 'RGB')
+    if supersample > 1:
+        img = img.reduce(supersample)
+    return img
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+# Configuration du cache (surchargeable par variables d'environnement)
+RENDER_CACHE_MAX_ENTRIES = int(os.environ.get("RENDER_CACHE_MAX_ENTRIES", 256))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", "")  # vide = pas de cache disque
+RENDER_CACHE_DISK_MAX_BYTES = int(os.environ.get("RENDER_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024))
+
+# Version du rendu, à incrémenter dès que l'image produite pour des paramètres donnés
+# change : elle entre dans toutes les clés de rendu, les rendus persistés d'une version
+# antérieure (préréglages, cache disque) ne sont donc plus jamais servis
+RENDERER_VERSION = 2
+
+def params_key(params):
+    """Hash canonique (SHA-256) d'un dictionnaire de paramètres normalisés, pour RENDERER_VERSION"""
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(f"{RENDERER_VERSION}:{canonical}".encode('utf-8')).hexdigest()
+
+class RenderCache:
+    """Cache des rendus indexé par le contenu des paramètres
+
+    Un niveau mémoire LRU borné en nombre d'entrées et en octets, et un
+    niveau disque optionnel (un fichier par clé) borné en taille. Les
+    entrées évincées de la mémoire restent disponibles sur disque.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, disk_dir=None, disk_max_bytes=None, suffix=".png"):
+        self.max_entries = max_entries if max_entries is not None else RENDER_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else RENDER_CACHE_MAX_BYTES
+        self.disk_dir = disk_dir if disk_dir is not None else RENDER_CACHE_DIR
+        self.disk_max_bytes = disk_max_bytes if disk_max_bytes is not None else RENDER_CACHE_DISK_MAX_BYTES
+        # Extension des fichiers du niveau disque (vide si les clés portent déjà la leur)
+        self.suffix = suffix
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # clé -> taille, du plus ancien au plus récent
+        self._disk_bytes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Reconstruit l'index disque à partir des fichiers existants (ordre mtime)"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(self.suffix) or name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name[:len(name) - len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Retourne les octets en cache pour `key`, ou None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return data
+            on_disk = self.disk_dir and key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._forget_disk(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    self._store_memory(key, data)
+                    return data
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def contains(self, key):
+        """Indique si `key` est en cache (mémoire ou disque), sans toucher aux statistiques ni à l'ordre LRU"""
+        with self._lock:
+            return key in self._memory or bool(self.disk_dir and key in self._disk)
+
+    def put(self, key, data):
+        """Ajoute un rendu au cache (mémoire, puis disque si configuré)"""
+        with self._lock:
+            self._store_memory(key, data)
+            write_disk = self.disk_dir and key not in self._disk and len(data) <= self.disk_max_bytes
+
+        if write_disk:
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.error(f"Erreur écriture cache disque: {str(e)}")
+                return
+            with self._lock:
+                if key not in self._disk:
+                    self._disk[key] = len(data)
+                    self._disk_bytes += len(data)
+                    self._evict_disk()
+
+    def _store_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            key, _ = next(iter(self._disk.items()))
+            self._forget_disk(key)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+            self._stats["disk_evictions"] += 1
+
+    def _forget_disk(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def stats(self):
+        """Statistiques du cache (compteurs et occupation)"""
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+            }
@@ -0,0 +1,287 @@
+import atexit
+import inspect
+import multiprocessing
+import os
+import threading
+import time
+
+import metrics
+
+# Configuration du pool (surchargeable par variables d'environnement)
+RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", os.cpu_count() or 1))
+RENDER_WORKER_MAX_JOBS = int(os.environ.get("RENDER_WORKER_MAX_JOBS", 200))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 30))
+
+# Intervalle de vérification d'une demande d'annulation pendant un rendu (secondes)
+CANCEL_POLL_INTERVAL = 0.1
+
+# Fonctions de turtle_worker qu'un worker accepte d'exécuter
+WORKER_TASKS = ("render_png", "render_region", "render_vector", "share_segments", "render_draw_on")
+
+class RenderError(Exception):
+    """Erreur remontée par un worker de rendu (échec, plantage ou délai dépassé)"""
+
+class RenderCancelled(RenderError):
+    """Rendu annulé à la demande : le worker a été arrêté"""
+
+def _worker_loop(conn):
+    """Boucle d'un worker : reçoit (tâche, arguments, suivi), renvoie le résultat
+
+    Si le suivi est demandé, la tâche reçoit un callback `progress` dont les
+    appels sont transmis au serveur par des messages ("progress", (fait, total)).
+    Le résultat est accompagné des durées des étapes mesurées dans le worker.
+    Une tâche générateur est transmise morceau par morceau, en messages
+    ("chunk", morceau) : l'envoi bloque tant que le serveur n'a pas lu le
+    précédent, le worker ne prend donc jamais d'avance sur le client.
+    """
+    # Import unique au démarrage du worker : c'est tout l'intérêt du pool
+    import turtle_worker
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        try:
+            task, args, report = job
+            if task not in WORKER_TASKS:
+                raise ValueError(f"Tâche inconnue: {task}")
+            kwargs = {}
+            if report:
+                kwargs["progress"] = lambda done, total: conn.send(("progress", (done, total), None))
+            metrics.start_request()
+            result = getattr(turtle_worker, task)(*args, **kwargs)
+            if inspect.isgenerator(result):
+                for chunk in result:
+                    conn.send(("chunk", chunk, None))
+                result = None
+            conn.send(("ok", result, metrics.current_timings()))
+        except Exception as e:
+            conn.send(("error", str(e), None))
+
+class _Worker:
+    """Processus de rendu persistant relié au serveur par un pipe"""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        # Clé du dernier travail traité : ce worker en garde la géométrie en cache
+        self.affinity = None
+
+    def stop(self):
+        """Arrêt propre : le worker termine sa boucle"""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        """Arrêt forcé (délai dépassé ou worker bloqué)"""
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+class RenderPool:
+    """Pool de workers de rendu chauds, isolés dans des processus séparés
+
+    Chaque worker importe le moteur de rendu une seule fois puis traite les
+    travaux reçus par son pipe. Un worker est remplacé après `max_jobs`
+    rendus, s'il plante ou s'il dépasse le délai imparti ; un plantage ne
+    touche donc que la requête en cours, comme avec l'ancien sous-processus.
+    """
+
+    def __init__(self, size=None, max_jobs=None, timeout=None):
+        self.size = max(1, size or RENDER_POOL_SIZE)
+        self.max_jobs = max_jobs or RENDER_WORKER_MAX_JOBS
+        self.timeout = timeout or RENDER_TIMEOUT
+        # spawn : processus neufs, sans hériter des threads du serveur Flask
+        self._ctx = multiprocessing.get_context("spawn")
+        # Workers libres, du moins récemment utilisé au plus récent
+        self._idle = []
+        self._available = threading.Condition()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._release(self._spawn())
+
+    def _spawn(self):
+        worker = _Worker(self._ctx)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _acquire(self, affinity=None):
+        """Attend un worker libre : de préférence celui qui a traité `affinity` en dernier"""
+        with self._available:
+            while not self._idle:
+                self._available.wait()
+            for index, worker in enumerate(self._idle):
+                if affinity is not None and worker.affinity == affinity:
+                    return self._idle.pop(index)
+            return self._idle.pop(0)
+
+    def _release(self, worker):
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _discard(self, worker, force=False):
+        with self._lock:
+            self._workers.discard(worker)
+        if force:
+            worker.kill()
+        else:
+            worker.stop()
+
+    def render(self, params, timeout=None):
+        """Rend les paramètres sur un worker libre et renvoie les octets PNG"""
+        return self.run("render_png", params, timeout=timeout)
+
+    def run(self, task, *args, timeout=None, progress=None, cancel=None, affinity=None):
+        """Exécute une tâche de WORKER_TASKS sur un worker libre et renvoie son résultat
+
+        `progress(fait, total)` reçoit l'avancement envoyé par le worker ;
+        si l'événement `cancel` est levé, le worker est tué et remplacé, et
+        RenderCancelled est levée. Les travaux de même `affinity` (clé de
+        géométrie) vont si possible au même worker, qui en a le cache.
+        """
+        if self._closed:
+            raise RenderError("Pool de rendu arrêté")
+        timeout = timeout or self.timeout
+
+        # Attend un worker libre : la taille du pool borne la concurrence
+        with metrics.stage("pool_wait"):
+            worker = self._acquire(affinity)
+        started = time.perf_counter()
+        replacement = worker
+        try:
+            if cancel is not None and cancel.is_set():
+                raise RenderCancelled("Rendu annulé")
+            try:
+                worker.conn.send((task, args, progress is not None))
+                deadline = time.monotonic() + timeout
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        self._discard(worker, force=True)
+                        replacement = self._spawn()
+                        raise RenderCancelled("Rendu annulé")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._discard(worker, force=True)
+                        replacement = self._spawn()
+                        raise RenderError(f"Délai de génération dépassé ({timeout}s)")
+                    wait = min(remaining, CANCEL_POLL_INTERVAL) if cancel is not None else remaining
+                    if not worker.conn.poll(wait):
+                        continue
+                    status, payload, timings = worker.conn.recv()
+                    if status != "progress":
+                        break
+                    progress(*payload)
+            except (EOFError, BrokenPipeError, OSError):
+                self._discard(worker, force=True)
+                replacement = self._spawn()
+                raise RenderError("Le worker de rendu s'est arrêté de manière inattendue")
+
+            worker.jobs += 1
+            worker.affinity = affinity
+            if worker.jobs >= self.max_jobs:
+                # Recyclage pour borner la mémoire accumulée par un worker
+                self._discard(worker)
+                replacement = self._spawn()
+
+            if status != "ok":
+                raise RenderError(f"Erreur génération: {payload}")
+            # Étapes du worker, plus le reste (transfert et sérialisation) compté comme IPC
+            metrics.merge(timings)
+            if timings is not None:
+                metrics.record("worker_ipc", max(0.0, time.perf_counter() - started - sum(timings.values())))
+            return payload
+        finally:
+            self._release(replacement)
+
+    def stream(self, task, *args, timeout=None, affinity=None):
+        """Exécute une tâche générateur de WORKER_TASKS et produit ses morceaux au fil de l'eau
+
+        `timeout` borne l'attente de chaque morceau, pas la durée totale. Si
+        le consommateur abandonne le flux avant la fin (client déconnecté),
+        le worker est tué et remplacé.
+        """
+        if self._closed:
+            raise RenderError("Pool de rendu arrêté")
+        timeout = timeout or self.timeout
+
+        with metrics.stage("pool_wait"):
+            worker = self._acquire(affinity)
+        replacement = worker
+        finished = False
+        try:
+            try:
+                worker.conn.send((task, args, False))
+                while True:
+                    if not worker.conn.poll(timeout):
+                        raise RenderError(f"Délai de génération dépassé ({timeout}s)")
+                    status, payload, timings = worker.conn.recv()
+                    if status != "chunk":
+                        break
+                    yield payload
+            except (EOFError, BrokenPipeError, OSError):
+                raise RenderError("Le worker de rendu s'est arrêté de manière inattendue")
+            finished = True
+
+            worker.jobs += 1
+            worker.affinity = affinity
+            if worker.jobs >= self.max_jobs:
+                self._discard(worker)
+                replacement = self._spawn()
+            if status != "ok":
+                raise RenderError(f"Erreur génération: {payload}")
+            metrics.merge(timings)
+        finally:
+            if not finished:
+                # Flux interrompu : le worker est peut-être bloqué sur un envoi
+                self._discard(worker, force=True)
+                replacement = self._spawn()
+            self._release(replacement)
+
+    def shutdown(self):
+        """Arrête tous les workers"""
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """Retourne le pool partagé, créé au premier appel
+
+    La création paresseuse évite de lancer des workers lorsque le module est
+    seulement importé (notamment par les processus enfants en mode spawn).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+def shutdown_render_pool():
+    """Arrête le pool partagé s'il a été créé"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
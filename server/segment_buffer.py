@@ -0,0 +1,144 @@
+import json
+import struct
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# En-tête de la forme sérialisée : nombre de segments, longueur de la palette JSON
+_HEADER = struct.Struct("<II")
+
+# Octets par segment : 4 coordonnées float32, indice de couleur uint16, épaisseur uint8
+SEGMENT_BYTES = 4 * 4 + 2 + 1
+
+class SegmentBuffer:
+    """Segments d'un motif en tableaux contigus, représentation canonique de la géométrie
+
+    `coords` (n, 4) float32 : x0, y0, x1, y1 en coordonnées turtle ;
+    `colors` (n,) uint16 : indice dans `palette` (couleur hexadécimale, ou
+    clé de niveau pour une géométrie sans style) ; `widths` (n,) uint8 :
+    épaisseur du stylo. Environ 19 octets par segment, contre plus de 200
+    pour un tuple Python de six éléments.
+    """
+
+    def __init__(self, coords, colors, widths, palette):
+        self.coords = coords
+        self.colors = colors
+        self.widths = widths
+        self.palette = list(palette)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.uint16),
+                   np.empty(0, dtype=np.uint8), [])
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __iter__(self):
+        """Segments sous forme de tuples (x0, y0, x1, y1, couleur, épaisseur)"""
+        palette = self.palette
+        for (x0, y0, x1, y1), color, width in zip(self.coords.tolist(), self.colors.tolist(), self.widths.tolist()):
+            yield x0, y0, x1, y1, palette[color], width
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.colors.nbytes + self.widths.nbytes
+
+    def bounds(self):
+        """Boîte englobante (xmin, ymin, xmax, ymax) des tracés, None si aucun segment"""
+        if not len(self):
+            return None
+        xs = self.coords[:, 0::2]
+        ys = self.coords[:, 1::2]
+        return (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+
+    def take(self, indices):
+        """Sous-ensemble des segments `indices`, dans cet ordre (même palette)"""
+        return SegmentBuffer(self.coords[indices], self.colors[indices], self.widths[indices], self.palette)
+
+    def with_palette(self, palette):
+        """Mêmes segments, couleurs remplacées indice pour indice (sans copie des tableaux)"""
+        return SegmentBuffer(self.coords, self.colors, self.widths, palette)
+
+    def polyline_starts(self):
+        """Indices de début des polylignes : suites de segments jointifs de même style"""
+        if not len(self):
+            return np.empty(0, dtype=np.intp)
+        joined = ((self.colors[1:] == self.colors[:-1]) & (self.widths[1:] == self.widths[:-1])
+                  & (self.coords[1:, 0] == self.coords[:-1, 2]) & (self.coords[1:, 1] == self.coords[:-1, 3]))
+        return np.concatenate(([0], np.flatnonzero(~joined) + 1))
+
+    # Sérialisation : en-tête, palette JSON (complétée à 4 octets), puis les trois tableaux
+
+    def _layout(self):
+        palette = json.dumps(self.palette, separators=(',', ':')).encode('utf-8')
+        palette += b" " * (-len(palette) % 4)
+        return palette, _HEADER.size + len(palette)
+
+    def serialized_size(self):
+        _, offset = self._layout()
+        return offset + SEGMENT_BYTES * len(self)
+
+    def write_into(self, buffer):
+        """Écrit la forme sérialisée dans un tampon inscriptible (bytearray, mémoire partagée)"""
+        palette, offset = self._layout()
+        count = len(self)
+        # Vue octet par octet : un bytearray n'accepte pas directement un tableau numpy
+        with memoryview(buffer).cast('B') as view:
+            view[:_HEADER.size] = _HEADER.pack(count, len(palette))
+            view[_HEADER.size:offset] = palette
+            for array in (self.coords, self.colors, self.widths):
+                data = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+                view[offset:offset + len(data)] = data
+                offset += len(data)
+
+    def to_bytes(self):
+        buffer = bytearray(self.serialized_size())
+        self.write_into(buffer)
+        return bytes(buffer)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Relit une forme sérialisée ; les tableaux sont des vues sur `data`, sans copie"""
+        count, palette_size = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        palette = json.loads(bytes(data[offset:offset + palette_size]))
+        offset += palette_size
+        coords = np.frombuffer(data, dtype=np.float32, count=4 * count, offset=offset).reshape(count, 4)
+        offset += coords.nbytes
+        colors = np.frombuffer(data, dtype=np.uint16, count=count, offset=offset)
+        offset += colors.nbytes
+        widths = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
+        return cls(coords, colors, widths, palette)
+
+    def to_shared_memory(self):
+        """Copie les segments dans un segment de mémoire partagée neuf et le renvoie
+
+        L'appelant le ferme ; le dernier utilisateur le libère avec unlink().
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(1, self.serialized_size()))
+        self.write_into(shm.buf)
+        return shm
+
+@contextmanager
+def attach_shared(name):
+    """Segments d'une mémoire partagée (to_shared_memory), lus sans copie le temps du bloc"""
+    shm = shared_memory.SharedMemory(name=name)
+    segments = SegmentBuffer.from_bytes(shm.buf)
+    try:
+        yield segments
+    finally:
+        # Les vues numpy doivent disparaître avant de fermer la mémoire partagée
+        empty = SegmentBuffer.empty()
+        segments.coords, segments.colors, segments.widths = empty.coords, empty.colors, empty.widths
+        shm.close()
+
+def release_shared(name):
+    """Libère une mémoire partagée créée par to_shared_memory"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
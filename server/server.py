@@ -1,263 +1,799 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import itertools
 import json
-import os
 import logging
-import uuid
 import base64
+import contextlib
 import io
+import math
+import os
+import re
 import threading
-import sys
-from PIL import Image, ImageFilter, ImageEnhance, ImageDraw
+import time
+from collections import OrderedDict, deque
+from PIL import Image
+import metrics
+from render_pool import get_render_pool, shutdown_render_pool, RenderError, RENDER_POOL_SIZE, RENDER_TIMEOUT
+from render_cache import RenderCache, params_key
+from compositing import combine_layers, BLEND_MODES
+from turtle_worker import count_segments, output_size, geometry_key, apply_effects, MODES, FRACTAL_TYPES
+from vector_export import VECTOR_FORMATS
+from animation import ANIMATION_FORMATS, SpooledStream, encode_animation
+from segment_buffer import release_shared
+from jobs import JobManager, JobQueueFull
+from presets import PresetLibrary, PRESETS_WARM
+from derivatives import DerivativeStore, DERIVATIVE_SIZES, DERIVATIVE_FORMATS, derivative_urls
+from pattern_store import PatternStore, PATTERN_PAGE_SIZE
+from backlog import RenderBacklog, BacklogFull, RENDER_RETRY_AFTER
+from admission import RenderSlots, ClientBudgets, RateLimited, estimate_cost, estimate_draw_on_cost
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=["ETag", "X-Cache", "X-Batch-Size", "X-Pattern-Params", "X-Render-Key", "X-Render-Ms-Per-Megapixel", "Location", "Retry-After", "Server-Timing", "X-Render-Quality", "X-Full-Render", "X-Animation-Frames", "X-Image-Hash", "X-Render-Cost"])
+
+# Étiquettes des métriques : seuls les modes et types de fractale connus (vide hors fractale),
+# plus le mode "combine" des superpositions de /api/combine
+metrics.allow_label_values("mode", MODES + ("combine",))
+metrics.allow_label_values("fractal_type", FRACTAL_TYPES + ("",))
+
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    """Histogrammes de la requête et en-tête Server-Timing (étapes du rendu, en ms)"""
+    server_timing = metrics.finish_request(request.endpoint or "unknown", response.status_code)
+    if server_timing:
+        response.headers["Server-Timing"] = server_timing
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+# Slots de génération (un par worker du pool), en deux voies selon le coût estimé
+render_slots = RenderSlots(RENDER_POOL_SIZE)
+
+# Budget de rendu de chaque client (ms estimées) : au-delà, 429 + Retry-After
+client_budgets = ClientBudgets()
+
+# Rendus admis au-delà des slots du sémaphore : au-delà, 503 + Retry-After
+render_backlog = RenderBacklog()
+
+# Cache des rendus indexé par le hash des paramètres normalisés
+render_cache = RenderCache()
+
+# Catalogue persistant des motifs générés (SQLite et images sur disque)
+pattern_store = PatternStore()
+
+# Vignettes, aperçus et pleine taille des images servies, adressés par hash de contenu ;
+# les images du catalogue restent accessibles après leur éviction ou un redémarrage
+derivative_store = DerivativeStore(source=pattern_store.image)
+
+# Budget de travail : nombre maximal de segments par rendu (symétries comprises)
+RENDER_SEGMENT_BUDGET = int(os.environ.get("RENDER_SEGMENT_BUDGET", 4_000_000))
+# ... et coût estimé maximal (ms, admission.estimate_cost, glow compris) : par défaut la
+# moitié de RENDER_TIMEOUT, pour qu'un rendu admis ne finisse jamais en délai dépassé
+RENDER_COST_BUDGET = float(os.environ.get("RENDER_COST_BUDGET", RENDER_TIMEOUT * 1000 / 2))
+FRACTAL_MAX_ITERATIONS = int(os.environ.get("FRACTAL_MAX_ITERATIONS", 12))
+# Rotations de symétrie maximales (curseur du frontend)
+SYMMETRY_MAX_ROTATION = 8
+
+# Couleurs acceptées : #rgb ou #rrggbb
+HEX_COLOR = re.compile(r"#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})")
+
+# Taille de sortie : côté et surface maximaux, et surface à partir de laquelle
+# l'image est découpée en bandes rendues en parallèle par les workers du pool
+RENDER_MAX_SIDE = int(os.environ.get("RENDER_MAX_SIDE", 8000))
+RENDER_MAX_PIXELS = int(os.environ.get("RENDER_MAX_PIXELS", 64_000_000))
+RENDER_PARALLEL_PIXELS = int(os.environ.get("RENDER_PARALLEL_PIXELS", 2_000_000))
+band_executor = ThreadPoolExecutor(max_workers=RENDER_POOL_SIZE)
+
+# Aperçu (quality=draft) : budget de segments, réduction de la résolution et
+# nombre de clients dont le dernier rendu complet lancé en arrière-plan est suivi
+RENDER_QUALITIES = ("full", "draft")
+DRAFT_SEGMENT_BUDGET = int(os.environ.get("DRAFT_SEGMENT_BUDGET", 20000))
+DRAFT_SCALE = float(os.environ.get("DRAFT_SCALE", 0.5))
+DRAFT_TRACKED_CLIENTS = 1024
+
+# Formats de réponse image négociables (JSON + data URI par défaut)
+RESPONSE_FORMATS = {"json": "application/json", "png": "image/png", "webp": "image/webp"}
+
+# Ressources adressées par leur contenu (préréglages, déclinaisons) : cache navigateur d'un an
+IMMUTABLE_MAX_AGE = 31536000
+
+# Préfixe des références à un rendu en cache dans /api/combine ("render:<clé>")
+RENDER_REF_PREFIX = "render:"
+
+# Lots de génération : taille maximale et threads de répartition vers le pool
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 64))
+batch_executor = ThreadPoolExecutor(max_workers=RENDER_POOL_SIZE)
+
+def render_bands(params, size, progress=None, cancel=None):
+    """Rend une grande image en bandes horizontales réparties sur les workers du pool
+
+    La géométrie est construite une seule fois, en mémoire partagée, et lue
+    sans copie par chaque worker.
+    """
+    width, height = size
+    pool = get_render_pool()
+    count = min(pool.size, math.ceil(height / 256))
+    edges = [round(i * height / count) for i in range(count + 1)]
+    regions = [(0, top, width, bottom) for top, bottom in zip(edges, edges[1:])]
+    
+    # Avancement global : moyenne des fractions de chaque bande
+    fractions = [0.0] * count
+    def run_band(index):
+        def band_progress(done, total):
+            fractions[index] = done / total if total else 1.0
+            progress(sum(fractions) / count)
+        return pool.run("render_region", params, regions[index], shared, cancel=cancel,
+                        progress=band_progress if progress is not None else None)
+    
+    shared = pool.run("share_segments", params, cancel=cancel)
+    try:
+        bands = band_executor.map(run_band, range(count))
+        img = Image.new('RGB', size)
+        for (_, top, _, bottom), raw in zip(regions, bands):
+            img.paste(Image.frombytes('RGB', (width, bottom - top), raw), (0, top))
+    finally:
+        release_shared(shared)
+    return img
 
-# Sémaphore pour limiter les générations concurrentes
-generation_semaphore = threading.Semaphore(3)
+def generate_pattern_with_params(params, progress=None, cancel=None):
+    """Génère un motif via un worker de rendu isolé avec tous les paramètres
 
-def apply_glow_effect(img, intensity=0.5):
-    """Applique un effet glow/néon à l'image"""
+    `progress(fraction)` suit le tracé (0 à 1) et l'événement `cancel`
+    interrompt le rendu en arrêtant le worker (travaux asynchrones).
+    """
     try:
-        # Convertir en RGBA si nécessaire
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
+        size = output_size(params)
+        if size[0] * size[1] > RENDER_PARALLEL_PIXELS:
+            # Grande image : bandes rendues en parallèle puis assemblées
+            img = render_bands(params, size, progress, cancel)
+        else:
+            # Rendu sur un worker chaud du pool : les octets PNG reviennent en mémoire
+            worker_progress = None
+            if progress is not None:
+                worker_progress = lambda done, total: progress(done / total if total else 1.0)
+            # Même géométrie, même worker : un changement de style seul y est un simple recoloriage
+            png_bytes = get_render_pool().run("render_png", params, progress=worker_progress, cancel=cancel,
+                                              affinity=geometry_key(params))
+            
+            # Charger l'image
+            with metrics.stage("decode"):
+                img = Image.open(io.BytesIO(png_bytes))
+                img.load()
         
-        # Créer une copie pour l'effet glow
-        glow_img = img.copy()
+        # Couleur de fond personnalisée et effet glow
+        img = apply_effects(img, params)
         
-        # Appliquer plusieurs passes de flou avec différentes intensités
-        glow_layers = []
+        # Sauvegarder l'image avec effets
+        buffer = io.BytesIO()
+        with metrics.stage("png_encode"):
+            img.save(buffer, format='PNG')
+        buffer.seek(0)
         
-        # Première couche - flou léger
-        glow1 = glow_img.filter(ImageFilter.GaussianBlur(radius=2))
-        enhancer1 = ImageEnhance.Brightness(glow1)
-        glow1 = enhancer1.enhance(1.2 + intensity * 0.3)
-        glow_layers.append(glow1)
+        return buffer
+            
+    except Exception as e:
+        logging.error(f"Erreur: {str(e)}")
+        raise
+
+def parse_color(value, name):
+    """Couleur hexadécimale #rgb ou #rrggbb (ramenée à #rrggbb) ; toute autre valeur est refusée
+
+    Les couleurs sont recopiées telles quelles dans les exports SVG/PDF et les
+    en-têtes : seule la forme hexadécimale est acceptée.
+    """
+    if not isinstance(value, str) or not HEX_COLOR.fullmatch(value):
+        raise ValueError(f"Couleur invalide pour '{name}' (#rgb ou #rrggbb attendu)")
+    if len(value) == 4:
+        value = "#" + "".join(channel * 2 for channel in value[1:])
+    return value
+
+def normalize_params(data):
+    """Valide et borne les paramètres reçus, renvoie le dictionnaire normalisé"""
+    mode = data.get("mode", "geometric")
+    
+    # Paramètres communs
+    color = parse_color(data.get("color", "#0070f3"), "color")
+    background_color = parse_color(data.get("background_color", "#ffffff"), "background_color")  # Blanc par défaut
+    gradient = data.get("gradient", False)
+    gradient_start = parse_color(data.get("gradient_start", "#0070f3"), "gradient_start")
+    gradient_end = parse_color(data.get("gradient_end", "#ff6b6b"), "gradient_end")
+    glow = data.get("glow", False)
+    glow_intensity = max(0.1, min(1.0, float(data.get("glow_intensity", 0.5))))
+    
+    # Validation selon le mode
+    if mode == "geometric":
+        sides = max(3, min(12, int(data.get("sides", 5))))
+        depth = max(1, min(50, int(data.get("depth", 10))))
+        size = max(10, min(300, int(data.get("size", 100))))
+        angle = max(0, min(360, float(data.get("angle", 20))))
         
-        # Deuxième couche - flou moyen
-        glow2 = glow_img.filter(ImageFilter.GaussianBlur(radius=5))
-        enhancer2 = ImageEnhance.Brightness(glow2)
-        glow2 = enhancer2.enhance(1.1 + intensity * 0.4)
-        glow_layers.append(glow2)
+        params = {
+            "mode": mode,
+            "sides": sides,
+            "depth": depth,
+            "size": size,
+            "angle": angle,
+            "color": color,
+            "background_color": background_color,
+            "gradient": gradient,
+            "gradient_start": gradient_start,
+            "gradient_end": gradient_end,
+            "glow": glow,
+            "glow_intensity": glow_intensity
+        }
         
-        # Troisième couche - flou fort
-        glow3 = glow_img.filter(ImageFilter.GaussianBlur(radius=10))
-        enhancer3 = ImageEnhance.Brightness(glow3)
-        glow3 = enhancer3.enhance(1.0 + intensity * 0.5)
-        glow_layers.append(glow3)
+    elif mode == "fractal":
+        fractal_type = data.get("fractal_type", "tree")
+        if fractal_type not in FRACTAL_TYPES:
+            raise ValueError(f"Type de fractale non supporté (attendu : {', '.join(FRACTAL_TYPES)})")
+        iterations = max(1, min(FRACTAL_MAX_ITERATIONS, int(data.get("iterations", 4))))
+        size = max(50, min(300, int(data.get("size", 150))))
         
-        # Combiner toutes les couches
-        result = img.copy()
-        for glow_layer in reversed(glow_layers):  # Commencer par les plus floues
-            result = Image.alpha_composite(result, glow_layer)
+        params = {
+            "mode": mode,
+            "fractal_type": fractal_type,
+            "iterations": iterations,
+            "size": size,
+            "color": color,
+            "background_color": background_color,
+            "gradient": gradient,
+            "gradient_start": gradient_start,
+            "gradient_end": gradient_end,
+            "glow": glow,
+            "glow_intensity": glow_intensity
+        }
         
-        # Ajouter l'image originale par-dessus
-        result = Image.alpha_composite(result, img)
+        # Paramètres spécifiques à l'arbre fractal
+        if fractal_type == "tree":
+            reduction = max(0.3, min(0.9, float(data.get("reduction", 0.7))))
+            angle = max(0, min(180, float(data.get("angle", 30))))
+            params["reduction"] = reduction
+            params["angle"] = angle
         
-        return result
+    elif mode == "spiral":
+        turns = max(3, min(20, int(data.get("turns", 10))))
+        size = max(5, min(50, int(data.get("size", 10))))
+        increment = max(1, min(20, int(data.get("increment", 5))))
+        angle = max(1, min(45, float(data.get("angle", 10))))
         
-    except Exception as e:
-        logging.error(f"Erreur lors de l'application de l'effet glow: {str(e)}")
-        return img
+        params = {
+            "mode": mode,
+            "turns": turns,
+            "size": size,
+            "increment": increment,
+            "angle": angle,
+            "color": color,
+            "background_color": background_color,
+            "gradient": gradient,
+            "gradient_start": gradient_start,
+            "gradient_end": gradient_end,
+            "glow": glow,
+            "glow_intensity": glow_intensity
+        }
+    else:
+        raise ValueError("Mode non supporté")
+    
+    # Ajouter les paramètres de symétrie s'ils existent
+    symmetry = data.get("symmetry")
+    if symmetry:
+        if not isinstance(symmetry, dict):
+            raise ValueError("'symmetry' doit être un objet")
+        params["symmetry"] = {
+            "mirror": bool(symmetry.get("mirror", False)),
+            "rotation": max(1, min(SYMMETRY_MAX_ROTATION, int(symmetry.get("rotation", 1)))),
+            "kaleidoscope": bool(symmetry.get("kaleidoscope", False)),
+        }
+    
+    # Taille de sortie en pixels ; `scale` multiplie largeur et hauteur (écrans haute densité).
+    # Omise pour le 500x500 par défaut : les clés de cache existantes restent valables
+    scale = max(0.1, min(16.0, float(data.get("scale", 1))))
+    width = max(16, round(int(data.get("width", 500)) * scale))
+    height = max(16, round(int(data.get("height", 500)) * scale))
+    if max(width, height) > RENDER_MAX_SIDE or width * height > RENDER_MAX_PIXELS:
+        raise ValueError(f"Image trop grande ({width}x{height}, maximum {RENDER_MAX_SIDE} px de côté "
+                         f"et {RENDER_MAX_PIXELS} pixels)")
+    if (width, height) != (500, 500):
+        params["width"] = width
+        params["height"] = height
+    
+    # Le nombre exact de segments est connu avant le rendu : refuser les motifs hors budget
+    segments = count_segments(params)
+    if segments > RENDER_SEGMENT_BUDGET:
+        raise ValueError(f"Motif trop complexe ({segments} segments, maximum {RENDER_SEGMENT_BUDGET})")
+    cost = estimate_cost(params)
+    if cost > RENDER_COST_BUDGET:
+        raise ValueError(f"Motif trop coûteux (rendu estimé à {cost / 1000:.1f} s, maximum "
+                         f"{RENDER_COST_BUDGET / 1000:.1f} s) : réduisez les itérations, la taille ou le glow")
+    
+    return params
 
-def generate_pattern_with_params(params):
-    """Génère un motif via un sous-processus isolé avec tous les paramètres"""
-    try:
-        # Créer un fichier temporaire pour les paramètres
-        param_file = f"params_{uuid.uuid4()}.json"
-        with open(param_file, 'w') as f:
-            json.dump(params, f)
-        
-        # Configuration des flags selon l'OS
-        creationflags = 0
-        if sys.platform == "win32":
-            creationflags = subprocess.CREATE_NO_WINDOW
-        
-        # Lancer le sous-processus
-        result = subprocess.run(
-            ['python', 'turtle_worker.py', param_file],
-            capture_output=True,
-            text=True,
-            timeout=30,
-            creationflags=creationflags
-        )
+def query_to_data(args):
+    """Convertit les paramètres d'URL (GET) au format du corps JSON"""
+    data = {key: value for key, value in args.items() if key != "format"}
+    for key in ("gradient", "glow"):
+        if key in data:
+            data[key] = data[key].lower() in ("1", "true", "yes", "on")
+    if "symmetry" in data:
+        data["symmetry"] = json.loads(data["symmetry"])
+    return data
+
+def negotiate_format(vector=False):
+    """Format de réponse : ?format=json|png|webp (ou svg|pdf si `vector`), sinon en-tête Accept (JSON par défaut)"""
+    fmt = request.args.get("format")
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in RESPONSE_FORMATS and not (vector and fmt in VECTOR_FORMATS):
+            raise ValueError(f"Format non supporté: {fmt}")
+        return fmt
+    best = request.accept_mimetypes.best_match(list(RESPONSE_FORMATS.values()), default="application/json")
+    return next(fmt for fmt, mimetype in RESPONSE_FORMATS.items() if mimetype == best)
+
+def encode_image(png_bytes, fmt):
+    """Réencode les octets PNG dans le format binaire demandé"""
+    if fmt == "webp":
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(png_bytes)).save(buffer, format='WEBP', lossless=True)
+        return buffer.getvalue()
+    return png_bytes
+
+def not_modified(etag, weak=False):
+    """Réponse 304 si le client possède déjà cette version (If-None-Match, comparaison faible), sinon None
+
+    `weak` : l'ETag est renvoyé faible (W/), comme celui de la réponse complète.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=weak)
+    response.headers["Vary"] = "Accept"
+    return response
+
+def image_response(png_bytes, fmt, etag, json_fields=None):
+    """Réponse image : JSON avec data URI (contrat historique) ou binaire PNG/WebP
+
+    L'image est enregistrée dans les déclinaisons : son hash de contenu
+    (X-Image-Hash) donne accès à la vignette et à l'aperçu (/api/images).
+    L'ETag d'une réponse JSON est faible : le corps peut porter des champs
+    variables (durée de rendu) pour une même image.
+    """
+    content_hash = derivative_store.add(png_bytes)
+    with metrics.stage("encode"):
+        if fmt == "json":
+            # Convertir en base64 pour le frontend
+            img_base64 = base64.b64encode(png_bytes).decode('utf-8')
+            response = jsonify({"image": f"data:image/png;base64,{img_base64}", **(json_fields or {}),
+                                "image_hash": content_hash, "derivatives": derivative_urls(content_hash)})
+        else:
+            response = Response(encode_image(png_bytes, fmt), mimetype=RESPONSE_FORMATS[fmt])
+    response.set_etag(etag, weak=fmt == "json")
+    response.headers["Vary"] = "Accept"
+    response.headers["X-Image-Hash"] = content_hash
+    return response
+
+def rate_limited_response(error):
+    """Réponse 429 avec Retry-After : budget de rendu du client épuisé"""
+    response = jsonify({"error": str(error), "retry_after": error.retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+def overloaded_response(error):
+    """Réponse 503 avec Retry-After : backlog de rendu ou file de travaux pleins"""
+    response = jsonify({"error": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RENDER_RETRY_AFTER)
+    return response
+
+@contextlib.contextmanager
+def generation_slot(bounded=True, cost=0, client=None):
+    """Place dans le backlog (si `bounded`), budget du client (si `client`), puis slot de génération
+
+    `cost` (ms estimées, admission.estimate_cost) choisit la voie du slot et
+    est débité du budget du client (RateLimited s'il est épuisé). L'attente
+    du slot est chronométrée.
+    """
+    with render_backlog.slot() if bounded else contextlib.nullcontext():
+        if client is not None:
+            client_budgets.charge(client, cost)
+        with metrics.stage("semaphore_wait"):
+            lane = render_slots.acquire(cost)
+        try:
+            yield
+        finally:
+            render_slots.release(lane)
+
+def render_vector(params, fmt, client=None):
+    """Renvoie (octets SVG/PDF, statut cache) : géométrie sérialisée sur un worker, sans raster
+
+    `client` : budget de rendu débité en cas de génération (RateLimited s'il est épuisé).
+    """
+    cache_key = params_key({**params, "format": fmt})
+    with metrics.stage("cache"):
+        data = render_cache.get(cache_key)
+    if data is not None:
+        return data, "HIT"
+    
+    with generation_slot(cost=estimate_cost(params, raster=False), client=client):
+        data = get_render_pool().run("render_vector", params, fmt)
+    render_cache.put(cache_key, data)
+    return data, "MISS"
+
+def draft_params(params):
+    """Paramètres d'aperçu : segments dans DRAFT_SEGMENT_BUDGET, résolution réduite, sans glow"""
+    draft = {**params, "glow": False}
+    mode = params["mode"]
+    if mode == "fractal":
+        while draft["iterations"] > 1 and count_segments(draft) > DRAFT_SEGMENT_BUDGET:
+            draft["iterations"] -= 1
+    elif mode == "spiral":
+        # Pas angulaire plus grand : même croissance par tour, moins de pas (total_steps)
+        while draft["angle"] < 45 and count_segments(draft) > DRAFT_SEGMENT_BUDGET:
+            draft["angle"] = min(45, draft["angle"] * 2)
+    elif mode == "geometric":
+        while draft["depth"] > 1 and count_segments(draft) > DRAFT_SEGMENT_BUDGET:
+            draft["depth"] -= 1
+    
+    width, height = output_size(params)
+    draft["width"] = max(16, round(width * DRAFT_SCALE))
+    draft["height"] = max(16, round(height * DRAFT_SCALE))
+    return draft
+
+def render_params(params, progress=None, cancel=None, bounded=True, client=None):
+    """Renvoie (octets PNG, statut cache) pour des paramètres normalisés
+
+    `bounded` : le rendu prend une place dans le backlog (BacklogFull si plein).
+    `client` : son budget est débité du coût estimé si le rendu n'est pas en
+    cache (RateLimited s'il est épuisé).
+    """
+    # Un rendu identique déjà en cache évite toute génération
+    cache_key = params_key(params)
+    with metrics.stage("cache"):
+        # Préréglages rendus au démarrage : jamais évincés
+        png_bytes = render_cache.get(cache_key) or preset_library.image(cache_key)
+    if png_bytes is not None:
+        return png_bytes, "HIT"
+    
+    # Génération de l'image avec limitation de concurrence
+    with generation_slot(bounded, estimate_cost(params), client):
+        png_bytes = generate_pattern_with_params(params, progress, cancel).getvalue()
+    render_cache.put(cache_key, png_bytes)
+    return png_bytes, "MISS"
+
+@app.route("/api/generate", methods=['GET', 'POST', 'OPTIONS'])
+def generate_endpoint():
+    if request.method == 'OPTIONS':
+        return '', 200
         
-        if result.returncode != 0:
-            raise Exception(f"Erreur génération: {result.stderr}")
+    try:
+        data = query_to_data(request.args) if request.method == 'GET' else request.json
+        params = normalize_params(data)
+        fmt = negotiate_format(vector=True)
+        metrics.set_labels(mode=params["mode"], fractal_type=params.get("fractal_type", ""))
+        quality = data.get("quality", "full")
+        if quality not in RENDER_QUALITIES:
+            raise ValueError(f"Qualité non supportée: {quality}")
+        if quality == "draft" and fmt in VECTOR_FORMATS:
+            raise ValueError("quality=draft n'est disponible que pour les formats raster")
         
-        # Lire l'image générée
-        if not os.path.exists('output.png'):
-            raise Exception("Fichier de sortie non généré")
+        # ETag dérivé des paramètres normalisés (faible pour JSON) : aucun rendu si le client l'a déjà
+        etag = f"{params_key(params)[:32]}-{fmt}"
+        cached = not_modified(etag, weak=fmt == "json")
+        if cached is not None:
+            return cached
         
-        # Charger l'image
-        img = Image.open('output.png')
+        render_key = params_key(params)
+        if quality == "draft" and not render_cache.contains(render_key) and preset_library.image(render_key) is None:
+            # Aperçu immédiat ; le rendu complet suit en arrière-plan (sauf s'il est déjà en cache)
+            return draft_response(params, fmt)
         
-        # Appliquer la couleur de fond personnalisée
-        background_color = params.get('background_color', '#ffffff')
-        if background_color != '#ffffff':  # Si ce n'est pas blanc (défaut)
-            # Convertir la couleur hex en RGB
-            bg_rgb = tuple(int(background_color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
-            
-            # Convertir l'image en RGBA pour traiter la transparence
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Créer une nouvelle image avec le fond coloré
-            new_img = Image.new('RGB', img.size, bg_rgb)
-            
-            # Traitement amélioré de la transparence
-            data = img.getdata()
-            new_data = []
-            for item in data:
-                if len(item) >= 3:
-                    # Seuil plus strict pour détecter le blanc (fond)
-                    # Considérer comme fond si très proche du blanc
-                    if item[0] >= 250 and item[1] >= 250 and item[2] >= 250:
-                        new_data.append((255, 255, 255, 0))  # Transparent
-                    else:
-                        # Garder le motif opaque
-                        new_data.append(item if len(item) == 4 else item + (255,))
-                else:
-                    new_data.append(item)
+        if fmt in VECTOR_FORMATS:
+            # Export vectoriel : ni rastérisation ni effets raster (glow)
+            data, cache_status = render_vector(params, fmt, client_id())
+            response = Response(data, mimetype=VECTOR_FORMATS[fmt][1])
+            response.set_etag(etag)
+            response.headers["Vary"] = "Accept"
+        else:
+            started = time.perf_counter()
+            png_bytes, cache_status = render_params(params, client=client_id())
             
-            img.putdata(new_data)
+            # Temps de rendu rapporté à la surface, comparable d'une taille à l'autre
+            width, height = output_size(params)
+            render_ms = (time.perf_counter() - started) * 1000
+            ms_per_megapixel = round(render_ms / (width * height / 1_000_000), 2)
             
-            # Coller l'image avec transparence sur le nouveau fond coloré
-            new_img.paste(img, (0, 0), img)
-            img = new_img
-        
-        # Appliquer l'effet glow si demandé
-        if params.get('glow', False):
-            glow_intensity = params.get('glow_intensity', 0.5)
-            img = apply_glow_effect(img, glow_intensity)
+            response = image_response(png_bytes, fmt, etag, {"params": params, "render_ms_per_megapixel": ms_per_megapixel})
+            response.headers["X-Render-Ms-Per-Megapixel"] = str(ms_per_megapixel)
+            response.headers["X-Render-Key"] = params_key(params)
+            response.headers["X-Render-Quality"] = "full"
+            record_pattern(params, png_bytes, response.headers["X-Image-Hash"])
+        response.headers["X-Cache"] = cache_status
+        response.headers["X-Render-Cost"] = str(estimate_cost(params, raster=fmt not in VECTOR_FORMATS))
+        response.headers["X-Pattern-Params"] = json.dumps(params, separators=(',', ':'))
+        if request.method == 'GET':
+            response.cache_control.public = True
+            response.cache_control.max_age = 86400
+        return response
         
-        # Sauvegarder l'image avec effets
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        return buffer
-            
+    except BacklogFull as e:
+        return overloaded_response(e)
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except RenderError as e:
+        # Échec du rendu lui-même (worker, délai) : erreur serveur, rien n'est mis en cache
+        logging.error(f"Erreur de rendu: {str(e)}")
+        return jsonify({"error": str(e)}), 500
     except Exception as e:
         logging.error(f"Erreur: {str(e)}")
-        raise
-    finally:
-        # Nettoyage
-        if os.path.exists(param_file):
-            os.remove(param_file)
-        if os.path.exists('output.png'):
-            os.remove('output.png')
+        return jsonify({"error": str(e)}), 400
 
-@app.route("/api/generate", methods=['POST', 'OPTIONS'])
-def generate_endpoint():
+def record_pattern(params, png_bytes, content_hash):
+    """Catalogue un rendu complet de /api/generate ; une erreur du catalogue ne fait pas échouer la requête"""
+    if not pattern_store.enabled:
+        return
+    try:
+        with metrics.stage("pattern_store"):
+            pattern_store.record(params_key(params), params, png_bytes, content_hash, output_size(params))
+    except Exception as e:
+        logging.warning(f"Motif non catalogué: {e}")
+
+def draft_response(params, fmt):
+    """Aperçu à coût réduit, avec le travail qui produit le rendu complet (`full`, None si la file est pleine)"""
+    draft = draft_params(params)
+    png_bytes, cache_status = render_params(draft, client=client_id())
+    job = submit_full_render(params)
+    full = job_status(job) if job is not None else None
+    
+    response = image_response(png_bytes, fmt, f"{params_key(draft)[:32]}-{fmt}",
+                              {"params": params, "quality": "draft", "full": full})
+    response.headers["X-Cache"] = cache_status
+    response.headers["X-Pattern-Params"] = json.dumps(params, separators=(',', ':'))
+    response.headers["X-Render-Key"] = params_key(params)
+    response.headers["X-Render-Quality"] = "draft"
+    if job is not None:
+        response.headers["X-Full-Render"] = f"/api/jobs/{job.id}"
+    # L'aperçu est remplacé dès que le rendu complet est prêt : jamais mis en cache
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def expand_sweep(base, sweep):
+    """Produit cartésien d'un balayage de paramètres
+
+    Chaque entrée de `sweep` est soit une liste de valeurs, soit un intervalle
+    {"start", "stop", "step"} dont la borne `stop` est incluse.
+    """
+    axes = []
+    for name, spec in sweep.items():
+        if isinstance(spec, dict):
+            start = float(spec["start"])
+            stop = float(spec["stop"])
+            step = float(spec.get("step", 1))
+            if step == 0 or (stop - start) / step < 0:
+                raise ValueError(f"Intervalle invalide pour '{name}'")
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            if count > BATCH_MAX_ITEMS:
+                raise ValueError(f"Trop de valeurs pour '{name}' (max {BATCH_MAX_ITEMS})")
+            values = [start + i * step for i in range(count)]
+        elif isinstance(spec, list):
+            values = spec
+        else:
+            raise ValueError(f"Balayage invalide pour '{name}'")
+        axes.append((name, values))
+    
+    total = 1
+    for _, values in axes:
+        total *= len(values)
+    if total > BATCH_MAX_ITEMS:
+        raise ValueError(f"Lot trop grand ({total} > {BATCH_MAX_ITEMS})")
+    
+    return [
+        {**base, **dict(zip([name for name, _ in axes], combination))}
+        for combination in itertools.product(*[values for _, values in axes])
+    ]
+
+@app.route("/api/generate/batch", methods=['POST', 'OPTIONS'])
+def generate_batch_endpoint():
+    """Génère un lot de motifs en parallèle et renvoie chaque résultat en NDJSON dès qu'il est prêt"""
     if request.method == 'OPTIONS':
         return '', 200
         
     try:
         data = request.json
-        mode = data.get("mode", "geometric")
+        if "items" in data:
+            items = data["items"]
+            if not isinstance(items, list):
+                raise ValueError("'items' doit être une liste")
+        elif "sweep" in data:
+            items = expand_sweep(data.get("base", {}), data["sweep"])
+        else:
+            raise ValueError("'items' ou 'sweep' requis")
         
-        # Paramètres communs
-        color = data.get("color", "#0070f3")
-        background_color = data.get("background_color", "#ffffff")  # Blanc par défaut
-        gradient = data.get("gradient", False)
-        gradient_start = data.get("gradient_start", "#0070f3")
-        gradient_end = data.get("gradient_end", "#ff6b6b")
-        glow = data.get("glow", False)
-        glow_intensity = max(0.1, min(1.0, float(data.get("glow_intensity", 0.5))))
+        if not items:
+            raise ValueError("Lot vide")
+        if len(items) > BATCH_MAX_ITEMS:
+            raise ValueError(f"Lot trop grand ({len(items)} > {BATCH_MAX_ITEMS})")
         
-        # Validation selon le mode
-        if mode == "geometric":
-            sides = max(3, min(12, int(data.get("sides", 5))))
-            depth = max(1, min(50, int(data.get("depth", 10))))
-            size = max(10, min(300, int(data.get("size", 100))))
-            angle = max(0, min(360, float(data.get("angle", 20))))
-            
-            params = {
-                "mode": mode,
-                "sides": sides,
-                "depth": depth,
-                "size": size,
-                "angle": angle,
-                "color": color,
-                "background_color": background_color,
-                "gradient": gradient,
-                "gradient_start": gradient_start,
-                "gradient_end": gradient_end,
-                "glow": glow,
-                "glow_intensity": glow_intensity
-            }
-            
-        elif mode == "fractal":
-            fractal_type = data.get("fractal_type", "tree")
-            iterations = max(1, min(8, int(data.get("iterations", 4))))
-            size = max(50, min(300, int(data.get("size", 150))))
-            
-            params = {
-                "mode": mode,
-                "fractal_type": fractal_type,
-                "iterations": iterations,
-                "size": size,
-                "color": color,
-                "background_color": background_color,
-                "gradient": gradient,
-                "gradient_start": gradient_start,
-                "gradient_end": gradient_end,
-                "glow": glow,
-                "glow_intensity": glow_intensity
-            }
-            
-            # Paramètres spécifiques à l'arbre fractal
-            if fractal_type == "tree":
-                reduction = max(0.3, min(0.9, float(data.get("reduction", 0.7))))
-                angle = max(0, min(180, float(data.get("angle", 30))))
-                params["reduction"] = reduction
-                params["angle"] = angle
-            
-        elif mode == "spiral":
-            turns = max(3, min(20, int(data.get("turns", 10))))
-            size = max(5, min(50, int(data.get("size", 10))))
-            increment = max(1, min(20, int(data.get("increment", 5))))
-            angle = max(1, min(45, float(data.get("angle", 10))))
-            
-            params = {
-                "mode": mode,
-                "turns": turns,
-                "size": size,
-                "increment": increment,
-                "angle": angle,
-                "color": color,
-                "background_color": background_color,
-                "gradient": gradient,
-                "gradient_start": gradient_start,
-                "gradient_end": gradient_end,
-                "glow": glow,
-                "glow_intensity": glow_intensity
-            }
-        else:
-            raise ValueError("Mode non supporté")
+        # Validation complète avant de commencer à streamer
+        all_params = [normalize_params(item) for item in items]
+        
+    except Exception as e:
+        logging.error(f"Erreur lot: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    
+    client = client_id()
+    def stream_results():
+        futures = {batch_executor.submit(render_params, params, client=client): index
+                   for index, params in enumerate(all_params)}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    png_bytes, cache_status = future.result()
+                    img_base64 = base64.b64encode(png_bytes).decode('utf-8')
+                    line = {
+                        "index": index,
+                        "image": f"data:image/png;base64,{img_base64}",
+                        "params": all_params[index],
+                        "render_key": params_key(all_params[index]),
+                        "image_hash": derivative_store.add(png_bytes),
+                        "cache": cache_status
+                    }
+                except Exception as e:
+                    logging.error(f"Erreur lot (élément {index}): {str(e)}")
+                    line = {"index": index, "error": str(e)}
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client déconnecté : ne pas rendre les éléments restants
+            for future in futures:
+                future.cancel()
+    
+    return Response(stream_results(), mimetype='application/x-ndjson',
+                    headers={"X-Batch-Size": str(len(all_params))})
+
+# Animations : nombre d'images, côté maximal et bornes de la durée d'une image (ms)
+ANIMATION_MAX_FRAMES = int(os.environ.get("ANIMATION_MAX_FRAMES", 300))
+ANIMATION_MAX_SIDE = int(os.environ.get("ANIMATION_MAX_SIDE", 1000))
+ANIMATION_FRAME_MS = (20, 1000)
+
+def sweep_frame_params(base, sweep, frames):
+    """Paramètres normalisés de chaque image d'un balayage : chaque entrée {"start", "stop"} est interpolée"""
+    axes = []
+    for name, spec in sweep.items():
+        if name in ("width", "height"):
+            raise ValueError("La taille de sortie ne peut pas varier au cours d'une animation")
+        if not isinstance(spec, dict):
+            raise ValueError(f"Balayage invalide pour '{name}'")
+        axes.append((name, float(spec["start"]), float(spec["stop"])))
+    return [
+        normalize_params({**base, **{name: start + (stop - start) * index / (frames - 1)
+                                     for name, start, stop in axes}})
+        for index in range(frames)
+    ]
+
+def render_frame(params):
+    """Image d'une animation : depuis le cache de rendu s'il l'a déjà, sinon rendue sans y être ajoutée"""
+    png_bytes = render_cache.get(params_key(params))
+    if png_bytes is None:
+        with generation_slot(bounded=False, cost=estimate_cost(params)):
+            png_bytes = generate_pattern_with_params(params).getvalue()
+    return Image.open(io.BytesIO(png_bytes))
+
+def sweep_frames(all_params):
+    """Images d'un balayage dans l'ordre, rendues en parallèle avec au plus une par worker d'avance"""
+    remaining = iter(all_params)
+    pending = deque(batch_executor.submit(render_frame, params)
+                    for params in itertools.islice(remaining, RENDER_POOL_SIZE))
+    try:
+        while pending:
+            img = pending.popleft().result()
+            pending.extend(batch_executor.submit(render_frame, params)
+                           for params in itertools.islice(remaining, 1))
+            yield img
+    finally:
+        for future in pending:
+            future.cancel()
+
+@app.route("/api/animate", methods=['POST', 'OPTIONS'])
+def animate_endpoint():
+    """Animation GIF, APNG ou WebP, envoyée au fil de l'encodage
+
+    Sans "sweep", le motif se dessine trait par trait (un seul worker, qui ne
+    trace à chaque image que les segments ajoutés). Avec "sweep", chaque
+    image est un rendu complet de paramètres interpolés, réparti sur le pool.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
         
-        # Ajouter les paramètres de symétrie s'ils existent
-        symmetry = data.get("symmetry")
-        if symmetry:
-            params["symmetry"] = symmetry
+    try:
+        data = request.json
+        fmt = (request.args.get("format") or data.get("format") or "gif").lower()
+        if fmt not in ANIMATION_FORMATS:
+            raise ValueError(f"Format d'animation non supporté: {fmt}")
+        frames = int(data.get("frames", 48))
+        if not 2 <= frames <= ANIMATION_MAX_FRAMES:
+            raise ValueError(f"Nombre d'images invalide ({frames}, de 2 à {ANIMATION_MAX_FRAMES})")
+        duration = max(ANIMATION_FRAME_MS[0], min(ANIMATION_FRAME_MS[1], int(data.get("duration", 50))))
+        loop = max(0, int(data.get("loop", 0)))
         
-        # Génération de l'image avec limitation de concurrence
-        with generation_semaphore:
-            img_io = generate_pattern_with_params(params)
+        base = data.get("params", {})
+        if "sweep" in data:
+            all_params = sweep_frame_params(base, data["sweep"], frames)
+            params = all_params[0]
+        else:
+            params = normalize_params(base)
+        width, height = output_size(params)
+        if max(width, height) > ANIMATION_MAX_SIDE:
+            raise ValueError(f"Animation trop grande ({width}x{height}, côté maximal {ANIMATION_MAX_SIDE})")
+        metrics.set_labels(mode=params["mode"], fractal_type=params.get("fractal_type", ""))
         
-        # Convertir en base64 pour le frontend
-        img_base64 = base64.b64encode(img_io.getvalue()).decode('utf-8')
-        return jsonify({
-            "image": f"data:image/png;base64,{img_base64}",
-            "params": params
-        })
+        if "sweep" in data:
+            cost = sum(estimate_cost(frame_params) for frame_params in all_params)
+        else:
+            cost = estimate_draw_on_cost(params, frames)
         
+        # Une place du backlog pour toute l'animation, rendue à la fermeture de la réponse ;
+        # le coût de toutes les images est débité d'avance du budget du client
+        slot = contextlib.ExitStack()
+        slot.enter_context(render_backlog.slot())
+        try:
+            client_budgets.charge(client_id(), cost)
+        except RateLimited:
+            slot.close()
+            raise
+    except BacklogFull as e:
+        return overloaded_response(e)
+    except RateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
-        logging.error(f"Erreur: {str(e)}")
+        logging.error(f"Erreur animation: {str(e)}")
         return jsonify({"error": str(e)}), 400
+    
+    def produce_animation():
+        if "sweep" in data:
+            yield from encode_animation(sweep_frames(all_params), fmt, frames, duration, loop)
+        else:
+            with generation_slot(bounded=False, cost=cost):
+                yield from get_render_pool().stream("render_draw_on", params, frames, fmt, duration, loop)
+    
+    # Rendu et encodage au rythme du pool, pas du client : un client lent ne garde ni
+    # slot ni worker, la place du backlog est rendue dès la fin de la production
+    spool = SpooledStream(produce_animation, on_done=slot.close)
+    response = Response(spool.read(), mimetype=ANIMATION_FORMATS[fmt],
+                        headers={"X-Animation-Frames": str(frames)})
+    response.call_on_close(spool.close)
+    return response
+
+def decode_image_data(img_data):
+    """Décode une image base64 (data URI acceptée) en octets"""
+    if img_data.startswith('data:image'):
+        img_data = img_data.split(',')[1]
+    return base64.b64decode(img_data)
+
+class RenderNotCached(LookupError):
+    """Référence à un rendu absent du cache (clé inconnue ou évincée) : réponse 404"""
+
+def resolve_render_ref(ref):
+    """Octets PNG d'un rendu déjà en cache, désigné par sa clé (X-Render-Key)"""
+    png_bytes = render_cache.get(ref)
+    if png_bytes is None:
+        raise RenderNotCached(f"Rendu introuvable dans le cache: {ref}")
+    return png_bytes
+
+def resolve_layer_source(source):
+    """Octets image d'un calque : base64, référence "render:<clé>" ou paramètres à rendre"""
+    if isinstance(source, dict):
+        if "ref" in source:
+            return resolve_render_ref(source["ref"])
+        if "params" in source:
+            return render_params(normalize_params(source["params"]), client=client_id())[0]
+        return decode_image_data(source["image"])
+    if source.startswith(RENDER_REF_PREFIX):
+        return resolve_render_ref(source[len(RENDER_REF_PREFIX):])
+    return decode_image_data(source)
 
 @app.route("/api/combine", methods=['POST', 'OPTIONS'])
 def combine_endpoint():
@@ -265,59 +801,334 @@ def combine_endpoint():
         return '', 200
         
     try:
-        data = request.json
-        images = data.get("images", [])
-        blend_mode = data.get("blendMode", "normal")
-        opacity = data.get("opacity", 0.7)
+        if request.files:
+            # Envoi multipart : fichiers binaires dans le champ "images", références dans "refs"
+            blend_mode = request.form.get("blendMode", "normal")
+            opacity = float(request.form.get("opacity", 0.7))
+            sources = [f.read() for f in request.files.getlist("images")]
+            sources += [resolve_render_ref(ref) for ref in request.form.getlist("refs")]
+            layers = [(img_bytes, blend_mode, opacity) for img_bytes in sources]
+        else:
+            data = request.json
+            blend_mode = data.get("blendMode", "normal")
+            opacity = float(data.get("opacity", 0.7))
+            if "layers" in data:
+                # Calques détaillés : mode et opacité propres à chaque calque
+                layers = [(resolve_layer_source(layer),
+                           layer.get("blendMode", blend_mode),
+                           float(layer.get("opacity", opacity)))
+                          for layer in data["layers"]]
+            else:
+                layers = [(resolve_layer_source(img_data), blend_mode, opacity)
+                          for img_data in data.get("images", [])]
         
-        if len(images) < 2:
+        if len(layers) < 2:
             raise ValueError("Au moins 2 images requises")
+        for _, mode, _ in layers:
+            if mode not in BLEND_MODES:
+                raise ValueError(f"Mode de fusion non supporté: {mode}")
         
-        # Décoder les images base64
-        pil_images = []
-        for img_data in images:
-            if img_data.startswith('data:image'):
-                img_data = img_data.split(',')[1]
-            img_bytes = base64.b64decode(img_data)
-            pil_images.append(Image.open(io.BytesIO(img_bytes)))
+        # Le premier calque sert de fond, toujours opaque
+        layers[0] = (layers[0][0], "normal", 1.0)
         
-        # Redimensionner toutes les images à la même taille
-        size = (500, 500)
-        resized_images = [img.resize(size, Image.Resampling.LANCZOS) for img in pil_images]
+        fmt = negotiate_format()
         
-        # Combiner les images
-        result = resized_images[0].convert('RGBA')
-        for img in resized_images[1:]:
-            img_rgba = img.convert('RGBA')
-            
-            # Appliquer l'opacité
-            alpha = img_rgba.split()[-1]
-            alpha = alpha.point(lambda p: int(p * opacity))
-            img_rgba.putalpha(alpha)
-            
-            # Modes de fusion basiques
-            if blend_mode == "multiply":
-                result = Image.blend(result, img_rgba, 0.5)
-            elif blend_mode == "screen":
-                result = Image.blend(result, img_rgba, 0.7)
-            elif blend_mode == "overlay":
-                result = Image.alpha_composite(result, img_rgba)
-            else:  # normal
-                result = Image.alpha_composite(result, img_rgba)
+        # ETag dérivé du contenu des images et des options de fusion
+        digest = hashlib.sha256()
+        for img_bytes, mode, layer_opacity in layers:
+            digest.update(f"{mode}|{layer_opacity}|".encode('utf-8'))
+            digest.update(hashlib.sha256(img_bytes).digest())
+        etag = f"{digest.hexdigest()[:32]}-{fmt}"
+        cached = not_modified(etag, weak=fmt == "json")
+        if cached is not None:
+            return cached
         
-        # Convertir en base64
-        buffer = io.BytesIO()
-        result.convert('RGB').save(buffer, format='PNG')
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        # Fusion de tous les calques en une passe par calque
+        metrics.set_labels(mode="combine")
+        with metrics.stage("blend"):
+            result = combine_layers([(Image.open(io.BytesIO(img_bytes)), mode, layer_opacity)
+                                     for img_bytes, mode, layer_opacity in layers])
         
-        return jsonify({
-            "image": f"data:image/png;base64,{img_base64}"
-        })
+        buffer = io.BytesIO()
+        with metrics.stage("png_encode"):
+            result.convert('RGB').save(buffer, format='PNG')
+        return image_response(buffer.getvalue(), fmt, etag)
         
+    except RenderNotCached as e:
+        return jsonify({"error": str(e)}), 404
+    except BacklogFull as e:
+        return overloaded_response(e)
+    except RateLimited as e:
+        return rate_limited_response(e)
     except Exception as e:
         logging.error(f"Erreur combinaison: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+# Travaux asynchrones (POST /api/jobs) : même rendu que /api/generate, en arrière-plan ;
+# déjà bornés par leur propre file, ils ne passent pas par le backlog mais leur coût
+# est débité du budget du client à leur acceptation (charge_job)
+def run_job(params, progress, cancel):
+    """Rendu d'un travail asynchrone, mesuré comme une requête du point d'accès « job »"""
+    metrics.start_request()
+    metrics.set_labels(mode=params["mode"], fractal_type=params.get("fractal_type", ""))
+    status = 500
+    try:
+        result = render_params(params, progress, cancel, bounded=False)
+        status = 200
+        return result
+    finally:
+        metrics.finish_request("job", status)
+
+job_manager = JobManager(run_job)
+
+# Dernier rendu complet lancé par un aperçu, par client (identifiant du travail)
+preview_jobs = OrderedDict()
+preview_lock = threading.Lock()
+
+def charge_job(client, params):
+    """Débite du budget du client le coût estimé d'un travail accepté, sauf si son rendu est déjà en cache
+
+    Les travaux ne passent pas par generation_slot : sans ce débit, un client
+    refusé par /api/generate (429) pourrait envoyer le même rendu en travail.
+    """
+    key = params_key(params)
+    if not render_cache.contains(key) and preset_library.image(key) is None:
+        client_budgets.charge(client, estimate_cost(params))
+
+def submit_full_render(params):
+    """Lance en priorité haute le rendu complet d'un aperçu, ou renvoie celui déjà lancé
+
+    Un seul rendu d'aperçu par client : celui des paramètres précédents
+    (curseur déplacé depuis) est annulé. Renvoie None si la file est pleine ;
+    RateLimited si le budget du client est épuisé.
+    """
+    client = client_id()
+    with preview_lock:
+        previous = job_manager.get(preview_jobs[client]) if client in preview_jobs else None
+        if previous is not None and previous.params == params and previous.status not in ("failed", "cancelled"):
+            return previous
+        if previous is not None and not previous.finished:
+            job_manager.cancel(previous.id)
+        charge_job(client, params)
+        try:
+            job = job_manager.submit(params, count_segments(params), "high", client)
+        except JobQueueFull:
+            return None
+        preview_jobs[client] = job.id
+        preview_jobs.move_to_end(client)
+        if len(preview_jobs) > DRAFT_TRACKED_CLIENTS:
+            preview_jobs.popitem(last=False)
+        return job
+
+# Préréglages (formulaires par défaut du frontend, chaque mode et chaque symétrie) :
+# rendus au démarrage et conservés sur disque, servis sans passer par le pool
+preset_library = PresetLibrary(normalize_params, lambda params: render_params(params, bounded=False)[0])
+
+def warm_presets():
+    """Rend en arrière-plan les préréglages absents du disque (PRESETS_WARM=0 pour s'en passer)"""
+    if PRESETS_WARM:
+        preset_library.warm_async(batch_executor)
+
+def client_id():
+    """Identifiant du client pour l'équité de la file : en-tête X-Client-Id, sinon adresse IP"""
+    return request.headers.get("X-Client-Id") or request.remote_addr
+
+def job_status(job):
+    """État JSON d'un travail, avec sa position en file et l'URL du résultat une fois terminé"""
+    status = job.to_dict()
+    if job.status == "queued":
+        status["position"] = job_manager.position(job)
+    if job.status == "done":
+        status["result"] = f"/api/jobs/{job.id}/result"
+        status["render_key"] = params_key(job.params)
+        status["cache"] = job.cache_status
+    return status
+
+@app.route("/api/jobs", methods=['POST', 'OPTIONS'])
+def create_job_endpoint():
+    """Met un rendu en file et renvoie immédiatement l'identifiant du travail"""
+    if request.method == 'OPTIONS':
+        return '', 200
+        
+    try:
+        data = request.json
+        params = normalize_params(data)
+        client = client_id()
+        charge_job(client, params)
+        job = job_manager.submit(params, count_segments(params), data.get("priority", "normal"), client)
+    except JobQueueFull as e:
+        return overloaded_response(e)
+    except RateLimited as e:
+        return rate_limited_response(e)
+    except Exception as e:
+        logging.error(f"Erreur: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    
+    response = jsonify(job_status(job))
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job.id}"
+    return response
+
+@app.route("/api/jobs/<job_id>", methods=['GET', 'DELETE', 'OPTIONS'])
+def job_endpoint(job_id):
+    """État et avancement d'un travail (GET), ou annulation (DELETE)"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    job = job_manager.cancel(job_id) if request.method == 'DELETE' else job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Travail introuvable"}), 404
+    return jsonify(job_status(job))
+
+@app.route("/api/jobs/<job_id>/result", methods=['GET'])
+def job_result_endpoint(job_id):
+    """Image d'un travail terminé, dans le format négocié comme /api/generate"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Travail introuvable"}), 404
+    if job.status != "done":
+        return jsonify({"error": f"Travail non terminé ({job.status})"}), 409
+    
+    try:
+        fmt = negotiate_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    etag = f"{params_key(job.params)[:32]}-{fmt}"
+    cached = not_modified(etag, weak=fmt == "json")
+    if cached is not None:
+        return cached
+    response = image_response(job.result, fmt, etag, {"params": job.params})
+    response.headers["X-Render-Key"] = params_key(job.params)
+    return response
+
+@app.route("/api/presets", methods=['GET'])
+def presets_endpoint():
+    """Liste des préréglages : paramètres, clé de rendu, URL de l'image et de la vignette"""
+    response = jsonify({"presets": preset_library.list()})
+    # Courte durée : l'état « ready » change pendant le préchauffage
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response.make_conditional(request)
+
+@app.route("/api/presets/<key>/<kind>.png", methods=['GET'])
+def preset_image_endpoint(key, kind):
+    """Image ou vignette PNG d'un préréglage, cache navigateur d'un an"""
+    if kind not in ("image", "thumbnail"):
+        return jsonify({"error": "Préréglage introuvable"}), 404
+    data = preset_library.image(key) if kind == "image" else preset_library.thumbnail(key)
+    if data is None:
+        return jsonify({"error": "Préréglage introuvable ou pas encore rendu"}), 404
+    etag = f"{key[:32]}-{kind}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    response = Response(data, mimetype="image/png")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/patterns", methods=['GET'])
+def patterns_endpoint():
+    """Page du catalogue, du plus récent au plus ancien : métadonnées et URL des vignettes, sans image
+
+    Filtres : mode, fractal_type, color, background_color, since, until ;
+    page suivante avec before=<next_before>.
+    """
+    if not pattern_store.enabled:
+        return jsonify({"error": "Catalogue désactivé"}), 404
+    args = request.args.to_dict()
+    try:
+        before = args.pop("before", None)
+        limit = args.pop("limit", PATTERN_PAGE_SIZE)
+        patterns, next_before = pattern_store.search(args, before, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"patterns": patterns, "next_before": next_before})
+
+@app.route("/api/patterns/<int:pattern_id>", methods=['GET', 'DELETE', 'OPTIONS'])
+def pattern_endpoint(pattern_id):
+    """Métadonnées d'un motif catalogué (GET), ou retrait du catalogue (DELETE)"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    if not pattern_store.enabled:
+        return jsonify({"error": "Catalogue désactivé"}), 404
+    
+    if request.method == 'DELETE':
+        if not pattern_store.delete(pattern_id):
+            return jsonify({"error": "Motif introuvable"}), 404
+        return '', 204
+    pattern = pattern_store.get(pattern_id)
+    if pattern is None:
+        return jsonify({"error": "Motif introuvable"}), 404
+    return jsonify(pattern)
+
+@app.route("/api/images/<content_hash>/<size>.<fmt>", methods=['GET'])
+def derivative_endpoint(content_hash, size, fmt):
+    """Déclinaison (thumb, medium, full ; PNG ou WebP) d'une image servie, produite à la première demande"""
+    if size not in DERIVATIVE_SIZES or fmt not in DERIVATIVE_FORMATS:
+        return jsonify({"error": "Déclinaison inconnue"}), 404
+    etag = f"{content_hash[:32]}-{size}-{fmt}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    with metrics.stage("derivatives"):
+        data = derivative_store.get(content_hash, size, fmt)
+    if data is None:
+        return jsonify({"error": "Image inconnue ou expirée"}), 404
+    response = Response(data, mimetype=DERIVATIVE_FORMATS[fmt])
+    response.set_etag(etag)
+    # Adresse dérivée du contenu : jamais modifiée
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/jobs/stats", methods=['GET'])
+def job_stats_endpoint():
+    return jsonify(job_manager.stats())
+
+@app.route("/api/cache/stats", methods=['GET'])
+def cache_stats_endpoint():
+    return jsonify(render_cache.stats())
+
+@app.route("/api/admission/stats", methods=['GET'])
+def admission_stats_endpoint():
+    return jsonify({"slots": render_slots.stats(), "clients": client_budgets.stats()})
+
+@app.route("/api/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Métriques au format texte Prometheus (404 si METRICS_ENABLED=0)"""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({"error": "Métriques désactivées"}), 404
+    backlog = render_backlog.stats()
+    jobs = job_manager.stats()
+    cache = render_cache.stats()
+    slots = render_slots.stats()
+    gauges = [
+        ("render_backlog_active", "Rendus admis (en cours ou en attente d'un worker)", backlog["active"]),
+        ("job_queue_depth", "Travaux asynchrones en file", jobs["queued"]),
+        ("job_running", "Travaux asynchrones en cours", jobs["running"]),
+        ("render_cache_entries", "Entrées du cache mémoire", cache["entries"]),
+        ("render_cache_bytes", "Octets du cache mémoire", cache["bytes"]),
+        ("derivative_cache_bytes", "Octets des déclinaisons d'images en mémoire", derivative_store.stats()["bytes"]),
+        ("presets_ready", "Préréglages rendus et servis sans rendu", preset_library.stats()["ready"]),
+        ("render_slots_expensive_active", "Slots de génération occupés par des rendus coûteux", slots["active"]["expensive"]),
+        ("render_slots_cheap_waiting", "Rendus légers en attente d'un slot", slots["waiting"]["cheap"]),
+        ("render_slots_expensive_waiting", "Rendus coûteux en attente d'un slot", slots["waiting"]["expensive"]),
+        ("patterns_stored", "Motifs du catalogue persistant", pattern_store.stats().get("patterns", 0)),
+    ]
+    counters = [
+        ("render_backlog_rejected_total", "Rendus refusés par le backlog depuis le démarrage", backlog["rejected"]),
+        ("render_cache_hits_total", "Succès du cache (mémoire et disque) depuis le démarrage", cache["hits"]),
+        ("render_cache_misses_total", "Échecs du cache depuis le démarrage", cache["misses"]),
+        ("client_budget_rejected_total", "Rendus refusés (budget client épuisé) depuis le démarrage",
+         client_budgets.stats()["rejected"]),
+    ]
+    return Response(metrics.render_prometheus(gauges, counters), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/forme_geo", methods=['GET'])
 def home_endpoint():
     return jsonify({
@@ -325,5 +1136,18 @@ def home_endpoint():
         "peoples": ["Jean", "Pierre", "Jacques", "Paul"],
     })
 
+def shutdown(timeout=None):
+    """Arrêt propre : refuse les nouveaux rendus, attend ceux en cours et les travaux lancés, puis arrête le pool"""
+    render_backlog.close()
+    job_manager.drain(timeout)
+    render_backlog.drain(timeout)
+    shutdown_render_pool()
+
 if __name__ == "__main__":
-    app.run(debug=True, port=8080, threaded=True)
+    # Serveur de développement (FLASK_DEBUG=1 pour le débogueur) ;
+    # en production : uvicorn asgi:app (voir asgi.py)
+    warm_presets()
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1",
+            host=os.environ.get("HOST", "127.0.0.1"),
+            port=int(os.environ.get("PORT", 8080)),
+            threaded=True)
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Modules du serveur importés à plat, comme par server.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Aucun état persistant partagé avec un serveur réel : dossiers temporaires, pas de préchauffage
+_STATE_DIR = tempfile.mkdtemp(prefix="motifs-tests-")
+os.environ.setdefault("PRESETS_DIR", os.path.join(_STATE_DIR, "presets"))
+os.environ.setdefault("PRESETS_WARM", "0")
+os.environ.setdefault("RENDER_CACHE_DIR", "")
+
+@pytest.fixture(scope="session")
+def server():
+    """Module server importé une fois ; pool de rendu arrêté en fin de session"""
+    import server as server_module
+    yield server_module
+    server_module.shutdown(timeout=10)
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
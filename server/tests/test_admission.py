@@ -0,0 +1,18 @@
+import uuid
+
+from admission import ClientBudgets
+
+def test_jobs_are_refused_once_the_client_budget_is_spent(server, client, monkeypatch):
+    # Budget d'un seul rendu, sans remboursement pendant le test
+    monkeypatch.setattr(server, "client_budgets", ClientBudgets(rate=1e-6, burst=1))
+    headers = {"X-Client-Id": uuid.uuid4().hex}
+    body = {"mode": "spiral", "color": "#123456", "background_color": "#fedcba"}
+
+    accepted = client.post("/api/jobs", json=body, headers=headers)
+    assert accepted.status_code == 202
+    refused = client.post("/api/jobs", json={**body, "color": "#654321"}, headers=headers)
+    assert refused.status_code == 429
+    assert int(refused.headers["Retry-After"]) > 0
+    # Même travail par /api/generate : même budget, même refus
+    assert client.post("/api/generate", json={**body, "color": "#abcdef"}, headers=headers).status_code == 429
+    client.delete(f"/api/jobs/{accepted.get_json()['id']}")
@@ -0,0 +1,16 @@
+import time
+
+def test_slow_reader_does_not_hold_render_resources(server, client):
+    """Le rendu se termine sans que le client lise : backlog et slots sont rendus avant la lecture"""
+    response = client.post("/api/animate", json={"params": {"mode": "spiral", "color": "#335577"}, "frames": 12},
+                           buffered=False)
+    assert response.status_code == 200
+    deadline = time.monotonic() + 30
+    while server.render_backlog.stats()["active"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert server.render_backlog.stats()["active"] == 0
+    assert server.render_slots.stats()["active"] == {"cheap": 0, "expensive": 0}
+
+    data = b"".join(response.response)
+    response.close()
+    assert data.startswith(b"GIF89a") and data.endswith(b"\x3b")
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+def call(asgi, headers, chunks):
+    """Exécute une requête POST sur l'application ASGI ; renvoie (statut, morceaux lus)"""
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent, read = [], []
+
+    async def receive():
+        read.append(True)
+        return messages[len(read) - 1]
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/generate", "query_string": b"",
+             "headers": headers, "http_version": "1.1"}
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent[0]["status"], len(read)
+
+@pytest.fixture
+def asgi(server, monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi, "ASGI_MAX_BODY_BYTES", 100)
+    return asgi
+
+def test_declared_length_over_limit_is_rejected_unread(asgi):
+    status, read = call(asgi, [(b"content-length", b"1000")], [b"x" * 1000])
+    assert status == 413
+    assert read == 0
+
+def test_streamed_body_over_limit_is_rejected(asgi):
+    status, read = call(asgi, [], [b"x" * 60, b"x" * 60, b"x" * 60])
+    assert status == 413
+    assert read == 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import turtle_worker
+from segment_buffer import release_shared
+
+LARGE = [
+    {"mode": "fractal", "fractal_type": "koch", "iterations": 4, "pen_width": 2, "color": "#0070f3",
+     "background_color": "#101820", "width": 900, "height": 1300},
+    {"mode": "spiral", "gradient": True, "symmetry": {"mirror": True}, "width": 1300, "height": 700},
+]
+
+def test_poster_size_is_admitted(server):
+    params = server.normalize_params({"mode": "geometric", "width": 8000, "height": 8000})
+    assert turtle_worker.output_size(params) == (8000, 8000)
+
+@pytest.mark.parametrize("data", LARGE, ids=lambda data: data["mode"])
+def test_bands_join_without_seams(server, data):
+    """Bandes rendues séparément (géométrie en mémoire partagée) = image rendue d'un seul tenant"""
+    params = server.normalize_params(data)
+    width, height = turtle_worker.output_size(params)
+    edges = [0, 250, 601, height]
+
+    shared = turtle_worker.share_segments(params)
+    try:
+        img = Image.new('RGB', (width, height))
+        for top, bottom in zip(edges, edges[1:]):
+            raw = turtle_worker.render_region(params, (0, top, width, bottom), shared)
+            img.paste(Image.frombytes('RGB', (width, bottom - top), raw), (0, top))
+    finally:
+        release_shared(shared)
+
+    whole = turtle_worker.render_image(params).convert('RGB')
+    assert np.array_equal(np.asarray(img), np.asarray(whole))
+
+def test_large_render_goes_through_bands(server, monkeypatch):
+    monkeypatch.setattr(server, "RENDER_PARALLEL_PIXELS", 0)
+    params = server.normalize_params({"mode": "spiral", "width": 1200, "height": 700})
+    img = Image.open(server.generate_pattern_with_params(params))
+    assert img.size == (1200, 700)
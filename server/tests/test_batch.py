@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+def test_sweep_is_cartesian_product(server):
+    items = server.expand_sweep({"mode": "geometric", "size": 80},
+                                {"sides": [3, 4], "depth": {"start": 2, "stop": 4}})
+    assert [(item["sides"], item["depth"]) for item in items] == [
+        (3, 2.0), (3, 3.0), (3, 4.0), (4, 2.0), (4, 3.0), (4, 4.0)]
+    assert all(item["mode"] == "geometric" and item["size"] == 80 for item in items)
+
+def test_sweep_range_includes_stop(server):
+    values = [item["angle"] for item in server.expand_sweep({}, {"angle": {"start": 0, "stop": 0.3, "step": 0.1}})]
+    assert values == pytest.approx([0, 0.1, 0.2, 0.3])
+    values = [item["angle"] for item in server.expand_sweep({}, {"angle": {"start": 10, "stop": 0, "step": -5}})]
+    assert values == [10, 5, 0]
+    # Pas qui n'atteint pas exactement la borne : elle n'est pas dépassée
+    assert [item["angle"] for item in server.expand_sweep({}, {"angle": {"start": 0, "stop": 5, "step": 2}})] == [0, 2, 4]
+
+@pytest.mark.parametrize("sweep", [
+    {"angle": {"start": 0, "stop": 10, "step": -1}},
+    {"angle": {"start": 0, "stop": 10, "step": 0}},
+    {"angle": "0..10"},
+])
+def test_invalid_sweep_is_rejected(server, sweep):
+    with pytest.raises(ValueError):
+        server.expand_sweep({}, sweep)
+
+def test_sweep_over_max_items_is_rejected(client, server):
+    side = int(server.BATCH_MAX_ITEMS ** 0.5) + 1
+    response = client.post("/api/generate/batch", json={
+        "sweep": {"sides": list(range(3, 3 + side)), "depth": {"start": 1, "stop": side}}})
+    assert response.status_code == 400
+    assert "trop grand" in response.get_json()["error"]
+    response = client.post("/api/generate/batch", json={"items": [{}] * (server.BATCH_MAX_ITEMS + 1)})
+    assert response.status_code == 400
+
+def test_results_stream_one_line_per_item(client, server, monkeypatch):
+    render_params = server.render_params
+
+    def failing_second_item(params, **kwargs):
+        if params["sides"] == 4:
+            raise RuntimeError("rendu impossible")
+        return render_params(params, **kwargs)
+
+    monkeypatch.setattr(server, "render_params", failing_second_item)
+    response = client.post("/api/generate/batch", buffered=False, json={
+        "base": {"mode": "geometric", "depth": 3}, "sweep": {"sides": [3, 4, 5]}})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Batch-Size"] == "3"
+
+    # Un morceau de la réponse par élément, chacun une ligne JSON complète
+    chunks = list(response.response)
+    response.close()
+    assert len(chunks) == 3
+    lines = {}
+    for chunk in chunks:
+        assert chunk.endswith(b"\n") and chunk.count(b"\n") == 1
+        line = json.loads(chunk)
+        lines[line["index"]] = line
+    assert sorted(lines) == [0, 1, 2]
+    assert lines[1] == {"index": 1, "error": "rendu impossible"}
+    for index in (0, 2):
+        assert lines[index]["image"].startswith("data:image/png;base64,")
+        assert lines[index]["params"]["sides"] == 3 + index
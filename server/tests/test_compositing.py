@@ -0,0 +1,95 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from compositing import BLEND_MODES, combine_layers
+
+BACKDROP = (200, 60, 120, 153)
+SOURCE = (40, 180, 230, 204)
+OPACITY = 0.5
+
+# Formules séparables du W3C Compositing and Blending Level 1 (couleurs 0..1)
+W3C = {
+    "normal": lambda cb, cs: cs,
+    "multiply": lambda cb, cs: cb * cs,
+    "screen": lambda cb, cs: cb + cs - cb * cs,
+    "overlay": lambda cb, cs: np.where(cb <= 0.5, 2 * cb * cs, 1 - 2 * (1 - cb) * (1 - cs)),
+    "add": lambda cb, cs: np.minimum(cb + cs, 1),
+    "difference": lambda cb, cs: np.abs(cb - cs),
+}
+
+def expected(mode, backdrop=BACKDROP, source=SOURCE, opacity=OPACITY):
+    """Résultat attendu (non prémultiplié, 0..255) : fusion puis composition « source over »"""
+    cb, ab = np.array(backdrop[:3]) / 255, backdrop[3] / 255
+    cs, as_ = np.array(source[:3]) / 255, source[3] / 255 * opacity
+    mixed = (1 - ab) * cs + ab * W3C[mode](cb, cs)
+    alpha = as_ + ab * (1 - as_)
+    color = (mixed * as_ + cb * ab * (1 - as_)) / alpha
+    return np.append(color * 255, alpha * 255)
+
+def solid(rgba, size=(4, 3)):
+    return Image.new('RGBA', size, rgba)
+
+def test_every_mode_is_covered():
+    assert set(BLEND_MODES) == set(W3C)
+
+@pytest.mark.parametrize("mode", sorted(W3C))
+def test_blend_matches_w3c_formula(mode):
+    result = combine_layers([(solid(BACKDROP), "normal", 1.0), (solid(SOURCE), mode, OPACITY)])
+    pixels = np.asarray(result, dtype=np.float64).reshape(-1, 4)
+    assert np.abs(pixels - expected(mode)).max() <= 1
+
+@pytest.mark.parametrize("mode", ["multiply", "screen", "overlay"])
+def test_opaque_layers_blend_without_compositing(mode):
+    """Fond et calque opaques, opacité 1 : le résultat est la formule de fusion seule"""
+    backdrop, source = (90, 140, 250, 255), (220, 30, 128, 255)
+    result = combine_layers([(solid(backdrop), "normal", 1.0), (solid(source), mode, 1.0)])
+    want = W3C[mode](np.array(backdrop[:3]) / 255, np.array(source[:3]) / 255) * 255
+    assert np.abs(np.asarray(result, dtype=np.float64)[0, 0, :3] - want).max() <= 1
+
+def test_layer_is_resized_to_backdrop():
+    result = combine_layers([(solid(BACKDROP, (8, 6)), "normal", 1.0), (solid(SOURCE, (3, 3)), "screen", 1.0)])
+    assert result.size == (8, 6)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        combine_layers([(solid(BACKDROP), "normal", 1.0), (solid(SOURCE), "dodge", 1.0)])
+
+def _data_uri(rgba):
+    buffer = io.BytesIO()
+    solid(rgba, (50, 50)).save(buffer, format='PNG')
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+@pytest.fixture
+def render_key(client):
+    response = client.get("/api/generate?mode=spiral&format=png")
+    assert response.status_code == 200
+    return response.headers["X-Render-Key"]
+
+def test_render_references_are_resolved(client, render_key):
+    overlay = _data_uri((255, 0, 0, 255))
+    response = client.post("/api/combine?format=png", json={"images": [f"render:{render_key}", overlay]})
+    assert response.status_code == 200
+    response = client.post("/api/combine?format=png", json={"layers": [
+        {"ref": render_key}, {"image": overlay, "blendMode": "multiply", "opacity": 1.0}]})
+    assert response.status_code == 200
+    combined = Image.open(io.BytesIO(response.data))
+    assert combined.size == (500, 500)
+    # Fond blanc du rendu multiplié par du rouge pur
+    assert combined.convert('RGB').getpixel((0, 0)) == (255, 0, 0)
+
+def test_unknown_render_reference_is_not_found(client):
+    response = client.post("/api/combine", json={"layers": [{"ref": "0" * 64}, {"image": _data_uri(SOURCE)}]})
+    assert response.status_code == 404
+    response = client.post("/api/combine", json={"images": ["render:" + "0" * 64, _data_uri(SOURCE)]})
+    assert response.status_code == 404
+
+def test_invalid_layers_are_rejected(client, render_key):
+    response = client.post("/api/combine", json={"layers": [{"ref": render_key},
+                                                            {"image": _data_uri(SOURCE), "blendMode": "dodge"}]})
+    assert response.status_code == 400
+    response = client.post("/api/combine", json={"images": [f"render:{render_key}"]})
+    assert response.status_code == 400
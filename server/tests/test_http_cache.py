@@ -0,0 +1,16 @@
+def test_json_responses_carry_a_weak_etag_and_revalidate(client):
+    query = "/api/generate?mode=spiral&color=%23224466"
+    first = client.get(query)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    revalidated = client.get(query, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+
+def test_binary_responses_keep_a_strong_etag(client):
+    response = client.get("/api/generate?mode=spiral&color=%23224466&format=png")
+    assert response.headers["ETag"].startswith('"')
+    assert client.get("/api/generate?mode=spiral&color=%23224466&format=png",
+                      headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,103 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from jobs import JobManager, JobQueueFull
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "délai dépassé"
+        time.sleep(0.01)
+
+@pytest.fixture
+def gated_manager():
+    """JobManager à un seul thread dont le runner attend `gate` et note l'ordre des rendus"""
+    gate = threading.Event()
+    order = []
+
+    def runner(params, progress, cancel):
+        gate.wait(10)
+        order.append(params["name"])
+        return b"", "MISS"
+
+    manager = JobManager(runner, workers=1, max_depth=10, max_per_client=10, result_ttl=60)
+    yield manager, gate, order
+    gate.set()
+
+def test_priorities_then_round_robin_between_clients(gated_manager):
+    manager, gate, order = gated_manager
+    blocker = manager.submit({"name": "blocker"}, 1, "normal", "z")
+    wait_for(lambda: blocker.status == "running")
+
+    jobs = {}
+    for name, priority, client in [("a1", "normal", "a"), ("a2", "normal", "a"), ("a3", "normal", "a"),
+                                   ("b1", "normal", "b"), ("low", "low", "b"), ("c1", "high", "c"),
+                                   ("b2", "normal", "b")]:
+        jobs[name] = manager.submit({"name": name}, 1, priority, client)
+    expected = ["c1", "a1", "b1", "a2", "b2", "a3", "low"]
+    # Position annoncée = rang effectif de passage
+    assert [manager.position(jobs[name]) for name in expected] == list(range(len(expected)))
+
+    gate.set()
+    wait_for(lambda: all(job.finished for job in jobs.values()))
+    assert order == ["blocker"] + expected
+
+def test_queue_depth_and_per_client_limits():
+    manager = JobManager(lambda params, progress, cancel: (b"", "MISS"), workers=1, max_depth=0)
+    with pytest.raises(JobQueueFull):
+        manager.submit({}, 1)
+    gate = threading.Event()
+    manager = JobManager(lambda params, progress, cancel: gate.wait(10), workers=1, max_per_client=1)
+    try:
+        manager.submit({}, 1, client="a")
+        with pytest.raises(JobQueueFull):
+            manager.submit({}, 1, client="a")
+        manager.submit({}, 1, client="b")
+    finally:
+        gate.set()
+
+def test_cancelling_a_queued_job_removes_it(gated_manager):
+    manager, gate, order = gated_manager
+    blocker = manager.submit({"name": "blocker"}, 1)
+    wait_for(lambda: blocker.status == "running")
+    queued = manager.submit({"name": "queued"}, 1)
+    assert manager.cancel(queued.id).status == "cancelled"
+    assert manager.stats()["queued"] == 0
+    gate.set()
+    wait_for(lambda: blocker.finished)
+    assert order == ["blocker"]
+
+def test_full_queue_answers_503(client, server, monkeypatch):
+    monkeypatch.setattr(server, "job_manager", JobManager(server.run_job, max_depth=0))
+    response = client.post("/api/jobs", json={"mode": "spiral"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 0
+
+def test_delete_cancels_running_job_and_frees_worker(client, server):
+    headers = {"X-Client-Id": uuid.uuid4().hex}
+    # Plusieurs secondes de tracé dans le worker
+    response = client.post("/api/jobs", headers=headers, json={"mode": "fractal", "fractal_type": "koch",
+                                                               "iterations": 10})
+    assert response.status_code == 202
+    location = response.headers["Location"]
+    wait_for(lambda: client.get(location).get_json()["status"] == "running")
+
+    pool = server.get_render_pool()
+    busy = set(pool._workers) - set(pool._idle)
+    assert len(busy) == 1
+    started = time.monotonic()
+    assert client.delete(location).status_code == 200
+    wait_for(lambda: client.get(location).get_json()["status"] == "cancelled", timeout=3)
+    assert time.monotonic() - started < 3
+
+    # Worker tué et remplacé : le pool a de nouveau tous ses workers, libres
+    worker = busy.pop()
+    assert not worker.process.is_alive()
+    wait_for(lambda: len(pool._idle) == pool.size)
+    assert worker not in pool._workers
+    response = client.post("/api/jobs", headers=headers, json={"mode": "spiral", "color": "#123456"})
+    done = response.headers["Location"]
+    wait_for(lambda: client.get(done).get_json()["status"] == "done")
@@ -0,0 +1,45 @@
+import time
+
+from turtle_worker import FRACTAL_TYPES
+
+def _candidates(server):
+    """Requêtes fractales les plus lourdes (gradient, glow, kaléidoscope) à chaque nombre d'itérations"""
+    for fractal_type in FRACTAL_TYPES:
+        for iterations in range(1, server.FRACTAL_MAX_ITERATIONS + 1):
+            for symmetry in (None, {"kaleidoscope": True, "mirror": True}):
+                data = {"mode": "fractal", "fractal_type": fractal_type, "iterations": iterations,
+                        "gradient": True, "glow": True}
+                if symmetry:
+                    data["symmetry"] = symmetry
+                yield data
+
+def test_heaviest_admitted_render_finishes_within_timeout(server):
+    """Le rendu admis le plus coûteux (au plus près du budget) se termine avant RENDER_TIMEOUT"""
+    from admission import estimate_cost
+    admitted = []
+    for data in _candidates(server):
+        try:
+            admitted.append(server.normalize_params(data))
+        except ValueError:
+            continue
+    heaviest = max(admitted, key=estimate_cost)
+    assert estimate_cost(heaviest) <= server.RENDER_COST_BUDGET
+
+    started = time.perf_counter()
+    png_bytes, _ = server.render_params(heaviest, bounded=False)
+    elapsed = time.perf_counter() - started
+    assert png_bytes.startswith(b"\x89PNG")
+    assert elapsed < server.RENDER_TIMEOUT, f"{heaviest} rendu en {elapsed:.1f} s"
+
+def test_render_over_cost_budget_is_rejected(client):
+    response = client.post("/api/generate", json={"mode": "fractal", "fractal_type": "koch", "iterations": 10,
+                                                  "gradient": True, "glow": True})
+    assert response.status_code == 400
+    assert "coûteux" in response.get_json()["error"]
+
+def test_symmetry_rotation_is_clamped(server):
+    """Une rotation démesurée est ramenée au maximum du frontend avant tout comptage"""
+    started = time.perf_counter()
+    params = server.normalize_params({"symmetry": {"rotation": 10 ** 7, "mirror": "yes"}})
+    assert time.perf_counter() - started < 1
+    assert params["symmetry"] == {"mirror": True, "rotation": server.SYMMETRY_MAX_ROTATION, "kaleidoscope": False}
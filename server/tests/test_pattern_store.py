@@ -0,0 +1,25 @@
+from pattern_store import PatternStore
+
+def _record(store, index, content_hash):
+    params = {"mode": "geometric", "color": "#0070f3", "background_color": "#ffffff", "sides": index}
+    return store.record(f"key-{index}", params, b"png", content_hash, (500, 500))
+
+def test_store_is_capped_and_evicts_oldest_rows(tmp_path):
+    store = PatternStore(str(tmp_path), max_rows=3)
+    hashes = [f"{index:064x}" for index in range(5)]
+    ids = [_record(store, index, content_hash) for index, content_hash in enumerate(hashes)]
+    # Même clé de rendu : pas de nouvelle ligne
+    assert _record(store, 4, hashes[4]) == ids[4]
+
+    assert store.stats()["patterns"] == 3
+    assert [pattern["id"] for pattern in store.search()[0]] == ids[:1:-1]
+    assert store.image(hashes[0]) is None and store.image(hashes[1]) is None
+    assert store.image(hashes[4]) == b"png"
+
+def test_evicted_image_shared_with_a_kept_pattern_stays(tmp_path):
+    store = PatternStore(str(tmp_path), max_rows=1)
+    shared = "a" * 64
+    _record(store, 0, shared)
+    _record(store, 1, shared)
+    assert store.stats()["patterns"] == 1
+    assert store.image(shared) == b"png"
@@ -0,0 +1,26 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from presets import PresetLibrary
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_warm_drops_presets_of_an_older_renderer_version(server, tmp_path):
+    stale = tmp_path / ("0" * 64 + ".image.png")
+    stale.write_bytes(b"ancien rendu")
+    library = PresetLibrary(server.normalize_params, lambda params: _png(), directory=str(tmp_path))
+    with ThreadPoolExecutor(2) as executor:
+        assert library.warm(executor) == len(library.list())
+    assert not stale.exists()
+    assert len(os.listdir(tmp_path)) == 2 * len(library.list())
+
+    # Redémarrage : tout est relu depuis le disque, rien n'est rendu ni effacé
+    library = PresetLibrary(server.normalize_params, lambda params: _png(), directory=str(tmp_path))
+    with ThreadPoolExecutor(2) as executor:
+        assert library.warm(executor) == 0
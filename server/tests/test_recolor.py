@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import turtle_worker
+from segment_buffer import release_shared
+
+CASES = [
+    {"mode": "spiral", "gradient": True, "gradient_start": "#0070f3", "gradient_end": "#ff6b6b",
+     "symmetry": {"mirror": True}},
+    {"mode": "fractal", "fractal_type": "tree", "gradient": True, "background_color": "#ffeedd"},
+    {"mode": "geometric", "color": "#000000", "background_color": "#334455"},
+]
+RECOLOR = {"color": "#22aa44", "gradient_start": "#ffcc00", "gradient_end": "#3300ff", "background_color": "#101820"}
+
+def cold_png(params):
+    turtle_worker._geometry_cache.clear()
+    return turtle_worker.render_png(params)
+
+@pytest.mark.parametrize("data", CASES, ids=lambda data: data["mode"])
+def test_recolor_from_geometry_cache_matches_cold_render(server, data):
+    first = server.normalize_params(data)
+    recolored = server.normalize_params({**data, **RECOLOR})
+    assert turtle_worker.geometry_key(first) == turtle_worker.geometry_key(recolored)
+
+    cold_png(first)
+    assert turtle_worker.cached_levels(recolored) is not None
+    warm = turtle_worker.render_png(recolored)
+    assert warm == cold_png(recolored)
+
+@pytest.mark.parametrize("data", CASES, ids=lambda data: data["mode"])
+def test_rendering_route_does_not_change_the_image(server, data):
+    """Carte des niveaux, tracé direct et bandes en mémoire partagée : mêmes pixels pour les mêmes paramètres"""
+    params = server.normalize_params(data)
+    width, height = turtle_worker.output_size(params)
+    turtle_worker._geometry_cache.clear()
+    by_levels = np.asarray(turtle_worker.render_image(params))
+    direct = np.asarray(turtle_worker.render_image(params, segments=turtle_worker.build_segments(params)))
+    assert np.array_equal(by_levels, direct)
+
+    shared = turtle_worker.share_segments(params)
+    try:
+        raw = b"".join(turtle_worker.render_region(params, (0, top, width, bottom), shared)
+                       for top, bottom in ((0, height // 3), (height // 3, height)))
+    finally:
+        release_shared(shared)
+    assert raw == by_levels.tobytes()
@@ -0,0 +1,58 @@
+import os
+import uuid
+
+from render_cache import RenderCache
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = RenderCache(max_entries=2, max_bytes=1000, disk_dir="")
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"  # "b" devient le moins récent
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+def test_memory_byte_limit():
+    cache = RenderCache(max_entries=100, max_bytes=10, disk_dir="")
+    cache.put("a", b"x" * 4)
+    cache.put("b", b"x" * 4)
+    cache.put("c", b"x" * 4)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 8
+    # Plus gros que tout le cache : jamais gardé, rien n'est évincé pour lui
+    cache.put("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+    # Remplacer une entrée ne compte pas ses octets deux fois
+    cache.put("b", b"x" * 2)
+    assert cache.stats()["bytes"] == 6
+
+def test_disk_tier_is_trimmed_to_its_size(tmp_path):
+    cache = RenderCache(max_entries=1, max_bytes=1000, disk_dir=str(tmp_path), disk_max_bytes=10)
+    for key in ("a", "b", "c"):
+        cache.put(key, key.encode() * 4)
+    # Sur disque : les plus récents tenant dans 10 octets ; en mémoire : le dernier seulement
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "c.png"]
+    stats = cache.stats()
+    assert (stats["disk_entries"], stats["disk_bytes"], stats["disk_evictions"]) == (2, 8, 1)
+
+    # Entrée évincée de la mémoire relue sur disque
+    assert cache.get("b") == b"bbbb"
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("a") is None
+
+    # Index reconstruit au redémarrage, taille plafonnée à la nouvelle limite
+    reopened = RenderCache(max_entries=1, max_bytes=1000, disk_dir=str(tmp_path), disk_max_bytes=4)
+    assert reopened.stats()["disk_entries"] == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+def test_generate_reports_cache_miss_then_hit(client):
+    # Paramètres propres à ce test : jamais rendus auparavant dans la session
+    query = f"/api/generate?format=png&mode=spiral&color=%23{uuid.uuid4().hex[:6]}"
+    first = client.get(query)
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    second = client.get(query)
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.data == first.data
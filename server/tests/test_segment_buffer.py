@@ -0,0 +1,61 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from segment_buffer import SegmentBuffer, attach_shared, release_shared
+from turtle_worker import build_segments
+
+PARAMS = {"mode": "fractal", "fractal_type": "tree", "iterations": 6, "size": 150, "angle": 30,
+          "reduction": 0.7, "pen_width": 3, "color": "#0070f3", "background_color": "#ffffff",
+          "gradient": True, "gradient_start": "#0070f3", "gradient_end": "#ff6b6b",
+          "symmetry": {"mirror": True, "rotation": 3, "kaleidoscope": False}}
+
+@pytest.fixture(scope="module")
+def segments():
+    return build_segments(PARAMS)
+
+def assert_same(copy, original):
+    assert len(copy) == len(original)
+    assert np.array_equal(copy.coords, original.coords)
+    assert np.array_equal(copy.colors, original.colors)
+    assert np.array_equal(copy.widths, original.widths)
+    assert copy.palette == original.palette
+    assert copy.bounds() == original.bounds()
+    assert list(copy) == list(original)
+
+def test_geometry_is_not_trivial(segments):
+    assert len(segments) > 100 and len(segments.palette) > 1
+
+def test_bytes_round_trip(segments):
+    data = segments.to_bytes()
+    assert len(data) == segments.serialized_size()
+    copy = SegmentBuffer.from_bytes(data)
+    assert copy.coords.dtype == np.float32
+    assert_same(copy, segments)
+
+    subset = np.arange(3, len(segments), 7)
+    assert_same(SegmentBuffer.from_bytes(segments.take(subset).to_bytes()), segments.take(subset))
+    assert np.array_equal(copy.take(subset).polyline_starts(), segments.take(subset).polyline_starts())
+
+def test_empty_round_trip():
+    assert_same(SegmentBuffer.from_bytes(SegmentBuffer.empty().to_bytes()), SegmentBuffer.empty())
+
+def test_shared_memory_attach_and_release(segments):
+    shm = segments.to_shared_memory()
+    name = shm.name
+    shm.close()
+    try:
+        with attach_shared(name) as shared:
+            assert_same(shared, segments)
+            subset = np.flatnonzero(shared.colors == shared.colors[0])
+            assert_same(shared.take(subset), segments.take(subset))
+        # Les vues sur la mémoire partagée ne survivent pas au bloc
+        assert len(shared) == 0
+    finally:
+        release_shared(name)
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    # Libérer deux fois ne lève rien
+    release_shared(name)
@@ -0,0 +1,23 @@
+import metrics
+
+def test_unknown_fractal_type_is_rejected(client):
+    response = client.post("/api/generate", json={"mode": "fractal", "fractal_type": "x" * 40})
+    assert response.status_code == 400
+
+def test_unknown_label_values_are_folded(server):
+    metrics.start_request()
+    metrics.set_labels(mode="fractal", fractal_type="made-up")
+    assert metrics._local.labels == (("fractal_type", "other"), ("mode", "fractal"))
+    metrics.set_labels(mode="combine")
+    assert metrics._local.labels == (("mode", "combine"),)
+
+def test_non_hex_color_is_rejected(client):
+    response = client.get('/api/generate?format=svg&color=%22/%3E%3Cscript%3E')
+    assert response.status_code == 400
+
+def test_cumulative_totals_are_counters(client):
+    text = client.get("/api/metrics").get_data(as_text=True)
+    for name in ("render_backlog_rejected", "render_cache_hits", "render_cache_misses", "client_budget_rejected"):
+        assert f"# TYPE {name}_total counter" in text
+        assert f"# TYPE {name} gauge" not in text
+    assert "# TYPE render_backlog_active gauge" in text
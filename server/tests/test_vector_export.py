@@ -0,0 +1,66 @@
+import re
+import zlib
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+
+from segment_buffer import SegmentBuffer
+from vector_export import segments_to_pdf, segments_to_svg
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+def sample_segments(palette=("#ff0000", "#0000ff")):
+    """Deux polylignes rouges (une jointive de 2 segments, une isolée) puis un segment bleu"""
+    coords = np.array([[0, 0, 10, 0], [10, 0, 10, 10], [20, 20, 30, 30], [30, 30, 40, 0]], dtype=np.float32)
+    return SegmentBuffer(coords, np.array([0, 0, 0, 1], dtype=np.uint16), np.array([2, 2, 2, 2], dtype=np.uint8),
+                         palette)
+
+def test_svg_merges_runs_of_same_style():
+    root = ElementTree.fromstring(segments_to_svg(sample_segments(), (600, 400), "#123456"))
+    assert root.get("width") == "600" and root.get("height") == "400"
+    assert root.find(f"{SVG}rect").get("fill") == "#123456"
+    paths = root.findall(f".//{SVG}path")
+    assert [path.get("stroke") for path in paths] == ["#ff0000", "#0000ff"]
+    # Une sous-figure par polyligne, axe Y retourné
+    assert paths[0].get("d") == "M0 0 L10 0 10 -10 M20 -20 L30 -30"
+    assert paths[1].get("d") == "M30 -30 L40 0"
+
+def test_svg_attributes_are_escaped():
+    hostile = '"/><script>alert(1)</script><x a="&'
+    svg = segments_to_svg(sample_segments((hostile, "#0000ff")), background=hostile)
+    assert b"<script>" not in svg
+    root = ElementTree.fromstring(svg)
+    assert root.find(f"{SVG}rect").get("fill") == hostile
+    assert root.findall(f".//{SVG}path")[0].get("stroke") == hostile
+
+def test_pdf_structure():
+    pdf = segments_to_pdf(sample_segments(), (600, 400), "#123456")
+    assert pdf.startswith(b"%PDF-1.4\n") and pdf.endswith(b"%%EOF\n")
+
+    # Table xref : chaque entrée pointe sur le début de son objet
+    xref = int(re.search(rb"startxref\n(\d+)\n", pdf).group(1))
+    assert pdf[xref:].startswith(b"xref\n0 5\n")
+    entries = re.findall(rb"(\d{10}) 00000 n \n", pdf[xref:])
+    assert len(entries) == 4
+    for number, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(f"{number} 0 obj\n".encode('ascii'))
+
+    # Flux de contenu compressé, de la longueur annoncée
+    match = re.search(rb"<< /Length (\d+) /Filter /FlateDecode >>\nstream\n", pdf)
+    start = match.end()
+    length = int(match.group(1))
+    assert pdf[start + length:].startswith(b"\nendstream")
+    content = zlib.decompress(pdf[start:start + length]).decode('ascii')
+    assert "0.07 0.2 0.34 rg 0 0 600 400 re f" in content
+    assert content.count(" RG ") == 2 and content.count("\nS") == 2
+    assert b"/MediaBox [0 0 600 400]" in pdf
+
+def test_svg_endpoint_paths_match_style_runs(client):
+    response = client.get("/api/generate?format=svg&mode=fractal&fractal_type=tree&gradient=true")
+    assert response.status_code == 200
+    assert response.mimetype == "image/svg+xml"
+    root = ElementTree.fromstring(response.data)
+    styles = [(path.get("stroke"), path.get("stroke-width")) for path in root.findall(f".//{SVG}path")]
+    # Dégradé : plusieurs couleurs, jamais deux chemins consécutifs de même style
+    assert len(set(styles)) > 1
+    assert all(a != b for a, b in zip(styles, styles[1:]))
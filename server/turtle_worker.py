@@ -1,15 +1,36 @@
 import sys
 import json
-import turtle
-from PIL import Image, ImageFilter
+import logging
+from PIL import Image, ImageColor, ImageFilter
 import io
-import time
 import math
+import os
+from collections import OrderedDict
+import metrics
+from geometry import GeometryTurtle
+from rasterizer import rasterize, rasterize_levels, rasterize_progressive, colorize_levels, zoom_for_size, TILE_SIZE
+from render_cache import params_key
+from segment_buffer import attach_shared
+from vector_export import VECTOR_FORMATS
+from animation import encode_animation
+from compositing import (to_rgba_array, restore_black, ramp_white_alpha, fill_background,
+                         key_white_to_transparent, apply_glow)
+
+# Modes et types de fractale pris en charge
+MODES = ("geometric", "fractal", "spiral")
+FRACTAL_TYPES = ("tree", "koch", "sierpinski", "dragon")
+
+# Paramètres de style : sans effet sur la géométrie tracée, ils ne font que recolorer
+STYLE_PARAMS = ("color", "background_color", "gradient_start", "gradient_end", "glow_intensity")
+
+# Cache des cartes de niveaux de chaque worker (octets, 0 = désactivé)
+GEOMETRY_CACHE_MAX_BYTES = int(os.environ.get("GEOMETRY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+_geometry_cache = OrderedDict()  # clé de géométrie -> (carte des niveaux, niveaux)
+_geometry_cache_bytes = 0
 
 def hex_to_rgb(hex_color):
-    """Convertit une couleur hexadécimale en RGB"""
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    """Convertit une couleur (hexadécimale, ou nom de couleur de la tortue) en RGB ; ValueError sinon"""
+    return ImageColor.getrgb(hex_color)[:3]
 
 def rgb_to_hex(rgb):
     """Convertit RGB en hexadécimal"""
@@ -33,20 +54,38 @@ def fix_turtle_color(color):
         return "#010101"  # Presque noir mais pas complètement
     return color
 
+def gradient_color(start, end, factor):
+    """Couleur du dégradé (hexadécimale, noir corrigé) entre deux couleurs RGB"""
+    rgb = tuple(int(a + (b - a) * factor) for a, b in zip(start, end))
+    return fix_turtle_color(rgb_to_hex(rgb))
+
+def gradient_palette(params, levels, divisor):
+    """Précalcule les couleurs du dégradé pour chaque niveau (None sans dégradé)
+
+    Le niveau i reçoit la couleur interpolée au facteur i / divisor, exactement
+    comme interpolate_color, mais les couleurs hexadécimales ne sont analysées
+    qu'une seule fois. Sans couleurs de dégradé (géométrie seule, voir
+    build_segments), la palette contient les facteurs eux-mêmes.
+    """
+    if not params.get("gradient", False):
+        return None
+    if params["gradient_start"] is None:
+        return [level / divisor for level in range(levels)]
+    start = hex_to_rgb(params["gradient_start"])
+    end = hex_to_rgb(params["gradient_end"])
+    return [gradient_color(start, end, level / divisor) for level in range(levels)]
+
 def draw_geometric_pattern(t, params):
     """Dessine un motif géométrique avec dégradé optionnel"""
     sides = params["sides"]
     depth = params["depth"]
     size = params["size"]
     angle = params["angle"]
-    gradient = params.get("gradient", False)
+    palette = gradient_palette(params, depth, max(1, depth - 1))
     
     for i in range(depth):
-        if gradient:
-            # Calculer la couleur pour cette itération
-            factor = i / max(1, depth - 1)
-            color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-            t.color(fix_turtle_color(color))
+        if palette:
+            t.color(palette[i])
         
         for _ in range(sides):
             t.forward(size)
@@ -54,105 +93,134 @@ def draw_geometric_pattern(t, params):
         t.right(angle)
         size *= 0.95
 
+# Opérations de la pile explicite de l'arbre et du triangle de Sierpinski
+_ENTER, _FORWARD, _BACKWARD, _LEFT, _RIGHT, _CLOSE_BRANCH = range(6)
+
 def draw_fractal_tree(t, length, iterations, angle, reduction, params, current_depth=0):
-    """Dessine un arbre fractal avec dégradé optionnel"""
-    if iterations == 0:
-        return
-    
-    gradient = params.get("gradient", False)
-    if gradient:
-        max_depth = params.get("iterations", 4)
-        factor = current_depth / max(1, max_depth - 1)
-        color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-        t.color(fix_turtle_color(color))
-    
-    t.forward(length)
-    
-    # Branche droite
-    t.right(angle)
-    draw_fractal_tree(t, length * reduction, iterations - 1, angle, reduction, params, current_depth + 1)
-    
-    # Branche gauche
-    t.left(2 * angle)
-    draw_fractal_tree(t, length * reduction, iterations - 1, angle, reduction, params, current_depth + 1)
+    """Dessine un arbre fractal avec dégradé optionnel
+
+    Parcours en profondeur avec une pile explicite : même ordre de tracé que
+    la version récursive (le retour sur chaque branche reprend la couleur de la
+    dernière feuille, comme avant), sans limite de récursion.
+    """
+    max_depth = params.get("iterations", 4)
+    palette = gradient_palette(params, current_depth + iterations, max(1, max_depth - 1))
     
-    # Retour à la position initiale
-    t.right(angle)
-    t.backward(length)
+    stack = [(_ENTER, length, iterations, current_depth)]
+    while stack:
+        op, length, iterations, depth = stack.pop()
+        if op == _ENTER:
+            if iterations == 0:
+                continue
+            if palette:
+                t.color(palette[depth])
+            t.forward(length)
+            
+            # Branche droite, branche gauche, puis retour à la position initiale
+            t.right(angle)
+            child = (_ENTER, length * reduction, iterations - 1, depth + 1)
+            stack.append((_CLOSE_BRANCH, length, 0, 0))
+            stack.append(child)
+            stack.append((_LEFT, 2 * angle, 0, 0))
+            stack.append(child)
+        elif op == _LEFT:
+            t.left(length)
+        else:
+            t.right(angle)
+            t.backward(length)
 
 def draw_koch_snowflake(t, length, iterations, params, current_depth=0):
-    """Dessine un flocon de Koch avec dégradé optionnel"""
-    def koch_line(turtle, length, iterations, current_depth=0):
-        gradient = params.get("gradient", False)
-        if gradient:
-            max_depth = params.get("iterations", 4)
-            factor = current_depth / max(1, max_depth)
-            color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-            turtle.color(fix_turtle_color(color))
-        
-        if iterations == 0:
-            turtle.forward(length)
-        else:
-            length /= 3.0
-            koch_line(turtle, length, iterations - 1, current_depth + 1)
-            turtle.left(60)
-            koch_line(turtle, length, iterations - 1, current_depth + 1)
-            turtle.right(120)
-            koch_line(turtle, length, iterations - 1, current_depth + 1)
-            turtle.left(60)
-            koch_line(turtle, length, iterations - 1, current_depth + 1)
+    """Dessine un flocon de Koch avec dégradé optionnel
+
+    Forme fermée du L-système F -> F+F--F+F : le virage après le k-ième
+    segment dépend du dernier chiffre non nul de k en base 4 (1 et 3 : +60°,
+    2 : -120°). Tous les segments sont tracés à la profondeur des feuilles.
+    """
+    palette = gradient_palette(params, current_depth + iterations + 1, max(1, params.get("iterations", 4)))
+    if palette:
+        t.color(palette[current_depth + iterations])
+    
+    segment = length
+    for _ in range(iterations):
+        segment /= 3.0
+    count = 4 ** iterations
     
     # Dessiner les trois côtés du triangle
     for _ in range(3):
-        koch_line(t, length, iterations, current_depth)
+        for k in range(1, count + 1):
+            t.forward(segment)
+            if k == count:
+                break
+            while k % 4 == 0:
+                k //= 4
+            if k % 4 == 2:
+                t.right(120)
+            else:
+                t.left(60)
         t.right(120)
 
 def draw_sierpinski_triangle(t, length, iterations, params, current_depth=0):
-    """Dessine un triangle de Sierpinski avec dégradé optionnel"""
-    def sierpinski(turtle, length, iterations, current_depth=0):
-        gradient = params.get("gradient", False)
-        if gradient:
-            max_depth = params.get("iterations", 4)
-            factor = current_depth / max(1, max_depth)
-            color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-            turtle.color(fix_turtle_color(color))
-        
-        if iterations == 0:
-            # Dessiner un triangle plein
-            for _ in range(3):
-                turtle.forward(length)
-                turtle.left(120)
-        else:
-            # Diviser en trois triangles plus petits
-            sierpinski(turtle, length / 2, iterations - 1, current_depth + 1)
-            turtle.forward(length / 2)
-            sierpinski(turtle, length / 2, iterations - 1, current_depth + 1)
-            turtle.backward(length / 2)
-            turtle.left(60)
-            turtle.forward(length / 2)
-            turtle.right(60)
-            sierpinski(turtle, length / 2, iterations - 1, current_depth + 1)
-            turtle.left(60)
-            turtle.backward(length / 2)
-            turtle.right(60)
+    """Dessine un triangle de Sierpinski avec dégradé optionnel
+
+    Pile explicite reproduisant les déplacements de la version récursive ;
+    tous les traits prennent la couleur des feuilles, comme auparavant.
+    """
+    palette = gradient_palette(params, current_depth + iterations + 1, max(1, params.get("iterations", 4)))
+    if palette:
+        t.color(palette[current_depth + iterations])
     
-    sierpinski(t, length, iterations, current_depth)
+    stack = [(_ENTER, length, iterations)]
+    while stack:
+        op, length, iterations = stack.pop()
+        if op == _ENTER:
+            if iterations == 0:
+                # Dessiner un triangle plein
+                for _ in range(3):
+                    t.forward(length)
+                    t.left(120)
+                continue
+            # Diviser en trois triangles plus petits (opérations empilées à l'envers)
+            half = length / 2
+            child = (_ENTER, half, iterations - 1)
+            stack.extend([
+                (_RIGHT, 60, 0), (_BACKWARD, half, 0), (_LEFT, 60, 0),
+                child,
+                (_RIGHT, 60, 0), (_FORWARD, half, 0), (_LEFT, 60, 0), (_BACKWARD, half, 0),
+                child,
+                (_FORWARD, half, 0),
+                child,
+            ])
+        elif op == _FORWARD:
+            t.forward(length)
+        elif op == _BACKWARD:
+            t.backward(length)
+        elif op == _LEFT:
+            t.left(length)
+        else:
+            t.right(length)
 
 def draw_dragon_curve(t, length, iterations, direction=1, params=None, current_depth=0):
-    """Dessine la courbe du dragon de Heighway avec dégradé optionnel"""
-    gradient = params.get("gradient", False) if params else False
-    if gradient and params:
-        max_depth = params.get("iterations", 4)
-        factor = current_depth / max(1, max_depth)
-        color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-        t.color(fix_turtle_color(color))
+    """Dessine la courbe du dragon de Heighway avec dégradé optionnel
+
+    Forme fermée du pliage de papier : le virage après le k-ième segment est
+    donné par le bit situé au-dessus du bit de poids faible de k.
+    """
+    palette = gradient_palette(params, current_depth + iterations + 1, max(1, params.get("iterations", 4))) if params else None
+    if palette:
+        t.color(palette[current_depth + iterations])
     
-    if iterations == 0:
-        t.forward(length)
-    else:
-        draw_dragon_curve(t, length / (2**0.5), iterations - 1, 1, params, current_depth + 1)
-        t.left(90 * direction)
-        draw_dragon_curve(t, length / (2**0.5), iterations - 1, -1, params, current_depth + 1)
+    segment = length
+    for _ in range(iterations):
+        segment /= 2**0.5
+    count = 2 ** iterations
+    
+    for k in range(1, count + 1):
+        t.forward(segment)
+        if k == count:
+            break
+        lowest_bit = k & -k
+        turn = direction if lowest_bit == count // 2 else (1 if k & (lowest_bit << 1) == 0 else -1)
+        t.left(90 * turn)
 
 def draw_spiral(t, params):
     """Dessine une spirale avec dégradé optionnel"""
@@ -160,96 +228,116 @@ def draw_spiral(t, params):
     size = params["size"]
     increment = params["increment"]
     angle_step = params["angle"]
-    gradient = params.get("gradient", False)
     
     current_size = size
     total_steps = int(turns * (360 // angle_step))
+    palette = gradient_palette(params, total_steps, max(1, total_steps - 1))
     
     for i in range(total_steps):
-        if gradient:
-            factor = i / max(1, total_steps - 1)
-            color = interpolate_color(params["gradient_start"], params["gradient_end"], factor)
-            t.color(fix_turtle_color(color))
+        if palette:
+            t.color(palette[i])
         
         t.forward(current_size)
         t.right(angle_step)
         current_size += increment / (360 // angle_step)
 
-def apply_symmetry(t, draw_function, params, symmetry_options):
-    """Applique les effets de symétrie"""
+def symmetry_copies(symmetry_options):
+    """Nombre de fois que le motif est tracé selon les options de symétrie (comme symmetry_angles, sans les lister)"""
     if not symmetry_options:
-        draw_function(t, params)
-        return
+        return 1
+    if symmetry_options.get("kaleidoscope", False):
+        copies = 8
+    else:
+        copies = max(1, int(symmetry_options.get("rotation", 1)))
+    return copies * 2 if symmetry_options.get("mirror", False) else copies
+
+def count_segments(params):
+    """Nombre exact de segments tracés pour ces paramètres, sans rien dessiner"""
+    mode = params.get("mode", "geometric")
+    if mode == "geometric":
+        count = params["sides"] * params["depth"]
+    elif mode == "fractal":
+        fractal_type = params.get("fractal_type", "tree")
+        n = params["iterations"]
+        if fractal_type == "tree":
+            count = 2 * (2 ** n - 1)  # aller et retour sur chaque branche
+        elif fractal_type == "koch":
+            count = 3 * 4 ** n
+        elif fractal_type == "sierpinski":
+            count = 3 ** (n + 1) + 2 * (3 ** n - 1)  # triangles + 4 déplacements par subdivision
+        elif fractal_type == "dragon":
+            count = 2 ** n
+        else:
+            count = 0
+    elif mode == "spiral":
+        count = int(params["turns"] * (360 // params["angle"]))
+    else:
+        count = 0
+    return count * symmetry_copies(params.get("symmetry"))
+
+def symmetry_angles(symmetry_options):
+    """Décalages de cap (degrés) de chaque copie, dans l'ordre de tracé"""
+    if not symmetry_options:
+        return [0]
     
     mirror = symmetry_options.get("mirror", False)
-    rotation = symmetry_options.get("rotation", 1)
+    rotation = int(symmetry_options.get("rotation", 1))
     kaleidoscope = symmetry_options.get("kaleidoscope", False)
     
-    # Sauvegarder la position et orientation initiales
-    initial_pos = t.position()
-    initial_heading = t.heading()
-    
     if kaleidoscope:
         # Effet kaléidoscope - 8 copies avec rotations
-        for i in range(8):
-            t.penup()
-            t.goto(initial_pos)
-            t.setheading(initial_heading + i * 45)
-            t.pendown()
-            draw_function(t, params)
-            
-            if mirror:
-                # Ajouter l'effet miroir
-                t.penup()
-                t.goto(initial_pos)
-                t.setheading(initial_heading + i * 45 + 180)
-                t.pendown()
-                draw_function(t, params)
+        steps = [i * 45 for i in range(8)]
     elif rotation > 1:
         # Rotations multiples
-        for i in range(rotation):
-            t.penup()
-            t.goto(initial_pos)
-            t.setheading(initial_heading + i * (360 / rotation))
-            t.pendown()
-            draw_function(t, params)
-            
-            if mirror:
-                t.penup()
-                t.goto(initial_pos)
-                t.setheading(initial_heading + i * (360 / rotation) + 180)
-                t.pendown()
-                draw_function(t, params)
-    elif mirror:
-        # Effet miroir simple
-        draw_function(t, params)
-        t.penup()
-        t.goto(initial_pos)
-        t.setheading(initial_heading + 180)
-        t.pendown()
-        draw_function(t, params)
+        steps = [i * (360 / rotation) for i in range(rotation)]
     else:
-        draw_function(t, params)
+        steps = [0]
+    
+    angles = []
+    for step in steps:
+        angles.append(step)
+        if mirror:
+            # Effet miroir : même copie orientée à 180°
+            angles.append(step + 180)
+    return angles
 
-def main():
-    # Lire les paramètres
-    with open(sys.argv[1], 'r') as f:
-        params = json.load(f)
+def apply_symmetry(t, draw_function, params, symmetry_options):
+    """Applique les effets de symétrie
 
-    # Configuration Turtle
-    screen = turtle.Screen()
-    screen.setup(width=500, height=500, startx=-2000, starty=-2000)
-    screen.bgcolor("white")  # Toujours blanc pour la capture
-    screen.tracer(0)
+    Le motif n'est tracé qu'une fois ; chaque copie (rotation, kaléidoscope,
+    miroir à 180°) est obtenue en faisant tourner ses segments autour de la
+    position initiale, ce qui équivaut à retracer avec un cap décalé.
+    """
+    angles = symmetry_angles(symmetry_options)
+    if angles == [0]:
+        draw_function(t, params)
+        return
+    
+    base = t.spawn()
+    draw_function(base, params)
+    t.extend_rotated(base.segments, t.position(), angles)
+
+def build_segments(params, styled=True):
+    """Trace le motif avec une tortue sans affichage et renvoie ses segments (SegmentBuffer)
 
-    t = turtle.Turtle()
+    Si `styled` est faux, les couleurs ne sont pas résolues : chaque segment
+    porte à la place son facteur de dégradé (None pour la couleur de base),
+    que style_color convertit ensuite pour n'importe quel jeu de couleurs.
+    Avec style, c'est cette même géométrie recoloriée niveau par niveau : les
+    polylignes (une par niveau, même si deux niveaux ont la même couleur) sont
+    celles de la carte des niveaux, et l'image ne dépend pas du chemin de rendu.
+    """
+    if styled:
+        geometry = build_segments(params, styled=False)
+        return geometry.with_palette([style_color(params, level) for level in geometry.palette])
+    params = {**params, "color": None, "gradient_start": None, "gradient_end": None}
+    t = GeometryTurtle()
     t.hideturtle()
     t.speed(0)
     
-    # Couleur de base si pas de dégradé - avec correction pour le noir
+    # Couleur de base si pas de dégradé : niveau None, résolu par style_color (noir corrigé)
     if not params.get("gradient", False):
-        base_color = fix_turtle_color(params["color"])
-        t.color(base_color)
+        t.color(None)
     
     # Épaisseur du trait - fine par défaut, plus épaisse seulement avec glow
     if params.get("glow", False):
@@ -304,100 +392,257 @@ def main():
         t.pendown()
         apply_symmetry(t, draw_spiral, params, symmetry_options)
 
-    # Rendu final
-    screen.update()
-    time.sleep(0.2)
+    return t.segments
 
-    # Sauvegarder directement en EPS puis convertir
-    canvas = screen.getcanvas()
-    canvas.postscript(file='temp_output.eps')
-    
-    # Fermeture propre
-    screen.bye()
+def style_color(params, level):
+    """Couleur d'un segment tracé sans style (build_segments(styled=False)) pour ces paramètres"""
+    if level is None:
+        return fix_turtle_color(params["color"])
+    if isinstance(level, float):
+        return gradient_color(hex_to_rgb(params["gradient_start"]), hex_to_rgb(params["gradient_end"]), level)
+    # Couleur par défaut de la tortue, indépendante du style
+    return level
+
+def geometry_key(params):
+    """Hash des seuls paramètres qui changent la géométrie (mêmes traits, même carte de niveaux)"""
+    return params_key({name: value for name, value in params.items() if name not in STYLE_PARAMS})
+
+def output_size(params):
+    """Taille de sortie (largeur, hauteur) en pixels, 500x500 par défaut"""
+    return (int(params.get("width", 500)), int(params.get("height", 500)))
+
+def apply_background(img, params, blur_radius=0.5):
+    """Remplace le fond blanc du rendu par la couleur de fond demandée (image RGB)"""
+    # Créer le fond avec la couleur désirée
+    background_color = params.get("background_color", "#ffffff")
+    bg_rgb = hex_to_rgb(background_color)
     
-    # Traitement amélioré de l'image avec PIL
-    try:
-        # Lire le fichier EPS et le convertir
-        from PIL import Image
-        img = Image.open('temp_output.eps')
-        img = img.convert('RGBA')
-        
-        # Créer le fond avec la couleur désirée
-        background_color = params.get("background_color", "#ffffff")
-        bg_rgb = hex_to_rgb(background_color)
-        
-        # Créer une nouvelle image avec le fond coloré
-        final_img = Image.new('RGB', (500, 500), bg_rgb)
-        
-        # Redimensionner l'image du motif si nécessaire
-        if img.size != (500, 500):
-            img = img.resize((500, 500), Image.Resampling.LANCZOS)
-        
-        # Traitement amélioré de la transparence avec anti-aliasing
-        if background_color.lower() != "#ffffff":
-            # Si on avait utilisé #010101 au lieu de #000000, le reconvertir
-            original_color = params.get("color", "#0070f3")
-            if original_color.lower() == "#000000":
-                # Remplacer les pixels #010101 par du vrai noir
-                data = img.getdata()
-                new_data = []
-                for item in data:
-                    if len(item) >= 3:
-                        # Si c'est notre couleur de substitution (#010101), la remplacer par du noir
-                        if item[0] <= 5 and item[1] <= 5 and item[2] <= 5 and not (item[0] >= 250 and item[1] >= 250 and item[2] >= 250):
-                            new_data.append((0, 0, 0, 255) if len(item) == 4 else (0, 0, 0))
-                        elif item[0] >= 250 and item[1] >= 250 and item[2] >= 250:
-                            new_data.append((255, 255, 255, 0) if len(item) == 4 else (255, 255, 255))  # Fond transparent
-                        else:
-                            new_data.append(item)
-                    else:
-                        new_data.append(item)
-                img.putdata(new_data)
-            else:
-                # Traitement normal avec seuil plus strict pour le blanc
-                data = img.getdata()
-                new_data = []
-                for item in data:
-                    if len(item) >= 3:
-                        # Seuil plus strict : considérer comme fond seulement si très proche du blanc pur
-                        if item[0] >= 250 and item[1] >= 250 and item[2] >= 250:
-                            # Calculer l'alpha basé sur la distance au blanc pur pour un meilleur anti-aliasing
-                            distance_from_white = max(255 - item[0], 255 - item[1], 255 - item[2])
-                            if distance_from_white < 5:  # Très proche du blanc
-                                alpha = 0  # Complètement transparent
-                            else:
-                                alpha = min(255, distance_from_white * 50)  # Partiellement transparent
-                            new_data.append((item[0], item[1], item[2], alpha))
-                        else:
-                            # Garder le motif opaque
-                            new_data.append(item if len(item) == 4 else item + (255,))
-                    else:
-                        new_data.append(item)
-                img.putdata(new_data)
-            
-            # Appliquer un léger flou pour réduire les artefacts de bord
-            img = img.filter(ImageFilter.GaussianBlur(radius=0.5))
-            
-            # Coller sur le fond coloré
-            final_img.paste(img, (0, 0), img)
-            final_img.save('output.png', 'PNG')
+    # Traitement amélioré de la transparence avec anti-aliasing
+    if background_color.lower() != "#ffffff":
+        rgba = to_rgba_array(img)
+        # Si on avait utilisé #010101 au lieu de #000000, le reconvertir
+        original_color = params.get("color", "#0070f3")
+        if original_color.lower() == "#000000":
+            # Remplacer les pixels #010101 par du vrai noir, fond transparent
+            rgba = restore_black(rgba)
         else:
-            # Fond blanc : pas de traitement spécial nécessaire
-            img_rgb = img.convert('RGB')
-            img_rgb.save('output.png', 'PNG')
+            # Seuil strict pour le blanc, alpha progressif sur les bords
+            rgba = ramp_white_alpha(rgba)
+        img = Image.fromarray(rgba, 'RGBA')
+        
+        # Appliquer un léger flou pour réduire les artefacts de bord
+        # (rayon proportionnel à la résolution)
+        img = img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
         
-    except Exception as e:
-        # Fallback : créer une image simple avec fond coloré
-        background_color = params.get("background_color", "#ffffff")
-        bg_rgb = hex_to_rgb(background_color)
-        fallback_img = Image.new('RGB', (500, 500), bg_rgb)
-        fallback_img.save('output.png', 'PNG')
+        # Coller sur le fond coloré
+        return fill_background(to_rgba_array(img), bg_rgb)
+    else:
+        # Fond blanc : pas de traitement spécial nécessaire
+        return img.convert('RGB')
+
+def key_background(img, params):
+    """Détourage du blanc restant : pixels très proches du blanc remplacés par le fond coloré"""
+    background_color = params.get('background_color', '#ffffff')
+    if background_color == '#ffffff':  # Fond blanc (défaut) : rien à faire
+        return img
+    # Fond (pixels très proches du blanc) rendu transparent puis
+    # composé sur le fond coloré, en opérations sur tableaux
+    with metrics.stage("keying"):
+        rgba = key_white_to_transparent(to_rgba_array(img))
+        return fill_background(rgba, hex_to_rgb(background_color))
+
+def glow_effect(img, params):
+    """Effet glow/néon si demandé, rayons proportionnels à la résolution"""
+    if not params.get('glow', False):
+        return img
+    with metrics.stage("glow"):
+        try:
+            return apply_glow(img, params.get('glow_intensity', 0.5), zoom_for_size(output_size(params)))
+        except Exception as e:
+            logging.error(f"Erreur lors de l'application de l'effet glow: {str(e)}")
+            return img
+
+def apply_effects(img, params):
+    """Effets finaux du rendu : couleur de fond personnalisée puis glow"""
+    return glow_effect(key_background(img, params), params)
+
+def cached_levels(params):
+    """(carte des niveaux, niveaux) de la géométrie de ces paramètres si le worker l'a en cache, sinon None"""
+    key = geometry_key(params)
+    entry = _geometry_cache.get(key)
+    if entry is not None:
+        _geometry_cache.move_to_end(key)
+    return entry
+
+def store_levels(params, segments, progress=None):
+    """Trace la carte des niveaux de segments sans style et la garde en cache ; renvoie (carte, niveaux)"""
+    global _geometry_cache_bytes
+    with metrics.stage("raster"):
+        entry = rasterize_levels(segments, size=output_size(params), progress=progress)
+
+    levels = entry[0]
+    if levels.nbytes <= GEOMETRY_CACHE_MAX_BYTES:
+        _geometry_cache[geometry_key(params)] = entry
+        _geometry_cache_bytes += levels.nbytes
+        while _geometry_cache_bytes > GEOMETRY_CACHE_MAX_BYTES:
+            _, (evicted, _) = _geometry_cache.popitem(last=False)
+            _geometry_cache_bytes -= evicted.nbytes
+    return entry
+
+def render_image(params, region=None, progress=None, segments=None):
+    """Génère l'image finale (fond et transparence appliqués) pour les paramètres donnés
+
+    `region` (x0, y0, x1, y1) limite le rendu à une zone de l'image de sortie ;
+    les traitements de bord sont alors faits avec une marge puis recadrés,
+    pour que des zones rendues séparément se raccordent sans couture.
+    `progress(fait, total)` suit le tracé des segments. `segments` évite de
+    recalculer une géométrie déjà construite (avec style).
+    """
+    # Rendu direct des segments (sans Tk ni Ghostscript), fond toujours blanc
+    # pour que le traitement de transparence reste identique
+    size = output_size(params)
+    # Image entière tenant en une tuile : tracée en carte des niveaux puis colorée,
+    # la carte restant en cache pour les changements de style seuls
+    by_levels = segments is None and region is None and size[0] <= TILE_SIZE and size[1] <= TILE_SIZE
+    entry = cached_levels(params) if by_levels else None
+    if entry is None and segments is None:
+        with metrics.stage("geometry"):
+            segments = build_segments(params, styled=not by_levels)
+    zoom = zoom_for_size(size)
+    blur_radius = 0.5 * zoom
+
+    if region is None:
+        region = (0, 0) + size
+        margin = (0, 0, 0, 0)
+    else:
+        # Marge couvrant l'étendue du flou de bord, bornée à l'image
+        pad = math.ceil(3 * blur_radius) + 2
+        x0, y0, x1, y1 = region
+        margin = (x0 - max(0, x0 - pad), y0 - max(0, y0 - pad),
+                  min(size[0], x1 + pad) - x1, min(size[1], y1 + pad) - y1)
+        region = (x0 - margin[0], y0 - margin[1], x1 + margin[2], y1 + margin[3])
+
+    # Traitement de l'image avec PIL ; une erreur remonte au serveur (jamais d'image vide mise en cache)
+    if by_levels:
+        # Géométrie déjà tracée par ce worker : seules les couleurs changent
+        if entry is None:
+            entry = store_levels(params, segments, progress)
+        elif progress is not None:
+            progress(1, 1)
+        levels, level_keys = entry
+        with metrics.stage("recolor"):
+            palette = [(255, 255, 255)] + [hex_to_rgb(style_color(params, level)) for level in level_keys]
+            img = colorize_levels(levels, palette)
+    else:
+        with metrics.stage("raster"):
+            img = rasterize(segments, size=size, background="white", region=region, progress=progress)
+    img = img.convert('RGBA')
     
-    finally:
-        # Nettoyer le fichier temporaire
-        import os
-        if os.path.exists('temp_output.eps'):
-            os.remove('temp_output.eps')
+    with metrics.stage("worker_keying"):
+        img = apply_background(img, params, blur_radius)
+
+    if any(margin):
+        img = img.crop((margin[0], margin[1], img.width - margin[2], img.height - margin[3]))
+    return img
+
+def render_region(params, region, shared=None, progress=None):
+    """Rend une zone de l'image et renvoie ses pixels RGB bruts (assemblage côté serveur)
+
+    `shared` : nom de la mémoire partagée des segments (share_segments),
+    lus sans copie au lieu de recalculer la géométrie dans chaque worker.
+    """
+    if shared is None:
+        return render_image(params, region, progress).tobytes()
+    with attach_shared(shared) as segments:
+        return render_image(params, region, progress, segments).tobytes()
+
+def share_segments(params):
+    """Construit la géométrie (avec style) en mémoire partagée et renvoie son nom
+
+    Le serveur la libère (release_shared) une fois toutes les zones rendues.
+    """
+    with metrics.stage("geometry"):
+        shm = build_segments(params).to_shared_memory()
+    shm.close()
+    return shm.name
+
+def render_png(params, progress=None):
+    """Génère l'image et renvoie directement les octets PNG"""
+    buffer = io.BytesIO()
+    img = render_image(params, progress=progress)
+    with metrics.stage("worker_png"):
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def render_draw_on(params, frames, fmt, duration, loop=0):
+    """Animation du tracé (GIF, APNG ou WebP), produite morceau par morceau
+
+    L'image k montre la part k / (frames - 1) des segments, dans l'ordre où
+    la tortue les trace : la première est vide, la dernière est le motif
+    complet. Chaque image ne trace que les segments ajoutés depuis la
+    précédente, et seule la zone qu'ils touchent (plus la marge du flou de
+    bord) reçoit à nouveau fond et détourage ; le glow, de grand rayon,
+    est appliqué à l'image entière.
+    """
+    with metrics.stage("geometry"):
+        segments = build_segments(params)
+    size = output_size(params)
+    blur_radius = 0.5 * zoom_for_size(size)
+    pad = math.ceil(3 * blur_radius) + 2
+    cuts = [round(len(segments) * index / (frames - 1)) for index in range(frames)]
+
+    def finish(img):
+        return key_background(apply_background(img.convert('RGBA'), params, blur_radius), params)
+
+    def images():
+        keyed = None
+        for img, box in rasterize_progressive(segments, cuts, size):
+            if keyed is None:
+                keyed = finish(img)
+            elif box is not None:
+                # Zone modifiée étendue de la portée du flou, traitée avec autant de contexte autour
+                x0, y0, x1, y1 = (max(0, box[0] - pad), max(0, box[1] - pad),
+                                  min(size[0], box[2] + pad), min(size[1], box[3] + pad))
+                region = (max(0, x0 - pad), max(0, y0 - pad), min(size[0], x1 + pad), min(size[1], y1 + pad))
+                part = finish(img.crop(region))
+                keyed.paste(part.crop((x0 - region[0], y0 - region[1], x1 - region[0], y1 - region[1])), (x0, y0))
+            yield glow_effect(keyed, params) if params.get("glow", False) else keyed.copy()
+
+    yield from encode_animation(images(), fmt, frames, duration, loop)
+
+def render_vector(params, fmt):
+    """Sérialise directement la géométrie du motif en SVG ou PDF, sans rastérisation"""
+    with metrics.stage("geometry"):
+        segments = build_segments(params)
+    # Le noir de substitution de fix_turtle_color n'a pas lieu d'être en vectoriel
+    segments = segments.with_palette(["#000000" if color == "#010101" else color for color in segments.palette])
+    serialize, _ = VECTOR_FORMATS[fmt]
+    with metrics.stage("serialize"):
+        return serialize(segments, output_size(params), params.get("background_color", "#ffffff"))
+
+def main():
+    """Usage : python turtle_worker.py [params.json | -] > motif.png
+
+    Les paramètres sont lus depuis le fichier donné, ou depuis stdin si aucun
+    fichier (ou "-") n'est passé. L'image PNG est écrite sur stdout : aucun
+    fichier à nom fixe n'est créé, plusieurs rendus peuvent donc tourner en
+    parallèle dans le même répertoire.
+    """
+    # Lire les paramètres
+    if len(sys.argv) > 1 and sys.argv[1] != "-":
+        with open(sys.argv[1], 'r') as f:
+            params = json.load(f)
+    else:
+        params = json.load(sys.stdin)
+
+    metrics.start_request()
+    sys.stdout.buffer.write(render_png(params))
+    sys.stdout.buffer.flush()
+
+    # Durées des étapes sur stderr, au format de l'en-tête Server-Timing
+    timings = metrics.current_timings()
+    if timings:
+        print(", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
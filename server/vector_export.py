@@ -0,0 +1,96 @@
+import itertools
+import zlib
+from xml.sax.saxutils import quoteattr
+
+from PIL import ImageColor
+
+from rasterizer import iter_polylines, zoom_for_size
+
+def _num(value):
+    """Nombre compact pour SVG/PDF : deux décimales, sans zéros inutiles"""
+    text = f"{value:.2f}".rstrip('0').rstrip('.')
+    return "0" if text == "-0" else text
+
+def _svg_point(point):
+    # Axe Y turtle vers le haut, axe Y SVG vers le bas
+    return f"{_num(point[0])} {_num(-point[1])}"
+
+def _style_runs(segments):
+    """Polylignes (listes de points) regroupées par suites consécutives de même style (couleur, épaisseur)"""
+    for style, run in itertools.groupby(iter_polylines(segments), key=lambda polyline: polyline[1]):
+        yield style, [list(zip(flat[0::2], flat[1::2])) for flat, _ in run]
+
+def segments_to_svg(segments, size=(500, 500), background="#ffffff"):
+    """Sérialise les segments en SVG, sans rastérisation
+
+    Chaque suite de polylignes de même style devient un seul <path> (une
+    sous-figure par polyligne). Le cadrage 500x500 est conservé via la
+    viewBox, l'axe Y turtle est retourné dans les coordonnées.
+    """
+    width, height = size
+    zoom = zoom_for_size(size)
+    view_width, view_height = width / zoom, height / zoom
+    view_box = f"{_num(-view_width / 2)} {_num(-view_height / 2)} {_num(view_width)} {_num(view_height)}"
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="{view_box}">',
+        f'<rect x="{_num(-view_width / 2)}" y="{_num(-view_height / 2)}" width="{_num(view_width)}" '
+        f'height="{_num(view_height)}" fill={quoteattr(background)}/>',
+        '<g fill="none" stroke-linecap="round" stroke-linejoin="round">',
+    ]
+    for (color, pen_width), polylines in _style_runs(segments):
+        path = " ".join(
+            f"M{_svg_point(points[0])} L" + " ".join(_svg_point(point) for point in points[1:])
+            for points in polylines
+        )
+        parts.append(f'<path d="{path}" stroke={quoteattr(color)} stroke-width="{_num(pen_width)}"/>')
+    parts.append('</g></svg>')
+    return "\n".join(parts).encode('utf-8')
+
+def _pdf_rgb(color):
+    return " ".join(_num(channel / 255) for channel in ImageColor.getrgb(color)[:3])
+
+def segments_to_pdf(segments, size=(500, 500), background="#ffffff"):
+    """Sérialise les segments en PDF d'une page (1 pixel = 1 point), flux compressé"""
+    width, height = size
+    zoom = zoom_for_size(size)
+
+    # Fond, extrémités et jonctions arrondies, puis repère turtle
+    # (origine au centre, axe Y vers le haut comme en PDF)
+    ops = [
+        f"{_pdf_rgb(background)} rg 0 0 {width} {height} re f",
+        "1 J 1 j",
+        f"{_num(zoom)} 0 0 {_num(zoom)} {_num(width / 2)} {_num(height / 2)} cm",
+    ]
+    for (color, pen_width), polylines in _style_runs(segments):
+        ops.append(f"{_pdf_rgb(color)} RG {_num(pen_width)} w")
+        for points in polylines:
+            x, y = points[0]
+            ops.append(f"{_num(x)} {_num(y)} m " + " ".join(f"{_num(x)} {_num(y)} l" for x, y in points[1:]))
+        ops.append("S")
+    content = zlib.compress("\n".join(ops).encode('ascii'))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+        f"/Contents 4 0 R /Resources << >> >>".encode('ascii'),
+        f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode('ascii') + content + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode('ascii') + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('ascii')
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode('ascii')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('ascii')
+    return bytes(out)
+
+# Formats vectoriels : (sérialiseur, type MIME)
+VECTOR_FORMATS = {
+    "svg": (segments_to_svg, "image/svg+xml"),
+    "pdf": (segments_to_pdf, "application/pdf"),
+}